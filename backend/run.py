@@ -7,8 +7,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'src'
 
 # --- PDF Processing Imports ---
 from utils.pdf_processor import extract_text_from_pdf # Assuming this function exists
-from embedding_service.embedding_generator import EmbeddingGenerator
-from vector_database.vector_db_client import VectorDBClient
+from src.embedding_service.embedding_generator import get_embedding_generator
+from src.vector_database.vector_db_client import get_vector_db_client
+from src.config.config import API_SERVER_MODE
 # --- End PDF Processing Imports ---
 
 from api.app import app
@@ -23,8 +24,8 @@ def process_pdf_on_startup(pdf_path):
 
     try:
         print("Initializing components...")
-        vector_db = VectorDBClient()
-        embed_gen = EmbeddingGenerator()
+        vector_db = get_vector_db_client()
+        embed_gen = get_embedding_generator()
 
         print("Extracting text from PDF...")
         # Assuming extract_text_from_pdf returns a list of text chunks
@@ -35,35 +36,39 @@ def process_pdf_on_startup(pdf_path):
 
         print(f"Extracted {len(text_chunks)} text chunks. Generating and storing embeddings...")
         processed_chunks = 0
+        vector_ids, chunk_texts, metadatas = [], [], []
         for i, chunk in enumerate(text_chunks):
             if not chunk.strip(): # Skip empty chunks
                 continue
 
-            try:
-                # Generate a unique ID for the chunk (e.g., filename + chunk index)
-                vector_id = f"{os.path.basename(pdf_path)}_chunk_{i}"
-                print(f"  Processing chunk {i+1}/{len(text_chunks)} (ID: {vector_id})...")
+            # Generate a unique ID for the chunk (e.g., filename + chunk index)
+            vector_id = f"{os.path.basename(pdf_path)}_chunk_{i}"
 
-                # Check if already processed (simple check based on metadata)
-                if vector_id in vector_db.id_to_metadata:
-                     print(f"    Skipping chunk {i+1}: Already found in vector store.")
-                     processed_chunks += 1
-                     continue
+            # Check if already processed (simple check based on metadata)
+            if vector_id in vector_db:
+                 print(f"    Skipping chunk {i+1}: Already found in vector store.")
+                 processed_chunks += 1
+                 continue
 
-                embedding = embed_gen.get_embedding(chunk)
-                if embedding:
-                    # Store the FULL chunk text instead of just a preview
-                    metadata = {"source": os.path.basename(pdf_path), "chunk": i, "text": chunk} # Changed 'text_preview' to 'text' and removed slicing
-                    success = vector_db.upsert_embedding(vector_id, embedding, metadata)
-                    if success:
-                        print(f"    Chunk {i+1} stored successfully.")
-                        processed_chunks += 1
-                    else:
-                        print(f"    Failed to store chunk {i+1}.")
+            vector_ids.append(vector_id)
+            chunk_texts.append(chunk)
+            # Store the FULL chunk text instead of just a preview
+            metadatas.append({"source": "pdf", "filename": os.path.basename(pdf_path), "chunk_index": i, "text": chunk}) # Same fields as uploaded PDFs, so {"source": "pdf"} filters find them
+
+        # Embed the new chunks in batched requests, then add them in one block and write the index once
+        if chunk_texts:
+            print(f"  Embedding {len(chunk_texts)} new chunks in batches...")
+            embeddings = embed_gen.get_embeddings(chunk_texts, task_type="RETRIEVAL_DOCUMENT")
+            if embeddings is None:
+                print("    Failed to generate embeddings for the new chunks.")
+            else:
+                stored = vector_db.upsert_embeddings(vector_ids, embeddings, metadatas)
+                if stored:
+                    print(f"    Stored {stored} new chunks in the vector store.")
                 else:
-                    print(f"    Failed to generate embedding for chunk {i+1}.")
-            except Exception as chunk_error:
-                print(f"    Error processing chunk {i+1}: {chunk_error}")
+                    print("    Failed to store the new chunks.")
+                processed_chunks += stored
+                vector_db.flush()
 
         print(f"--- PDF Processing Finished: {processed_chunks}/{len(text_chunks)} chunks processed and stored. ---")
 
@@ -86,7 +91,14 @@ if __name__ == '__main__':
     process_pdf_on_startup(pdf_to_process)
     # --- End PDF Processing Call ---
 
-    # Run the Flask app
-    print("Starting Flask application...")
     # Make sure host='0.0.0.0' if you need to access it from other devices on your network
-    app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
+    if API_SERVER_MODE == "asgi":
+        # Same routes, served by uvicorn with async LLM and database calls
+        import uvicorn
+        from api.asgi_app import asgi_app
+        print("Starting ASGI application...")
+        uvicorn.run(asgi_app, host='127.0.0.1', port=5000)
+    else:
+        # Run the Flask app
+        print("Starting Flask application...")
+        app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
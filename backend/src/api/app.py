@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import os
 from datetime import datetime
 from werkzeug.utils import secure_filename
@@ -19,21 +19,30 @@ from src.personalization_engine.recommendation_engine import RecommendationEngin
 from flask_cors import CORS
 from src.utils.language_service import LanguageService
 from src.utils.pdf_processor import extract_text_from_pdf
-from src.embedding_service.embedding_generator import EmbeddingGenerator
-from src.vector_database.vector_db_client import VectorDBClient
-from src.config.config import GOOGLE_API_KEY, EXA_API_KEY
+from src.utils.response_streaming import ParagraphStreamer, SSE_HEADERS, sse_event, wants_event_stream
+from src.utils.ttl_cache import TTLCache, normalize_query
+from src.embedding_service.embedding_generator import get_embedding_generator
+from src.vector_database.vector_db_client import get_vector_db_client
+from src.config.config import (
+    GOOGLE_API_KEY, EXA_API_KEY, SEARCH_BATCH_MAX_QUERIES, SEARCH_BATCH_MAX_TOP_K,
+    SEARCH_STAGE_WORKERS, SEARCH_KNOWLEDGE_BASE_TIMEOUT_SECONDS, SEARCH_WEB_TIMEOUT_SECONDS,
+    EXA_CACHE_ENABLED, EXA_CACHE_TTL_SECONDS, EXA_CACHE_STALE_SECONDS, EXA_CACHE_MAX_ENTRIES
+)
 # Add import for Smart Swadhan guidance
 from src.web_scraping.hybrid_scraper import get_hybrid_smart_swadhan_guidance
 # Add speech service import
 from src.utils.speech_service import get_speech_service, speak_text, transcribe_audio, record_and_transcribe
 import logging # Added logging
-import asyncio # Add asyncio for database operations
+import concurrent.futures
+import threading
+import time
 import base64  # For audio data encoding
 
 # Add database service imports
 try:
     from src.database.database_service import get_database_service, initialize_database_service
-    from src.database.postgres_mcp_server import initialize_mcp_server
+    from src.database.postgres_mcp_server import initialize_mcp_server, mcp_execute_query, mcp_server
+    from src.database.db_event_loop import run_db
     DATABASE_AVAILABLE = True
 except ImportError:
     logging.warning("Database service not available. Running in FAISS-only mode.")
@@ -65,9 +74,21 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-recommender = RecommendationEngine()
 language_service = LanguageService()
 
+# Built on first use rather than at import: it starts the ingestion queue, which under the
+# ASGI app must come after the server loop has been adopted as the database loop
+_recommender = None
+_recommender_lock = threading.Lock()
+
+def get_recommender():
+    """The process-wide RecommendationEngine (shared with the ASGI app)"""
+    global _recommender
+    with _recommender_lock:
+        if _recommender is None:
+            _recommender = RecommendationEngine()
+        return _recommender
+
 def format_response_text(text):
     """Format response text for better readability with proper spacing and structure"""
     if not text:
@@ -122,7 +143,10 @@ def allowed_file(filename):
 
 @app.route('/chat', methods=['POST'])
 def chat_api():
-    """Enhanced chat API with PostgreSQL MCP Server integration"""
+    """Enhanced chat API with PostgreSQL MCP Server integration
+
+    Send "stream": true (or Accept: text/event-stream) to receive the answer as Server-Sent Events.
+    """
     try:
         data = request.get_json()
         if not data:
@@ -141,62 +165,19 @@ def chat_api():
         english_query = language_service.translate_to_english(user_input_text, user_language)
         logging.info(f"Translated query to English: '{english_query[:50]}...'")
 
-        db_storage_success = False
-        if DATABASE_AVAILABLE:
-            try:
-                async def store_interaction_async():
-                    from src.database.database_service import db_service
-                    from src.database.postgres_mcp_server import mcp_server
-                    
-                    # Initialize mcp_server and db_service for the current event loop
-                    await mcp_server.initialize()
-                    await db_service.initialize()
-
-                    db_result = await db_service.store_interaction(
-                        customer_id=customer_id,
-                        interaction_text=english_query,
-                        interaction_type="chatbot",
-                        user_language=user_language,
-                        additional_metadata={"api_endpoint": "chat"}
-                    )
-                    
-                    # Clean up mcp_server resources for this loop
-                    await mcp_server.close()
-                    return db_result
+        if wants_event_stream(data, request.headers.get('Accept')):
+            events = get_recommender().stream_user_interaction(
+                customer_id, english_query, user_language=user_language, additional_metadata={"api_endpoint": "chat"}
+            )
+            return Response(stream_with_context(chat_stream_events(events, user_language)),
+                            mimetype='text/event-stream', headers=SSE_HEADERS)
 
-                db_result = asyncio.run(store_interaction_async())
-                
-                if db_result["success"]:
-                    logging.info(f"Database storage successful: {db_result['conversation_id']}")
-                    db_storage_success = True
-                else:
-                    logging.warning(f"Database storage failed: {db_result.get('error')}")
-            except Exception as db_error:
-                logging.error(f"Database service error in chat_api: {db_error}")
-                # Ensure a response is still sent if DB operations fail
-        
-        response = recommender.process_user_interaction(customer_id, english_query, user_language=user_language)
-        
-        if isinstance(response, dict):
-            response['database_stored'] = db_storage_success
-        
-        logging.info(f"Received response from processing: {type(response)}")
-
-        if isinstance(response, dict) and 'response' in response and not response.get('error'):
-            # Don't translate the response since OpenAI already generated it in the correct language
-            # based on the user_language parameter in the system prompt
-            original_english_response = response.get('original_llm_response', response['response'])
-            logging.info(f"Response generated in target language {user_language}: '{response['response'][:50]}...'")
-            response['original_response'] = original_english_response
-            response['detected_language'] = user_language
-        elif isinstance(response, dict) and response.get('error'):
-             logging.error(f"Processing returned an error: {response.get('message')}")
-        else:
-            logging.warning(f"Unexpected response format: {response}")
-            if isinstance(response, dict):
-                response['response'] = response.get('response', "Sorry, I encountered an issue.")
-            else:
-                 response = {"response": "Sorry, I encountered an issue."}
+        # The engine queues the turn for storage once; it reaches FAISS and PostgreSQL in a background batch
+        recommender = get_recommender()
+        response = recommender.process_user_interaction(
+            customer_id, english_query, user_language=user_language, additional_metadata={"api_endpoint": "chat"}
+        )
+        response = finalize_chat_response(response, user_language, recommender.ingestion_queue.stores_to_database)
 
         logging.info(f"Sending final response: {response}")
         return jsonify(response), 200
@@ -205,77 +186,163 @@ def chat_api():
         logging.exception(f"Error in chat_api: {str(e)}")
         return jsonify({"error": "Server error", "message": str(e)}), 500
 
-@app.route('/gemini_search', methods=['POST'])
-def exa_search_api():
-    """Enhanced search API using Exa web search with internal knowledge base grounding"""
-    try:
-        data = request.get_json()
-        query = data.get('query')
-        user_language = data.get('language', 'en')
-        logging.info(f"Received Exa Search request: language={user_language}, query='{query[:50]}...'")
+def chat_stream_events(events, user_language):
+    """Server-Sent Events for a streamed /chat answer (shared with the ASGI app)
 
-        if not query:
-            logging.warning("Missing query in Exa Search request")
-            return jsonify({"error": "Missing query"}), 400
-
-        # 1. Get relevant context from our vector database (FAISS)
-        vector_db = VectorDBClient()
-        embed_gen = EmbeddingGenerator()
-        # Translate query to English for embedding/search consistency
-        english_query_for_search = language_service.translate_to_english(query, user_language)
-        logging.info(f"Translated Exa query to English for search: '{english_query_for_search[:50]}...'")
-        query_embedding = embed_gen.get_embedding(english_query_for_search, task_type="RETRIEVAL_QUERY")
-        
-        context = "" # Initialize context
-        if query_embedding:
-            results = vector_db.query_similar_embeddings(query_embedding, top_k=3)
-            logging.info(f"FAISS query returned {len(results.get('matches', []))} matches.")
-            if results and results.get('matches'):
-                for match in results['matches']:
-                    if match.get('metadata', {}).get('text'):
-                        source_info = match['metadata'].get('filename', 'knowledge base')
-                        context += f"Context from {source_info}:\n{match['metadata']['text']}\n\n---\n\n"
+    `token` events carry cleaned answer text as it is generated; the final `done`
+    event carries the same body as the non-streaming response, including sentiment.
+    """
+    try:
+        for event, payload in events:
+            if event == "done":
+                payload = finalize_chat_response(payload, user_language, get_recommender().ingestion_queue.stores_to_database)
+                logging.info(f"Sending final streamed response: {payload}")
+            yield sse_event(event, payload)
+    except Exception as e:
+        logging.exception(f"Error while streaming chat response: {str(e)}")
+        yield sse_event("error", {"error": "Server error", "message": str(e)})
+
+def finalize_chat_response(response, user_language, db_storage_success):
+    """Shapes a RecommendationEngine result into the /chat response body (shared with the ASGI app)
+
+    db_storage_success is reported as `database_stored`: whether the turn was queued for PostgreSQL.
+    """
+    if isinstance(response, dict):
+        response['database_stored'] = db_storage_success
+
+    logging.info(f"Received response from processing: {type(response)}")
+
+    if isinstance(response, dict) and 'response' in response and not response.get('error'):
+        # Don't translate the response since OpenAI already generated it in the correct language
+        # based on the user_language parameter in the system prompt
+        original_english_response = response.get('original_llm_response', response['response'])
+        logging.info(f"Response generated in target language {user_language}: '{response['response'][:50]}...'")
+        response['original_response'] = original_english_response
+        response['detected_language'] = user_language
+    elif isinstance(response, dict) and response.get('error'):
+         logging.error(f"Processing returned an error: {response.get('message')}")
+    else:
+        logging.warning(f"Unexpected response format: {response}")
+        if isinstance(response, dict):
+            response['response'] = response.get('response', "Sorry, I encountered an issue.")
         else:
-            logging.warning("Failed to generate embedding for Exa search query.")
-
-        # 2. Perform Exa web search for additional information
-        web_search_results = ""
+             response = {"response": "Sorry, I encountered an issue."}
+    return response
+
+# Worker threads for the independent /gemini_search branches (knowledge base lookup, web search)
+search_stage_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SEARCH_STAGE_WORKERS, thread_name_prefix="search-stage")
+
+def elapsed_ms(start):
+    """Milliseconds since a time.perf_counter() reading"""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+def search_knowledge_base(english_query):
+    """Internal knowledge base (embedding + FAISS) context for a /gemini_search query"""
+    vector_db = get_vector_db_client()
+    embed_gen = get_embedding_generator()
+    query_embedding = embed_gen.get_embedding(english_query, task_type="RETRIEVAL_QUERY")
+
+    context = "" # Initialize context
+    if query_embedding:
+        results = vector_db.query_similar_embeddings(query_embedding, top_k=3)
+        logging.info(f"FAISS query returned {len(results.get('matches', []))} matches.")
+        if results and results.get('matches'):
+            for match in results['matches']:
+                if match.get('metadata', {}).get('text'):
+                    source_info = match['metadata'].get('filename', 'knowledge base')
+                    context += f"Context from {source_info}:\n{match['metadata']['text']}\n\n---\n\n"
+    else:
+        logging.warning("Failed to generate embedding for Exa search query.")
+    return context
+
+def fetch_web_results(english_query):
+    """Exa web search for a /gemini_search query, formatted for the synthesis prompt (raises on API errors)"""
+    logging.info("Performing Exa web search...")
+    # Create search query focused on SBI Life
+    search_query = f"SBI Life Insurance {english_query}"
+
+    # Perform search and get content
+    exa_results = exa.search_and_contents(
+        search_query,
+        type="auto",  # Let Exa choose between neural and keyword search
+        num_results=3,  # Get top 3 results
+        text=True  # Get full text content
+    )
+
+    web_search_results = ""
+    if exa_results and exa_results.results:
+        logging.info(f"Exa search returned {len(exa_results.results)} results")
+        for i, result in enumerate(exa_results.results[:3]):
+            web_search_results += f"Web Result {i+1} - {result.title}:\n"
+            web_search_results += f"URL: {result.url}\n"
+            if result.text:
+                # Truncate text to prevent overly long responses
+                content_snippet = result.text[:500] + "..." if len(result.text) > 500 else result.text
+                web_search_results += f"Content: {content_snippet}\n\n---\n\n"
+    else:
+        logging.warning("No results returned from Exa search")
+        web_search_results = "No additional web results found."
+    return web_search_results
+
+# Exa results for popular product questions change rarely; keyed by the normalised English query
+web_search_cache = TTLCache(
+    ttl=EXA_CACHE_TTL_SECONDS, max_entries=EXA_CACHE_MAX_ENTRIES,
+    stale_ttl=EXA_CACHE_STALE_SECONDS, name="exa-cache"
+)
+
+def search_web(english_query):
+    """Exa web search results for a /gemini_search query, served from the cache when possible"""
+    try:
+        if not EXA_CACHE_ENABLED:
+            return fetch_web_results(english_query)
+        return web_search_cache.get_or_load(normalize_query(english_query), lambda: fetch_web_results(english_query))
+    except Exception as exa_error:
+        # Failures are not cached, so the next request tries Exa again
+        logging.error(f"Exa search failed: {exa_error}")
+        return "Web search temporarily unavailable."
+
+def _timed_branch(func, english_query):
+    start = time.perf_counter()
+    return func(english_query), elapsed_ms(start)
+
+# Stage name -> (branch function, timeout setting, value used if the branch is late or fails)
+SEARCH_BRANCHES = {
+    "knowledge_base": (search_knowledge_base, SEARCH_KNOWLEDGE_BASE_TIMEOUT_SECONDS, ""),
+    "web_search": (search_web, SEARCH_WEB_TIMEOUT_SECONDS, "Web search temporarily unavailable."),
+}
+
+def gather_search_context(english_query, timings):
+    """Knowledge base context and Exa web results for a /gemini_search query
+
+    Both branches only need the English query, so they run concurrently and the wait
+    is as long as the slowest one. Each branch has its own timeout, counted from when
+    both start; a late or failed branch is replaced by its empty result so the answer
+    uses whatever arrived. Branch durations (ms) are added to `timings`, with None for
+    a branch that was still running at its timeout.
+
+    Returns (context, web_search_results) as prompt-ready strings.
+    """
+    branch_start = time.monotonic()
+    futures = {
+        stage: search_stage_executor.submit(_timed_branch, func, english_query)
+        for stage, (func, _, _) in SEARCH_BRANCHES.items()
+    }
+    results = {}
+    for stage, (_, timeout, fallback) in SEARCH_BRANCHES.items():
         try:
-            logging.info("Performing Exa web search...")
-            # Create search query focused on SBI Life
-            search_query = f"SBI Life Insurance {english_query_for_search}"
-            
-            # Perform search and get content
-            exa_results = exa.search_and_contents(
-                search_query,
-                type="auto",  # Let Exa choose between neural and keyword search
-                num_results=3,  # Get top 3 results
-                text=True  # Get full text content
-            )
-            
-            if exa_results and exa_results.results:
-                logging.info(f"Exa search returned {len(exa_results.results)} results")
-                for i, result in enumerate(exa_results.results[:3]):
-                    web_search_results += f"Web Result {i+1} - {result.title}:\n"
-                    web_search_results += f"URL: {result.url}\n"
-                    if result.text:
-                        # Truncate text to prevent overly long responses
-                        content_snippet = result.text[:500] + "..." if len(result.text) > 500 else result.text
-                        web_search_results += f"Content: {content_snippet}\n\n---\n\n"
-            else:
-                logging.warning("No results returned from Exa search")
-                web_search_results = "No additional web results found."
-                
-        except Exception as exa_error:
-            logging.error(f"Exa search failed: {exa_error}")
-            web_search_results = "Web search temporarily unavailable."
+            remaining = max(0, branch_start + timeout - time.monotonic())
+            results[stage], timings[stage] = futures[stage].result(timeout=remaining)
+        except concurrent.futures.TimeoutError:
+            logging.warning(f"/gemini_search {stage} branch still running after {timeout}s; answering without it")
+            results[stage], timings[stage] = fallback, None
+        except Exception as e:
+            logging.error(f"/gemini_search {stage} branch failed: {e}")
+            results[stage], timings[stage] = fallback, None
+    return results["knowledge_base"], results["web_search"]
 
-        # 3. Use OpenAI to synthesize the response
-        try:
-            from openai import OpenAI
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            
-            synthesis_prompt = f"""You are an AI assistant for SBI Life Insurance. Your goal is to answer user queries accurately and helpfully, potentially aiding customer understanding and retention.
+def synthesis_request(query, context, web_search_results):
+    """OpenAI chat completion arguments for synthesising a /gemini_search answer"""
+    synthesis_prompt = f"""You are an AI assistant for SBI Life Insurance. Your goal is to answer user queries accurately and helpfully, potentially aiding customer understanding and retention.
 
 You have access to two sources of information:
 
@@ -324,15 +391,70 @@ PREMIUM INFORMATION:
 
 Respond in English first, then translate if needed."""
 
-            response = client.chat.completions.create(
-                model="gpt-4o",  # Use the latest model available
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant for SBI Life Insurance customers."},
-                    {"role": "user", "content": synthesis_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
+    return {
+        "model": "gpt-4o",  # Use the latest model available
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant for SBI Life Insurance customers."},
+            {"role": "user", "content": synthesis_prompt}
+        ],
+        "max_tokens": 500,
+        "temperature": 0.7
+    }
+
+def synthesis_fallback_text(context, web_search_results):
+    """Answer used when OpenAI synthesis fails: a simple excerpt of what was found"""
+    if context:
+        response_text = f"Based on our knowledge base:\n\n{context[:400]}..."
+    elif web_search_results and "No additional web results found" not in web_search_results:
+        response_text = f"Based on recent information:\n\n{web_search_results[:400]}..."
+    else:
+        response_text = "I apologize, but I'm unable to find specific information about your query at the moment. Please contact SBI Life customer service for detailed assistance."
+
+    # Apply formatting to fallback responses too
+    return format_response_text(response_text)
+
+@app.route('/gemini_search', methods=['POST'])
+def exa_search_api():
+    """Enhanced search API using Exa web search with internal knowledge base grounding
+
+    Send "stream": true (or Accept: text/event-stream) to receive the answer as Server-Sent Events.
+    """
+    try:
+        data = request.get_json()
+        query = data.get('query')
+        user_language = data.get('language', 'en')
+        logging.info(f"Received Exa Search request: language={user_language}, query='{query[:50]}...'")
+
+        if not query:
+            logging.warning("Missing query in Exa Search request")
+            return jsonify({"error": "Missing query"}), 400
+
+        # Stage graph: translate query -> (knowledge base | web search, concurrently) -> synthesis -> translate response
+        request_start = time.perf_counter()
+        timings = {}
+
+        # 1. Translate query to English for embedding/search consistency
+        stage_start = time.perf_counter()
+        english_query_for_search = language_service.translate_to_english(query, user_language)
+        timings["translate_query"] = elapsed_ms(stage_start)
+        logging.info(f"Translated Exa query to English for search: '{english_query_for_search[:50]}...'")
+
+        # 2. Knowledge base (FAISS) and Exa web search
+        context, web_search_results = gather_search_context(english_query_for_search, timings)
+
+        if wants_event_stream(data, request.headers.get('Accept')):
+            return Response(
+                stream_with_context(stream_search_response(query, user_language, context, web_search_results, timings, request_start)),
+                mimetype='text/event-stream', headers=SSE_HEADERS
             )
+
+        # 3. Use OpenAI to synthesize the response
+        stage_start = time.perf_counter()
+        try:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+            response = client.chat.completions.create(**synthesis_request(query, context, web_search_results))
             
             response_text = response.choices[0].message.content
             logging.info(f"Received response from OpenAI: '{response_text[:100]}...'")
@@ -342,36 +464,96 @@ Respond in English first, then translate if needed."""
         except Exception as openai_error:
             logging.error(f"OpenAI synthesis failed: {openai_error}")
             # Fallback to simple concatenation
-            if context:
-                response_text = f"Based on our knowledge base:\n\n{context[:400]}..."
-            elif web_search_results and "No additional web results found" not in web_search_results:
-                response_text = f"Based on recent information:\n\n{web_search_results[:400]}..."
-            else:
-                response_text = "I apologize, but I'm unable to find specific information about your query at the moment. Please contact SBI Life customer service for detailed assistance."
-            
-            # Apply formatting to fallback responses too
-            response_text = format_response_text(response_text)
+            response_text = synthesis_fallback_text(context, web_search_results)
+        timings["synthesis"] = elapsed_ms(stage_start)
 
         # 4. Translate response if needed
-        if user_language != 'en':
-            logging.info(f"Translating response to {user_language}...")
-            translated_response = language_service.translate_from_english(
-                response_text,
-                user_language
-            )
-            logging.info(f"Translated response: '{translated_response[:100]}...'")
-            return jsonify({
-                "response": translated_response,
-                "original_response": response_text,
-                "detected_language": user_language
-            }), 200
-        
-        return jsonify({"response": response_text}), 200
+        return jsonify(search_response_body(response_text, user_language, timings, request_start)), 200
 
     except Exception as e:
         logging.exception(f"Error in exa_search_api: {str(e)}")
         return jsonify({"error": "Server error during Exa search", "message": str(e)}), 500
 
+def search_response_body(response_text, user_language, timings, request_start):
+    """The /gemini_search response body, with the answer translated for non-English users (shared with the ASGI app)"""
+    if user_language != 'en':
+        logging.info(f"Translating response to {user_language}...")
+        stage_start = time.perf_counter()
+        translated_response = language_service.translate_from_english(
+            response_text,
+            user_language
+        )
+        timings["translate_response"] = elapsed_ms(stage_start)
+        logging.info(f"Translated response: '{translated_response[:100]}...'")
+        timings["total"] = elapsed_ms(request_start)
+        logging.info(f"/gemini_search stage timings (ms): {timings}")
+        return {
+            "response": translated_response,
+            "original_response": response_text,
+            "detected_language": user_language,
+            "stage_timings_ms": timings
+        }
+
+    timings["total"] = elapsed_ms(request_start)
+    logging.info(f"/gemini_search stage timings (ms): {timings}")
+    return {"response": response_text, "stage_timings_ms": timings}
+
+def search_done_payload(user_language, english_paragraphs, shown_paragraphs, timings):
+    """Final `done` event of a streamed /gemini_search answer (shared with the ASGI app)"""
+    response_text = "\n\n".join(english_paragraphs)
+    if user_language != 'en':
+        return {
+            "response": "\n\n".join(shown_paragraphs),
+            "original_response": response_text,
+            "detected_language": user_language,
+            "stage_timings_ms": timings
+        }
+    return {"response": response_text, "stage_timings_ms": timings}
+
+def stream_search_response(query, user_language, context, web_search_results, timings, request_start):
+    """Server-Sent Events for a streamed /gemini_search answer
+
+    The answer is formatted (and translated, for non-English users) one paragraph at a
+    time and sent as `token` events; a final `done` event carries the same body as the
+    non-streaming response.
+    """
+    english_paragraphs, shown_paragraphs = [], []
+
+    def paragraph_events(paragraphs):
+        for paragraph in paragraphs:
+            english_paragraphs.append(paragraph)
+            if user_language != 'en':
+                translate_start = time.perf_counter()
+                paragraph = language_service.translate_from_english(paragraph, user_language)
+                timings["translate_response"] = timings.get("translate_response", 0) + elapsed_ms(translate_start)
+            if not shown_paragraphs:
+                timings["first_paragraph"] = elapsed_ms(request_start)
+            separator = "\n\n" if shown_paragraphs else ""
+            shown_paragraphs.append(paragraph)
+            yield sse_event("token", {"text": separator + paragraph})
+
+    formatter = ParagraphStreamer(format_response_text)
+    stage_start = time.perf_counter()
+    try:
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+        stream = client.chat.completions.create(**synthesis_request(query, context, web_search_results), stream=True)
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield from paragraph_events(formatter.feed(delta))
+        yield from paragraph_events(formatter.finish())
+    except Exception as openai_error:
+        logging.error(f"OpenAI synthesis failed: {openai_error}")
+        if not english_paragraphs:
+            yield from paragraph_events([synthesis_fallback_text(context, web_search_results)])
+    # Includes translating paragraphs as they arrive, which overlaps with generation
+    timings["synthesis"] = elapsed_ms(stage_start)
+    timings["total"] = elapsed_ms(request_start)
+    logging.info(f"/gemini_search stage timings (ms): {timings}")
+    yield sse_event("done", search_done_payload(user_language, english_paragraphs, shown_paragraphs, timings))
+
 @app.route('/smart_swadhan_guidance', methods=['POST'])
 def smart_swadhan_guidance_api():
     """API endpoint for Smart Swadhan Supreme navigation guidance with hybrid scraping"""
@@ -442,6 +624,72 @@ def test_scraper_api():
             "message": "Scraper test failed"
         }), 500
 
+def index_pdf_chunks(pdf_path, filename):
+    """Extracts, embeds and stores the chunks of an uploaded PDF in FAISS (shared with the ASGI app)
+
+    Returns (extracted_count, processed_count, document_chunks); document_chunks are the
+    {"text", "chunk_index", "vector_id"} rows stored for the document in PostgreSQL.
+    """
+    extracted_chunks = extract_text_from_pdf(pdf_path) # Assumes this returns chunks
+    if not extracted_chunks:
+        logging.warning(f"Failed to extract text from PDF: {filename}")
+        return 0, 0, []
+    logging.info(f"Extracted {len(extracted_chunks)} chunks from PDF: {filename}")
+
+    embed_gen = get_embedding_generator()
+    vector_db = get_vector_db_client()
+
+    vector_ids, chunk_texts, metadatas = [], [], []
+    for i, chunk in enumerate(extracted_chunks):
+         if not chunk.strip(): continue # Skip empty chunks
+         vector_ids.append(f"pdf_{filename}_chunk_{i}")
+         chunk_texts.append(chunk)
+         metadatas.append({"source": "pdf", "filename": filename, "chunk_index": i, "text": chunk})
+
+    # Embed all chunks in a few batched requests instead of one call per chunk
+    embeddings = None
+    if chunk_texts:
+        logging.info(f"Embedding {len(chunk_texts)} chunks in batches...")
+        embeddings = embed_gen.get_embeddings(chunk_texts, task_type="RETRIEVAL_DOCUMENT")
+        if embeddings is None:
+            logging.warning(f"Failed to generate embeddings for chunks of '{filename}'.")
+
+    # Store all chunk vectors with a single index add and one write to disk
+    processed_count = 0
+    if embeddings is not None:
+        processed_count = vector_db.upsert_embeddings(vector_ids, embeddings, metadatas)
+        # Re-uploads replace chunks in place; drop chunks the new version no longer has
+        # (read through the indexed source/document columns, not a scan of all metadata)
+        kept_chunks = {metadata["chunk_index"] for metadata in metadatas}
+        stale_count = vector_db.delete([
+            entry["id"] for entry in vector_db.list_by_filter({"source": "pdf", "document": filename})
+            if entry["metadata"].get("chunk_index") not in kept_chunks
+        ])
+        if stale_count:
+            logging.info(f"Removed {stale_count} stale chunks from the previous version of '{filename}'.")
+        if not vector_db.flush():
+            logging.warning(f"Chunks from '{filename}' were added but could not be persisted yet.")
+        # Cached answers built from the previous version of this document are out of date
+        response_cache = get_recommender().response_cache
+        if response_cache is not None:
+            response_cache.invalidate(lambda vector_id, metadata: metadata.get("filename") == filename)
+
+    document_chunks = [
+        {"text": text, "chunk_index": metadata["chunk_index"], "vector_id": vector_id}
+        for vector_id, text, metadata in zip(vector_ids, chunk_texts, metadatas)
+    ] if processed_count > 0 else []
+    return len(extracted_chunks), processed_count, document_chunks
+
+def pdf_upload_response(filename, extracted_count, processed_count):
+    """(body, status) of an /upload_pdf request (shared with the ASGI app)"""
+    if not extracted_count:
+        return {"error": "Failed to extract text from PDF"}, 500
+    if processed_count > 0:
+        logging.info(f"PDF '{filename}' processed: {processed_count}/{extracted_count} chunks embedded successfully.")
+        return {"message": f"PDF '{filename}' processed: {processed_count}/{extracted_count} chunks embedded successfully."}, 200
+    logging.error(f"Failed to process any chunks from PDF '{filename}'.")
+    return {"error": "Failed to process any content from the PDF"}, 500
+
 @app.route('/upload_pdf', methods=['POST'])
 def upload_pdf_api():
     # ... existing upload_pdf_api implementation ...
@@ -460,40 +708,24 @@ def upload_pdf_api():
             file.save(pdf_path)
             logging.info(f"PDF file saved temporarily to: {pdf_path}")
 
-            extracted_chunks = extract_text_from_pdf(pdf_path) # Assumes this returns chunks
-            if not extracted_chunks:
-                logging.warning(f"Failed to extract text from PDF: {filename}")
-                return jsonify({"error": "Failed to extract text from PDF"}), 500
-            logging.info(f"Extracted {len(extracted_chunks)} chunks from PDF: {filename}")
-
-            logging.info("Initializing Embedding Generator for PDF...")
-            embed_gen = EmbeddingGenerator()
-            logging.info("Initializing Vector DB Client for PDF...")
-            vector_db = VectorDBClient()
-
-            processed_count = 0
-            for i, chunk in enumerate(extracted_chunks):
-                 if not chunk.strip(): continue # Skip empty chunks
-                 vector_id = f"pdf_{filename}_chunk_{i}"
-                 logging.debug(f"Processing chunk {i+1}/{len(extracted_chunks)} (ID: {vector_id})...")
-                 embedding = embed_gen.get_embedding(chunk, task_type="RETRIEVAL_DOCUMENT")
-                 if embedding:
-                     metadata = {"source": "pdf", "filename": filename, "chunk_index": i, "text": chunk}
-                     success = vector_db.upsert_embedding(vector_id, embedding, metadata)
-                     if success:
-                         logging.debug(f"Chunk {i+1} stored successfully.")
-                         processed_count += 1
-                     else:
-                         logging.warning(f"Failed to store chunk {i+1} (ID: {vector_id}).")
-                 else:
-                     logging.warning(f"Failed to generate embedding for chunk {i+1} (ID: {vector_id}).")
-            
-            if processed_count > 0:
-                logging.info(f"PDF '{filename}' processed: {processed_count}/{len(extracted_chunks)} chunks embedded successfully.")
-                return jsonify({"message": f"PDF '{filename}' processed: {processed_count}/{len(extracted_chunks)} chunks embedded successfully."}), 200
-            else:
-                 logging.error(f"Failed to process any chunks from PDF '{filename}'.")
-                 return jsonify({"error": "Failed to process any content from the PDF"}), 500
+            extracted_count, processed_count, document_chunks = index_pdf_chunks(pdf_path, filename)
+
+            # Record the document and its chunks in PostgreSQL too: one transaction, chunks via COPY
+            if processed_count > 0 and DATABASE_AVAILABLE:
+                async def store_document_wrapper():
+                    db_service = await get_database_service()
+                    return await db_service.store_document_processing(
+                        filename, "\n\n".join(chunk["text"] for chunk in document_chunks), chunks=document_chunks
+                    )
+                try:
+                    document_result = run_db(store_document_wrapper())
+                    if not document_result.get("success"):
+                        logging.warning(f"Could not record '{filename}' in PostgreSQL: {document_result.get('error')}")
+                except Exception as e:
+                    logging.warning(f"Could not record '{filename}' in PostgreSQL: {e}")
+
+            body, status = pdf_upload_response(filename, extracted_count, processed_count)
+            return jsonify(body), status
 
         except Exception as e:
             logging.exception(f"Error processing PDF upload '{filename}': {str(e)}")
@@ -519,18 +751,10 @@ def get_customer_profile(customer_id):
     
     try:
         async def get_profile_async_wrapper():
-            from src.database.database_service import db_service
-            from src.database.postgres_mcp_server import mcp_server
-            
-            await mcp_server.initialize()
-            await db_service.initialize() # Ensures db_service uses the initialized mcp_server
-
-            profile_data = await db_service.get_customer_profile(customer_id)
-            
-            await mcp_server.close()
-            return profile_data
+            db_service = await get_database_service()
+            return await db_service.get_customer_profile(customer_id)
         
-        result = asyncio.run(get_profile_async_wrapper())
+        result = run_db(get_profile_async_wrapper())
         
         if result["success"]:
             return jsonify(result["profile"]), 200
@@ -540,8 +764,6 @@ def get_customer_profile(customer_id):
             
     except Exception as e:
         logging.exception(f"Error getting customer profile for {customer_id}: {e}")
-        if isinstance(e, RuntimeError) and "event loop" in str(e).lower():
-            return jsonify({"error": "Event loop management issue", "detail": str(e)}), 500
         return jsonify({"error": "Server error during profile retrieval", "detail": str(e)}), 500
 
 @app.route('/api/customer/<customer_id>/preferences', methods=['POST'])
@@ -560,20 +782,12 @@ def update_customer_preferences(customer_id):
             return jsonify({"error": "Missing preference_type or preference_value"}), 400
         
         async def update_preferences_wrapper():
-            from src.database.database_service import db_service
-            from src.database.postgres_mcp_server import mcp_server
-
-            await mcp_server.initialize()
-            await db_service.initialize()
-
-            update_result = await db_service.update_customer_preferences(
+            db_service = await get_database_service()
+            return await db_service.update_customer_preferences(
                 customer_id, preference_type, preference_value, confidence_score
             )
-            
-            await mcp_server.close()
-            return update_result
         
-        result = asyncio.run(update_preferences_wrapper())
+        result = run_db(update_preferences_wrapper())
         
         if result["success"]:
             return jsonify({"message": "Preferences updated successfully"}), 200
@@ -583,8 +797,6 @@ def update_customer_preferences(customer_id):
             
     except Exception as e:
         logging.exception(f"Error updating customer preferences for {customer_id}: {e}")
-        if isinstance(e, RuntimeError) and "event loop" in str(e).lower():
-            return jsonify({"error": "Event loop management issue", "detail": str(e)}), 500
         return jsonify({"error": "Server error during preference update", "detail": str(e)}), 500
 
 @app.route('/api/customer/<customer_id>/similar-interactions', methods=['POST'])
@@ -602,18 +814,10 @@ def search_similar_interactions(customer_id):
             return jsonify({"error": "Missing query_text"}), 400
         
         async def search_interactions_wrapper():
-            from src.database.database_service import db_service
-            from src.database.postgres_mcp_server import mcp_server
-
-            await mcp_server.initialize()
-            await db_service.initialize()
-
-            search_result = await db_service.search_similar_interactions(customer_id, query_text, top_k)
-            
-            await mcp_server.close()
-            return search_result
+            db_service = await get_database_service()
+            return await db_service.search_similar_interactions(customer_id, query_text, top_k)
             
-        result = asyncio.run(search_interactions_wrapper())
+        result = run_db(search_interactions_wrapper())
         
         if result["success"]:
             return jsonify(result), 200
@@ -623,10 +827,78 @@ def search_similar_interactions(customer_id):
             
     except Exception as e:
         logging.exception(f"Error searching similar interactions for {customer_id}: {e}")
-        if isinstance(e, RuntimeError) and "event loop" in str(e).lower():
-            return jsonify({"error": "Event loop management issue", "detail": str(e)}), 500
         return jsonify({"error": "Server error during similar interactions search", "detail": str(e)}), 500
 
+@app.route('/api/customer/<customer_id>/vectors', methods=['DELETE'])
+def purge_customer_vectors(customer_id):
+    """Delete every stored interaction vector of a customer"""
+    try:
+        vector_db = get_vector_db_client()
+        deleted_count = vector_db.delete_by_filter({"customer_id": customer_id})
+        if not vector_db.flush():
+            logging.warning(f"Vectors of {customer_id} were deleted but the index could not be persisted yet.")
+        logging.info(f"Purged {deleted_count} vectors for customer {customer_id}")
+        response_cache = get_recommender().response_cache
+        if response_cache is not None:
+            response_cache.invalidate(lambda vector_id, metadata: metadata.get("customer_id") == customer_id)
+        return jsonify({"success": True, "customer_id": customer_id, "deleted_count": deleted_count}), 200
+    except Exception as e:
+        logging.exception(f"Error purging vectors for {customer_id}: {e}")
+        return jsonify({"error": "Server error during vector purge", "detail": str(e)}), 500
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_batch():
+    """Run many similarity searches in one request.
+
+    Body: {"queries": [text, ...]} or {"embeddings": [[float, ...], ...]}, plus optional
+    "top_k" (default 5) and "filters" (one filter dict for all queries, or a list with
+    one per query; see VectorDBClient.query_similar_embeddings). At most
+    SEARCH_BATCH_MAX_QUERIES queries and SEARCH_BATCH_MAX_TOP_K matches per query.
+    """
+    try:
+        data = request.get_json() or {}
+        queries = data.get('queries')
+        embeddings = data.get('embeddings')
+        top_k = data.get('top_k', 5)
+        filters = data.get('filters')
+
+        if (queries is None) == (embeddings is None):
+            return jsonify({"error": "Provide exactly one of 'queries' or 'embeddings'"}), 400
+        if not isinstance(queries if queries is not None else embeddings, list):
+            return jsonify({"error": "'queries' or 'embeddings' must be a list"}), 400
+        if not isinstance(top_k, int) or isinstance(top_k, bool) or not 1 <= top_k <= SEARCH_BATCH_MAX_TOP_K:
+            return jsonify({"error": f"'top_k' must be an integer from 1 to {SEARCH_BATCH_MAX_TOP_K}"}), 400
+        num_queries = len(queries if queries is not None else embeddings)
+        if num_queries == 0:
+            return jsonify({"results": []}), 200
+        if num_queries > SEARCH_BATCH_MAX_QUERIES:
+            return jsonify({"error": f"At most {SEARCH_BATCH_MAX_QUERIES} queries per batch"}), 400
+
+        if queries is not None:
+            # Embed all query texts in a few batched requests
+            embeddings = get_embedding_generator().get_embeddings(queries, task_type="RETRIEVAL_QUERY")
+            if embeddings is None:
+                return jsonify({"error": "Failed to generate query embeddings"}), 500
+
+        results = get_vector_db_client().query_batch(embeddings, top_k=top_k, filters=filters)
+        if results is None:
+            return jsonify({"error": "Batch search failed"}), 400
+        logging.info(f"Batch search served {num_queries} queries (top_k={top_k})")
+        return jsonify({"results": results, "total_queries": num_queries}), 200
+    except Exception as e:
+        logging.exception(f"Error during batch search: {e}")
+        return jsonify({"error": "Server error during batch search", "detail": str(e)}), 500
+
+@app.route('/api/search/cache/stats', methods=['GET'])
+def search_cache_stats():
+    """Hit rates and sizes of the web search, translation and RAG response caches"""
+    response_cache = get_recommender().response_cache
+    return jsonify({
+        "web_search": dict(web_search_cache.stats(), enabled=EXA_CACHE_ENABLED),
+        "translation": language_service.translation_stats(),
+        "rag_responses": response_cache.stats() if response_cache is not None else None
+    }), 200
+
 @app.route('/api/analytics/summary', methods=['GET'])
 def get_analytics_summary():
     """Get analytics summary"""
@@ -638,18 +910,10 @@ def get_analytics_summary():
         days = int(request.args.get('days', 30))
         
         async def get_analytics_wrapper():
-            from src.database.database_service import db_service
-            from src.database.postgres_mcp_server import mcp_server
-
-            await mcp_server.initialize()
-            await db_service.initialize()
-
-            analytics_data = await db_service.get_analytics_summary(customer_id, days)
+            db_service = await get_database_service()
+            return await db_service.get_analytics_summary(customer_id, days)
             
-            await mcp_server.close()
-            return analytics_data
-            
-        result = asyncio.run(get_analytics_wrapper())
+        result = run_db(get_analytics_wrapper())
         
         if result["success"]:
             return jsonify(result), 200
@@ -659,8 +923,6 @@ def get_analytics_summary():
             
     except Exception as e:
         logging.exception(f"Error getting analytics: {e}")
-        if isinstance(e, RuntimeError) and "event loop" in str(e).lower():
-            return jsonify({"error": "Event loop management issue", "detail": str(e)}), 500
         return jsonify({"error": "Server error during analytics retrieval", "detail": str(e)}), 500
 
 @app.route('/api/database/status', methods=['GET'])
@@ -674,43 +936,16 @@ def get_database_status():
         
         if DATABASE_AVAILABLE:
             try:
-                # Use threading to avoid event loop conflicts
-                import threading
-                import queue
-                
-                result_queue = queue.Queue()
-                
-                def check_db_status():
-                    try:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        
-                        async def check_status():
-                            db_service = await get_database_service()
-                            return db_service is not None
-                        
-                        db_healthy = loop.run_until_complete(check_status())
-                        loop.close()
-                        result_queue.put(("success", db_healthy))
-                    except Exception as e:
-                        result_queue.put(("error", str(e)))
+                async def check_status():
+                    db_service = await get_database_service()
+                    return db_service is not None and mcp_server.pool is not None
                 
-                thread = threading.Thread(target=check_db_status)
-                thread.start()
-                thread.join(timeout=10)  # 10 second timeout
-                
-                if thread.is_alive():
-                    status["database_healthy"] = False
-                    status["mcp_server"] = "timeout"
-                else:
-                    result_status, result = result_queue.get_nowait()
-                    if result_status == "success":
-                        status["database_healthy"] = result
-                        status["mcp_server"] = "operational" if result else "error"
-                    else:
-                        status["database_healthy"] = False
-                        status["mcp_server"] = "error"
-                        status["error"] = result
+                db_healthy = run_db(check_status(), timeout=10)  # 10 second timeout
+                status["database_healthy"] = db_healthy
+                status["mcp_server"] = "operational" if db_healthy else "error"
+            except concurrent.futures.TimeoutError:
+                status["database_healthy"] = False
+                status["mcp_server"] = "timeout"
             except Exception as e:
                 status["database_healthy"] = False
                 status["mcp_server"] = "error"
@@ -731,33 +966,14 @@ def get_mcp_operations():
     try:
         limit = int(request.args.get('limit', 10))
         
-        async def get_operations_async():
-            from src.database.postgres_mcp_server import PostgresMCPServer
-            mcp_server = PostgresMCPServer()
-            await mcp_server.initialize()
-            
-            # Use $1 parameter instead of %s for PostgreSQL
-            result = await mcp_server.execute_query("""
-                SELECT operation_id, operation_type, status, created_at, 
-                       execution_time_ms, error_message
-                FROM mcp_operations 
-                ORDER BY created_at DESC 
-                LIMIT $1
-            """, [limit])
-            
-            await mcp_server.close()
-            return result
-        
-        # Run in a new event loop
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(get_operations_async())
-            loop.close()
-        except RuntimeError:
-            # If we can't create a new loop, try to get the existing one
-            result = asyncio.create_task(get_operations_async())
-            result = asyncio.get_event_loop().run_until_complete(result)
+        # Use $1 parameter instead of %s for PostgreSQL
+        result = run_db(mcp_execute_query("""
+            SELECT operation_id, operation_type, status, created_at, 
+                   execution_time_ms, error_message
+            FROM mcp_operations 
+            ORDER BY created_at DESC 
+            LIMIT $1
+        """, [limit]))
         
         if result["success"]:
             return jsonify({
@@ -773,57 +989,130 @@ def get_mcp_operations():
         return jsonify({"error": "Server error", "message": str(e)}), 500
 
 # === Speech Service API Endpoints ===
+# The *_result helpers return (body, status) and are shared with the ASGI app
 
-@app.route('/api/speech/text-to-speech', methods=['POST'])
-def text_to_speech_api():
+# Map language codes to full names
+SPEECH_LANGUAGES = {
+    'hi': 'hindi',
+    'en': 'english',
+    'mr': 'marathi'
+}
+
+def text_to_speech_result(data):
     """Convert text to speech and return audio"""
-    try:
-        data = request.get_json()
-        text = data.get('text')
-        language = data.get('language', 'english')
+    text = data.get('text')
+    language = data.get('language', 'english')
 
-        if not text:
-            return jsonify({"error": "Missing text to convert to speech"}), 400
+    if not text:
+        return {"error": "Missing text to convert to speech"}, 400
 
-        # Map language codes to full names
-        language_map = {
-            'hi': 'hindi',
-            'en': 'english', 
-            'mr': 'marathi'
-        }
-        language = language_map.get(language, language)
+    language = SPEECH_LANGUAGES.get(language, language)
 
-        logging.info(f"Converting text to speech: '{text[:50]}...' in {language}")
-        
-        # Get speech service and convert text to speech
+    logging.info(f"Converting text to speech: '{text[:50]}...' in {language}")
+
+    # Get speech service and convert text to speech
+    speech_service = get_speech_service()
+    result = speech_service.text_to_speech(text, language)
+
+    if result['success']:
+        # Handle different response types
+        if 'audio_data' in result:
+            # Encode audio data to base64 for JSON response
+            audio_base64 = base64.b64encode(result['audio_data']).decode('utf-8')
+            return {
+                "success": True,
+                "audio_base64": audio_base64,
+                "service": result.get('service', 'unknown'),
+                "language": result.get('language', language)
+            }, 200
+        elif 'audio_path' in result:
+            # Return path for download
+            return {
+                "success": True,
+                "audio_path": result['audio_path'],
+                "service": result.get('service', 'unknown'),
+                "language": result.get('language', language)
+            }, 200
+    return {
+        "success": False,
+        "error": result.get('error', 'TTS conversion failed')
+    }, 400
+
+def speech_to_text_result(audio_path, filename, language, mime_type):
+    """Transcribe a saved audio upload, then remove the file"""
+    language = SPEECH_LANGUAGES.get(language, language)
+
+    logging.info(f"Processing audio file: {filename} (mimeType: {mime_type}) for {language}")
+    logging.info(f"Audio file size: {os.path.getsize(audio_path)} bytes")
+
+    try:
+        # Get speech service and transcribe
         speech_service = get_speech_service()
-        result = speech_service.text_to_speech(text, language)
-
-        if result['success']:
-            # Handle different response types
-            if 'audio_data' in result:
-                # Encode audio data to base64 for JSON response
-                audio_base64 = base64.b64encode(result['audio_data']).decode('utf-8')
-                return jsonify({
-                    "success": True,
-                    "audio_base64": audio_base64,
-                    "service": result.get('service', 'unknown'),
-                    "language": result.get('language', language)
-                }), 200
-            elif 'audio_path' in result:
-                # Return path for download
-                return jsonify({
-                    "success": True,
-                    "audio_path": result['audio_path'],
-                    "service": result.get('service', 'unknown'),
-                    "language": result.get('language', language)
-                }), 200
-        else:
-            return jsonify({
-                "success": False,
-                "error": result.get('error', 'TTS conversion failed')
-            }), 400
+        result = speech_service.speech_to_text(audio_path, language)
+    finally:
+        # Clean up temporary file
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+
+    if result['success']:
+        return {
+            "success": True,
+            "transcription": result['transcription'],
+            "confidence": result.get('confidence', 0.0),
+            "service": result.get('service', 'unknown'),
+            "language": result.get('language', language)
+        }, 200
+    return {
+        "success": False,
+        "error": result.get('error', 'STT conversion failed')
+    }, 400
+
+def record_and_transcribe_result(data):
+    """Record audio from microphone and transcribe"""
+    language = data.get('language', 'english')
+    duration = data.get('duration', 5)  # Default 5 seconds
+
+    language = SPEECH_LANGUAGES.get(language, language)
+
+    logging.info(f"Recording audio for {duration} seconds in {language}")
+
+    # Get speech service and record + transcribe
+    speech_service = get_speech_service()
+    result = speech_service.record_from_microphone(duration, language)
+
+    if result['success']:
+        return {
+            "success": True,
+            "transcription": result['transcription'],
+            "confidence": result.get('confidence', 0.0),
+            "service": result.get('service', 'unknown'),
+            "language": result.get('language', language),
+            "duration": result.get('recording_duration', duration)
+        }, 200
+    return {
+        "success": False,
+        "error": result.get('error', 'Recording failed')
+    }, 400
+
+def speech_services_test_result():
+    """Test all speech services"""
+    return {
+        "success": True,
+        "test_results": get_speech_service().test_speech_services()
+    }, 200
+
+def available_voices_result(language):
+    """Get available voices for a language"""
+    return get_speech_service().get_available_voices(language), 200
 
+@app.route('/api/speech/text-to-speech', methods=['POST'])
+def text_to_speech_api():
+    """Convert text to speech and return audio"""
+    try:
+        body, status = text_to_speech_result(request.get_json())
+        return jsonify(body), status
     except Exception as e:
         logging.exception(f"Error in text_to_speech_api: {str(e)}")
         return jsonify({"error": "Server error during TTS conversion", "message": str(e)}), 500
@@ -832,20 +1121,9 @@ def text_to_speech_api():
 def speech_to_text_api():
     """Convert speech to text from uploaded audio file"""
     try:
-        language = request.form.get('language', 'english')
-        mime_type = request.form.get('mimeType', 'audio/webm')
-        
-        # Map language codes to full names
-        language_map = {
-            'hi': 'hindi',
-            'en': 'english', 
-            'mr': 'marathi'
-        }
-        language = language_map.get(language, language)
-
         if 'audio' not in request.files:
             return jsonify({"error": "No audio file provided"}), 400
-        
+
         audio_file = request.files['audio']
         if audio_file.filename == '':
             return jsonify({"error": "No audio file selected"}), 400
@@ -854,33 +1132,11 @@ def speech_to_text_api():
         filename = secure_filename(audio_file.filename)
         audio_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         audio_file.save(audio_path)
-        
-        logging.info(f"Processing audio file: {filename} (mimeType: {mime_type}) for {language}")
-        logging.info(f"Audio file size: {os.path.getsize(audio_path)} bytes")
-
-        # Get speech service and transcribe
-        speech_service = get_speech_service()
-        result = speech_service.speech_to_text(audio_path, language)
 
-        # Clean up temporary file
-        try:
-            os.remove(audio_path)
-        except:
-            pass
-
-        if result['success']:
-            return jsonify({
-                "success": True,
-                "transcription": result['transcription'],
-                "confidence": result.get('confidence', 0.0),
-                "service": result.get('service', 'unknown'),
-                "language": result.get('language', language)
-            }), 200
-        else:
-            return jsonify({
-                "success": False,
-                "error": result.get('error', 'STT conversion failed')
-            }), 400
+        body, status = speech_to_text_result(
+            audio_path, filename, request.form.get('language', 'english'), request.form.get('mimeType', 'audio/webm')
+        )
+        return jsonify(body), status
 
     except Exception as e:
         logging.exception(f"Error in speech_to_text_api: {str(e)}")
@@ -890,39 +1146,8 @@ def speech_to_text_api():
 def record_and_transcribe_api():
     """Record audio from microphone and transcribe"""
     try:
-        data = request.get_json()
-        language = data.get('language', 'english')
-        duration = data.get('duration', 5)  # Default 5 seconds
-
-        # Map language codes to full names
-        language_map = {
-            'hi': 'hindi',
-            'en': 'english', 
-            'mr': 'marathi'
-        }
-        language = language_map.get(language, language)
-
-        logging.info(f"Recording audio for {duration} seconds in {language}")
-
-        # Get speech service and record + transcribe
-        speech_service = get_speech_service()
-        result = speech_service.record_from_microphone(duration, language)
-
-        if result['success']:
-            return jsonify({
-                "success": True,
-                "transcription": result['transcription'],
-                "confidence": result.get('confidence', 0.0),
-                "service": result.get('service', 'unknown'),
-                "language": result.get('language', language),
-                "duration": result.get('recording_duration', duration)
-            }), 200
-        else:
-            return jsonify({
-                "success": False,
-                "error": result.get('error', 'Recording failed')
-            }), 400
-
+        body, status = record_and_transcribe_result(request.get_json())
+        return jsonify(body), status
     except Exception as e:
         logging.exception(f"Error in record_and_transcribe_api: {str(e)}")
         return jsonify({"error": "Server error during recording", "message": str(e)}), 500
@@ -931,14 +1156,8 @@ def record_and_transcribe_api():
 def test_speech_services():
     """Test all speech services"""
     try:
-        speech_service = get_speech_service()
-        test_results = speech_service.test_speech_services()
-        
-        return jsonify({
-            "success": True,
-            "test_results": test_results
-        }), 200
-
+        body, status = speech_services_test_result()
+        return jsonify(body), status
     except Exception as e:
         logging.exception(f"Error testing speech services: {str(e)}")
         return jsonify({"error": "Error testing speech services", "message": str(e)}), 500
@@ -947,13 +1166,8 @@ def test_speech_services():
 def get_available_voices():
     """Get available voices for a language"""
     try:
-        language = request.args.get('language', 'english')
-        
-        speech_service = get_speech_service()
-        result = speech_service.get_available_voices(language)
-        
-        return jsonify(result), 200
-
+        body, status = available_voices_result(request.args.get('language', 'english'))
+        return jsonify(body), status
     except Exception as e:
         logging.exception(f"Error getting voices: {str(e)}")
         return jsonify({"error": "Error getting voices", "message": str(e)}), 500
@@ -970,17 +1184,9 @@ def database_status():
     
     if DATABASE_AVAILABLE:
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            async def check_services():
-                from src.database.postgres_mcp_server import mcp_server
-                # Simple connectivity test
-                result = await mcp_server.execute_query("SELECT 1 as test")
-                return result["success"]
-            
-            postgres_status = loop.run_until_complete(check_services())
-            loop.close()
+            # Simple connectivity test
+            result = run_db(mcp_execute_query("SELECT 1 as test"))
+            postgres_status = result["success"]
             
             status["services"]["postgresql_mcp"] = postgres_status
             
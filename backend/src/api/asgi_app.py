@@ -0,0 +1,546 @@
+"""
+ASGI entry point for the SBI Personalization Engine API
+
+Serves the same routes and JSON bodies as the Flask app in api/app.py. The
+LLM-, database- and upload-bound routes (/chat, /gemini_search, /upload_pdf,
+/api/speech and the /api/customer, /api/analytics, /api/database and /api/mcp
+endpoints) are native coroutines: the OpenAI calls and the asyncpg queries are
+awaited on the server loop, and blocking clients (Gemini embeddings, FAISS,
+Exa, the translator, the speech service) run in worker threads, so one process
+can hold many requests that are waiting on the LLM. Every other route is
+passed through to the Flask app, which runs in a thread pool.
+
+The recommendation engine (and its ingestion queue) is created in the lifespan,
+after the server loop has been adopted as the database loop.
+
+/chat and /gemini_search stream their answers as Server-Sent Events when the
+request sends "stream": true or Accept: text/event-stream.
+
+Run with API_SERVER_MODE=asgi python run.py, or uvicorn api.asgi_app:asgi_app.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.utils import secure_filename
+
+from api.app import (
+    app as flask_app, get_recommender, language_service, finalize_chat_response, DATABASE_AVAILABLE,
+    SEARCH_BRANCHES, search_stage_executor, _timed_branch, elapsed_ms, synthesis_request,
+    synthesis_fallback_text, format_response_text, search_response_body, search_done_payload,
+    allowed_file, index_pdf_chunks, pdf_upload_response, text_to_speech_result,
+    speech_to_text_result, record_and_transcribe_result, speech_services_test_result,
+    available_voices_result
+)
+from src.utils.response_streaming import SSE_HEADERS, ParagraphStreamer, sse_event, wants_event_stream
+
+if DATABASE_AVAILABLE:
+    from src.database.database_service import get_database_service
+    from src.database.postgres_mcp_server import mcp_execute_query, mcp_server
+    from src.database.db_event_loop import use_event_loop
+
+class FlaskJSONResponse(JSONResponse):
+    """JSON response encoded by the Flask app's JSON provider, so both servers return identical bodies"""
+
+    def render(self, content):
+        return flask_app.json.dumps(content).encode("utf-8")
+
+def jsonify(content, status_code=200):
+    return FlaskJSONResponse(content, status_code=status_code)
+
+async def get_json(request):
+    """Request body as JSON, or None if it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+def database_unavailable():
+    return jsonify({"error": "Database service not available"}, 503)
+
+async def chat_api(request):
+    """Enhanced chat API with PostgreSQL MCP Server integration"""
+    try:
+        data = await get_json(request)
+        if not data:
+            logging.warning("No JSON data received in chat request")
+            return jsonify({"error": "No JSON data received"}, 400)
+
+        customer_id = data.get('customer_id')
+        user_input_text = data.get('user_input_text')
+        user_language = data.get('language', 'en')
+        logging.info(f"Received chat request: customer_id={customer_id}, language={user_language}, input='{user_input_text[:50] if user_input_text else 'None'}...'")
+
+        if not customer_id or not user_input_text:
+            logging.warning("Missing customer_id or user_input_text in chat request")
+            return jsonify({"error": "Missing customer_id or user_input_text"}, 400)
+
+        english_query = await asyncio.to_thread(language_service.translate_to_english, user_input_text, user_language)
+        logging.info(f"Translated query to English: '{english_query[:50]}...'")
+
+        if wants_event_stream(data, request.headers.get('accept')):
+            events = get_recommender().astream_user_interaction(
+                customer_id, english_query, user_language=user_language, additional_metadata={"api_endpoint": "chat"}
+            )
+            return StreamingResponse(chat_stream_events(events, user_language),
+                                     media_type='text/event-stream', headers=SSE_HEADERS)
+
+        # The engine queues the turn for storage once; it reaches FAISS and PostgreSQL in a background batch
+        recommender = get_recommender()
+        response = await recommender.aprocess_user_interaction(
+            customer_id, english_query, user_language=user_language, additional_metadata={"api_endpoint": "chat"}
+        )
+        response = finalize_chat_response(response, user_language, recommender.ingestion_queue.stores_to_database)
+
+        logging.info(f"Sending final response: {response}")
+        return jsonify(response)
+
+    except Exception as e:
+        logging.exception(f"Error in chat_api: {str(e)}")
+        return jsonify({"error": "Server error", "message": str(e)}, 500)
+
+async def chat_stream_events(events, user_language):
+    """Async version of api.app.chat_stream_events"""
+    try:
+        async for event, payload in events:
+            if event == "done":
+                payload = finalize_chat_response(payload, user_language, get_recommender().ingestion_queue.stores_to_database)
+                logging.info(f"Sending final streamed response: {payload}")
+            yield sse_event(event, payload)
+    except Exception as e:
+        logging.exception(f"Error while streaming chat response: {str(e)}")
+        yield sse_event("error", {"error": "Server error", "message": str(e)})
+
+async def gather_search_context(english_query, timings):
+    """Async version of api.app.gather_search_context: the same branches, deadlines and fallbacks"""
+    loop = asyncio.get_running_loop()
+    branch_start = time.monotonic()
+    futures = {
+        stage: loop.run_in_executor(search_stage_executor, _timed_branch, func, english_query)
+        for stage, (func, _, _) in SEARCH_BRANCHES.items()
+    }
+    results = {}
+    for stage, (_, timeout, fallback) in SEARCH_BRANCHES.items():
+        try:
+            remaining = max(0, branch_start + timeout - time.monotonic())
+            # shield: a late branch keeps running in its thread, as with the Flask route
+            results[stage], timings[stage] = await asyncio.wait_for(asyncio.shield(futures[stage]), remaining)
+        except asyncio.TimeoutError:
+            logging.warning(f"/gemini_search {stage} branch still running after {timeout}s; answering without it")
+            results[stage], timings[stage] = fallback, None
+        except Exception as e:
+            logging.error(f"/gemini_search {stage} branch failed: {e}")
+            results[stage], timings[stage] = fallback, None
+    return results["knowledge_base"], results["web_search"]
+
+async def exa_search_api(request):
+    """Enhanced search API using Exa web search with internal knowledge base grounding
+
+    Send "stream": true (or Accept: text/event-stream) to receive the answer as Server-Sent Events.
+    """
+    try:
+        data = await get_json(request)
+        if not data:
+            return jsonify({"error": "No JSON data received"}, 400)
+        query = data.get('query')
+        user_language = data.get('language', 'en')
+        logging.info(f"Received Exa Search request: language={user_language}, query='{query[:50] if query else 'None'}...'")
+
+        if not query:
+            logging.warning("Missing query in Exa Search request")
+            return jsonify({"error": "Missing query"}, 400)
+
+        request_start = time.perf_counter()
+        timings = {}
+
+        # 1. Translate query to English for embedding/search consistency
+        stage_start = time.perf_counter()
+        english_query_for_search = await asyncio.to_thread(language_service.translate_to_english, query, user_language)
+        timings["translate_query"] = elapsed_ms(stage_start)
+
+        # 2. Knowledge base (FAISS) and Exa web search
+        context, web_search_results = await gather_search_context(english_query_for_search, timings)
+
+        if wants_event_stream(data, request.headers.get('accept')):
+            return StreamingResponse(
+                stream_search_response(query, user_language, context, web_search_results, timings, request_start),
+                media_type='text/event-stream', headers=SSE_HEADERS
+            )
+
+        # 3. Use OpenAI to synthesize the response
+        stage_start = time.perf_counter()
+        try:
+            client = get_recommender().async_openai_client
+            if client is None:
+                raise RuntimeError("OpenAI client not initialized")
+            response = await client.chat.completions.create(**synthesis_request(query, context, web_search_results))
+            response_text = format_response_text(response.choices[0].message.content)
+            logging.info(f"Received response from OpenAI: '{response_text[:100]}...'")
+        except Exception as openai_error:
+            logging.error(f"OpenAI synthesis failed: {openai_error}")
+            response_text = synthesis_fallback_text(context, web_search_results)
+        timings["synthesis"] = elapsed_ms(stage_start)
+
+        # 4. Translate response if needed
+        return jsonify(await asyncio.to_thread(search_response_body, response_text, user_language, timings, request_start))
+
+    except Exception as e:
+        logging.exception(f"Error in exa_search_api: {str(e)}")
+        return jsonify({"error": "Server error during Exa search", "message": str(e)}, 500)
+
+async def stream_search_response(query, user_language, context, web_search_results, timings, request_start):
+    """Async version of api.app.stream_search_response"""
+    english_paragraphs, shown_paragraphs = [], []
+
+    async def paragraph_events(paragraphs):
+        events = []
+        for paragraph in paragraphs:
+            english_paragraphs.append(paragraph)
+            if user_language != 'en':
+                translate_start = time.perf_counter()
+                paragraph = await asyncio.to_thread(language_service.translate_from_english, paragraph, user_language)
+                timings["translate_response"] = timings.get("translate_response", 0) + elapsed_ms(translate_start)
+            if not shown_paragraphs:
+                timings["first_paragraph"] = elapsed_ms(request_start)
+            separator = "\n\n" if shown_paragraphs else ""
+            shown_paragraphs.append(paragraph)
+            events.append(sse_event("token", {"text": separator + paragraph}))
+        return events
+
+    formatter = ParagraphStreamer(format_response_text)
+    stage_start = time.perf_counter()
+    try:
+        client = get_recommender().async_openai_client
+        if client is None:
+            raise RuntimeError("OpenAI client not initialized")
+        stream = await client.chat.completions.create(**synthesis_request(query, context, web_search_results), stream=True)
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                for event in await paragraph_events(formatter.feed(delta)):
+                    yield event
+        for event in await paragraph_events(formatter.finish()):
+            yield event
+    except Exception as openai_error:
+        logging.error(f"OpenAI synthesis failed: {openai_error}")
+        if not english_paragraphs:
+            for event in await paragraph_events([synthesis_fallback_text(context, web_search_results)]):
+                yield event
+    timings["synthesis"] = elapsed_ms(stage_start)
+    timings["total"] = elapsed_ms(request_start)
+    logging.info(f"/gemini_search stage timings (ms): {timings}")
+    yield sse_event("done", search_done_payload(user_language, english_paragraphs, shown_paragraphs, timings))
+
+def save_upload(upload, path):
+    with open(path, 'wb') as destination:
+        shutil.copyfileobj(upload.file, destination)
+
+async def upload_pdf_api(request):
+    """Embed an uploaded PDF into the knowledge base and record it in PostgreSQL"""
+    form = await request.form()
+    file = form.get('file')
+    if file is None or isinstance(file, str):
+        logging.warning("Upload PDF request missing file part")
+        return jsonify({"error": "No file part in the request"}, 400)
+    if file.filename == '':
+        logging.warning("Upload PDF request has empty filename")
+        return jsonify({"error": "No selected file"}, 400)
+    if not allowed_file(file.filename):
+        logging.warning(f"Upload attempt with invalid file type: {file.filename}")
+        return jsonify({"error": "Invalid file type. Only PDF files are allowed."}, 400)
+
+    filename = secure_filename(file.filename)
+    pdf_path = os.path.join(flask_app.config['UPLOAD_FOLDER'], filename)
+    try:
+        await asyncio.to_thread(save_upload, file, pdf_path)
+        logging.info(f"PDF file saved temporarily to: {pdf_path}")
+
+        extracted_count, processed_count, document_chunks = await asyncio.to_thread(index_pdf_chunks, pdf_path, filename)
+
+        # Record the document and its chunks in PostgreSQL too: one transaction, chunks via COPY
+        if processed_count > 0 and DATABASE_AVAILABLE:
+            try:
+                db_service = await get_database_service()
+                document_result = await db_service.store_document_processing(
+                    filename, "\n\n".join(chunk["text"] for chunk in document_chunks), chunks=document_chunks
+                )
+                if not document_result.get("success"):
+                    logging.warning(f"Could not record '{filename}' in PostgreSQL: {document_result.get('error')}")
+            except Exception as e:
+                logging.warning(f"Could not record '{filename}' in PostgreSQL: {e}")
+
+        body, status = pdf_upload_response(filename, extracted_count, processed_count)
+        return jsonify(body, status)
+
+    except Exception as e:
+        logging.exception(f"Error processing PDF upload '{filename}': {str(e)}")
+        return jsonify({"error": "Server error during PDF processing", "message": str(e)}, 500)
+    finally:
+        await file.close()
+        if os.path.exists(pdf_path):
+            try:
+                os.remove(pdf_path)
+                logging.info(f"Removed temporary file: {pdf_path}")
+            except Exception as e:
+                logging.error(f"Error removing temporary file {pdf_path}: {e}")
+
+async def text_to_speech_api(request):
+    """Convert text to speech and return audio"""
+    try:
+        body, status = await asyncio.to_thread(text_to_speech_result, await get_json(request) or {})
+        return jsonify(body, status)
+    except Exception as e:
+        logging.exception(f"Error in text_to_speech_api: {str(e)}")
+        return jsonify({"error": "Server error during TTS conversion", "message": str(e)}, 500)
+
+async def speech_to_text_api(request):
+    """Convert speech to text from uploaded audio file"""
+    try:
+        form = await request.form()
+        audio_file = form.get('audio')
+        if audio_file is None or isinstance(audio_file, str):
+            return jsonify({"error": "No audio file provided"}, 400)
+        if audio_file.filename == '':
+            return jsonify({"error": "No audio file selected"}, 400)
+
+        # Save the uploaded audio file temporarily
+        filename = secure_filename(audio_file.filename)
+        audio_path = os.path.join(flask_app.config['UPLOAD_FOLDER'], filename)
+        await asyncio.to_thread(save_upload, audio_file, audio_path)
+        await audio_file.close()
+
+        body, status = await asyncio.to_thread(
+            speech_to_text_result, audio_path, filename, form.get('language', 'english'), form.get('mimeType', 'audio/webm')
+        )
+        return jsonify(body, status)
+
+    except Exception as e:
+        logging.exception(f"Error in speech_to_text_api: {str(e)}")
+        return jsonify({"error": "Server error during STT conversion", "message": str(e)}, 500)
+
+async def record_and_transcribe_api(request):
+    """Record audio from microphone and transcribe"""
+    try:
+        body, status = await asyncio.to_thread(record_and_transcribe_result, await get_json(request) or {})
+        return jsonify(body, status)
+    except Exception as e:
+        logging.exception(f"Error in record_and_transcribe_api: {str(e)}")
+        return jsonify({"error": "Server error during recording", "message": str(e)}, 500)
+
+async def test_speech_services(request):
+    """Test all speech services"""
+    try:
+        body, status = await asyncio.to_thread(speech_services_test_result)
+        return jsonify(body, status)
+    except Exception as e:
+        logging.exception(f"Error testing speech services: {str(e)}")
+        return jsonify({"error": "Error testing speech services", "message": str(e)}, 500)
+
+async def get_available_voices(request):
+    """Get available voices for a language"""
+    try:
+        body, status = await asyncio.to_thread(available_voices_result, request.query_params.get('language', 'english'))
+        return jsonify(body, status)
+    except Exception as e:
+        logging.exception(f"Error getting voices: {str(e)}")
+        return jsonify({"error": "Error getting voices", "message": str(e)}, 500)
+
+async def get_customer_profile(request):
+    """Get comprehensive customer profile"""
+    if not DATABASE_AVAILABLE:
+        return database_unavailable()
+
+    customer_id = request.path_params['customer_id']
+    try:
+        db_service = await get_database_service()
+        result = await db_service.get_customer_profile(customer_id)
+
+        if result["success"]:
+            return jsonify(result["profile"])
+        logging.error(f"Profile retrieval failed for {customer_id}: {result.get('error')}")
+        return jsonify({"error": result.get("error", "Failed to get profile")}, 400)
+
+    except Exception as e:
+        logging.exception(f"Error getting customer profile for {customer_id}: {e}")
+        return jsonify({"error": "Server error during profile retrieval", "detail": str(e)}, 500)
+
+async def update_customer_preferences(request):
+    """Update customer preferences"""
+    if not DATABASE_AVAILABLE:
+        return database_unavailable()
+
+    customer_id = request.path_params['customer_id']
+    try:
+        data = await get_json(request) or {}
+        preference_type = data.get('preference_type')
+        preference_value = data.get('preference_value')
+        confidence_score = data.get('confidence_score', 0.5)
+
+        if not preference_type or preference_value is None:
+            return jsonify({"error": "Missing preference_type or preference_value"}, 400)
+
+        db_service = await get_database_service()
+        result = await db_service.update_customer_preferences(
+            customer_id, preference_type, preference_value, confidence_score
+        )
+
+        if result["success"]:
+            return jsonify({"message": "Preferences updated successfully"})
+        logging.error(f"Failed to update preferences for {customer_id}: {result.get('error')}")
+        return jsonify({"error": result.get("error", "Failed to update preferences")}, 400)
+
+    except Exception as e:
+        logging.exception(f"Error updating customer preferences for {customer_id}: {e}")
+        return jsonify({"error": "Server error during preference update", "detail": str(e)}, 500)
+
+async def search_similar_interactions(request):
+    """Search for similar interactions"""
+    if not DATABASE_AVAILABLE:
+        return database_unavailable()
+
+    customer_id = request.path_params['customer_id']
+    try:
+        data = await get_json(request) or {}
+        query_text = data.get('query_text')
+        top_k = data.get('top_k', 5)
+
+        if not query_text:
+            return jsonify({"error": "Missing query_text"}, 400)
+
+        db_service = await get_database_service()
+        result = await db_service.search_similar_interactions(customer_id, query_text, top_k)
+
+        if result["success"]:
+            return jsonify(result)
+        logging.error(f"Similar interactions search failed for {customer_id}: {result.get('error')}")
+        return jsonify({"error": result.get("error", "Search failed")}, 400)
+
+    except Exception as e:
+        logging.exception(f"Error searching similar interactions for {customer_id}: {e}")
+        return jsonify({"error": "Server error during similar interactions search", "detail": str(e)}, 500)
+
+async def get_analytics_summary(request):
+    """Get analytics summary"""
+    if not DATABASE_AVAILABLE:
+        return database_unavailable()
+
+    try:
+        customer_id = request.query_params.get('customer_id')
+        days = int(request.query_params.get('days', 30))
+
+        db_service = await get_database_service()
+        result = await db_service.get_analytics_summary(customer_id, days)
+
+        if result["success"]:
+            return jsonify(result)
+        logging.error(f"Analytics retrieval failed: {result.get('error')}")
+        return jsonify({"error": result.get("error", "Analytics failed")}, 400)
+
+    except Exception as e:
+        logging.exception(f"Error getting analytics: {e}")
+        return jsonify({"error": "Server error during analytics retrieval", "detail": str(e)}, 500)
+
+async def get_database_status(request):
+    """Get database and MCP server status"""
+    try:
+        status = {
+            "database_available": DATABASE_AVAILABLE,
+            "timestamp": datetime.now().isoformat()
+        }
+
+        if DATABASE_AVAILABLE:
+            try:
+                async def check_status():
+                    db_service = await get_database_service()
+                    return db_service is not None and mcp_server.pool is not None
+
+                db_healthy = await asyncio.wait_for(check_status(), timeout=10)  # 10 second timeout
+                status["database_healthy"] = db_healthy
+                status["mcp_server"] = "operational" if db_healthy else "error"
+            except asyncio.TimeoutError:
+                status["database_healthy"] = False
+                status["mcp_server"] = "timeout"
+            except Exception as e:
+                status["database_healthy"] = False
+                status["mcp_server"] = "error"
+                status["error"] = str(e)
+
+        return jsonify(status)
+
+    except Exception as e:
+        logging.exception(f"Error checking database status: {e}")
+        return jsonify({"error": "Server error", "message": str(e)}, 500)
+
+async def get_mcp_operations(request):
+    """Get recent MCP operations for monitoring"""
+    if not DATABASE_AVAILABLE:
+        return database_unavailable()
+
+    try:
+        limit = int(request.query_params.get('limit', 10))
+
+        await mcp_server.initialize()
+        result = await mcp_execute_query("""
+            SELECT operation_id, operation_type, status, created_at,
+                   execution_time_ms, error_message
+            FROM mcp_operations
+            ORDER BY created_at DESC
+            LIMIT $1
+        """, [limit])
+
+        if result["success"]:
+            return jsonify({
+                "success": True,
+                "operations": result["rows"],
+                "count": len(result["rows"])
+            })
+        return jsonify({"error": result.get("error", "Failed to get operations")}, 400)
+
+    except Exception as e:
+        logging.exception(f"Error getting MCP operations: {e}")
+        return jsonify({"error": "Server error", "message": str(e)}, 500)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    if DATABASE_AVAILABLE:
+        # The pool must live on the server loop; Flask routes reach it through run_db()
+        use_event_loop(asyncio.get_running_loop())
+    # Only now: the engine starts the ingestion queue, which must use the loop adopted above
+    recommender = await asyncio.to_thread(get_recommender)
+    yield
+    await asyncio.to_thread(recommender.ingestion_queue.close)
+    if DATABASE_AVAILABLE:
+        await mcp_server.close()
+
+asgi_app = Starlette(
+    routes=[
+        Route('/chat', chat_api, methods=['POST']),
+        Route('/gemini_search', exa_search_api, methods=['POST']),
+        Route('/upload_pdf', upload_pdf_api, methods=['POST']),
+        Route('/api/speech/text-to-speech', text_to_speech_api, methods=['POST']),
+        Route('/api/speech/speech-to-text', speech_to_text_api, methods=['POST']),
+        Route('/api/speech/record-and-transcribe', record_and_transcribe_api, methods=['POST']),
+        Route('/api/speech/test', test_speech_services, methods=['GET']),
+        Route('/api/speech/voices', get_available_voices, methods=['GET']),
+        Route('/api/customer/{customer_id}/profile', get_customer_profile, methods=['GET']),
+        Route('/api/customer/{customer_id}/preferences', update_customer_preferences, methods=['POST']),
+        Route('/api/customer/{customer_id}/similar-interactions', search_similar_interactions, methods=['POST']),
+        Route('/api/analytics/summary', get_analytics_summary, methods=['GET']),
+        Route('/api/database/status', get_database_status, methods=['GET']),
+        Route('/api/mcp/operations', get_mcp_operations, methods=['GET']),
+        # Everything else (guidance, scraper test, vector and cache admin) is served by the Flask app
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,141 @@
+"""
+Buffered audit log for PostgresMCPServer operations
+
+Each operation is recorded once, as a finished mcp_operations row, in an
+in-memory buffer. A background task on the database event loop writes the
+buffer with one COPY per batch, so auditing adds no round trips to the
+operation itself. Failures are always recorded; successes are sampled
+(AUDIT_LOG_SUCCESS_SAMPLE_RATE). The buffer is bounded: if the database falls
+behind, the oldest records are dropped. close() writes what is left.
+"""
+import asyncio
+import json
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+
+from src.config.config import (
+    AUDIT_LOG_SUCCESS_SAMPLE_RATE,
+    AUDIT_LOG_MAX_BUFFER,
+    AUDIT_LOG_BATCH_SIZE,
+    AUDIT_LOG_FLUSH_INTERVAL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = [
+    "operation_id", "operation_type", "table_name", "operation_data", "status",
+    "error_message", "execution_time_ms", "created_at", "completed_at"
+]
+
+class AuditLog:
+    """
+    Batched writer of mcp_operations rows; record() is called on the database event loop
+    """
+
+    def __init__(self, get_pool, success_sample_rate=None, max_buffer=None, batch_size=None,
+                 flush_interval=None, sample=random.random):
+        """
+        Args:
+            get_pool: Returns the asyncpg pool to write with (None while it is closed)
+            success_sample_rate: Fraction of successful operations recorded (failures always are)
+            max_buffer: Records held before the oldest are dropped
+            batch_size: Records per COPY; a full batch is written without waiting for the interval
+            flush_interval: Seconds between background writes
+            sample: Returns a float in [0, 1); injectable for tests
+        """
+        self._get_pool = get_pool
+        self.success_sample_rate = AUDIT_LOG_SUCCESS_SAMPLE_RATE if success_sample_rate is None else success_sample_rate
+        self.max_buffer = max_buffer or AUDIT_LOG_MAX_BUFFER
+        self.batch_size = batch_size or AUDIT_LOG_BATCH_SIZE
+        self.flush_interval = flush_interval or AUDIT_LOG_FLUSH_INTERVAL_SECONDS
+        self._sample = sample
+        self._buffer = deque()
+        self._flusher = None
+        self._wakeup = None
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def record(self, operation_id: str, operation_type: str, operation_data, status: str,
+               execution_time_ms: int = None, error_message: str = None, table_name: str = None,
+               started_at: datetime = None):
+        """
+        Buffer one finished operation
+
+        Args:
+            status: "completed" or "failed"
+            started_at: When the operation started (naive UTC, as datetime.utcnow())
+        """
+        if status != "failed" and self._sample() >= self.success_sample_rate:
+            self.sampled_out += 1
+            return
+        completed_at = datetime.now(timezone.utc)
+        created_at = started_at.replace(tzinfo=timezone.utc) if started_at else completed_at
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append((
+            operation_id, operation_type, table_name, json.dumps(operation_data, default=str), status,
+            error_message, execution_time_ms, created_at, completed_at
+        ))
+        self._ensure_flusher()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write buffered records in batches; returns how many were written"""
+        written = 0
+        while self._buffer:
+            pool = self._get_pool()
+            if pool is None:
+                break  # Kept (bounded) until the pool is open again
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                async with pool.acquire() as connection:
+                    await connection.copy_records_to_table("mcp_operations", records=batch, columns=AUDIT_COLUMNS)
+                written += len(batch)
+            except asyncio.CancelledError:
+                self._buffer.extendleft(reversed(batch))
+                raise
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Failed to write {len(batch)} audit records: {e}")
+                break
+        self.written += written
+        return written
+
+    async def close(self):
+        """Stop the background writer and write what is left (call before closing the pool)"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "success_sample_rate": self.success_sample_rate
+        }
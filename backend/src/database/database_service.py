@@ -18,8 +18,8 @@ from src.database.postgres_mcp_server import (
     mcp_get_customer_data,
     mcp_store_message
 )
-from src.vector_database.vector_db_client import VectorDBClient
-from src.embedding_service.embedding_generator import EmbeddingGenerator
+from src.vector_database.vector_db_client import get_vector_db_client
+from src.embedding_service.embedding_generator import get_embedding_generator
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +29,9 @@ class DatabaseService:
     """
     
     def __init__(self):
-        self.vector_db = VectorDBClient()
-        self.embedding_generator = EmbeddingGenerator()
+        # Shared with the API routes and RecommendationEngine, so all see one index
+        self.vector_db = get_vector_db_client()
+        self.embedding_generator = get_embedding_generator()
         self._initialized = False
     
     async def initialize(self):
@@ -66,8 +67,9 @@ class DatabaseService:
             conversation_turn_id = f"{customer_id}_{int(datetime.now().timestamp())}"
             conversation_id = f"CONVO_{customer_id}_{datetime.now().strftime('%Y%m%d')}"
             
-            # Generate embedding for FAISS
-            embedding = self.embedding_generator.get_embedding(
+            # Generate embedding for FAISS (blocking client, so off the event loop)
+            embedding = await asyncio.to_thread(
+                self.embedding_generator.get_embedding,
                 interaction_text, 
                 task_type="RETRIEVAL_DOCUMENT"
             )
@@ -90,7 +92,8 @@ class DatabaseService:
                 faiss_metadata.update(additional_metadata)
             
             # Store in FAISS
-            faiss_success = self.vector_db.upsert_embedding(
+            faiss_success = await asyncio.to_thread(
+                self.vector_db.upsert_embedding,
                 conversation_turn_id, 
                 embedding, 
                 faiss_metadata
@@ -140,6 +143,43 @@ class DatabaseService:
             logger.error(f"Failed to store interaction: {e}")
             return {"success": False, "error": str(e)}
     
+    async def store_interactions(self, interactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Store a batch of customer turns in PostgreSQL (messages plus analytics rows)
+        
+        Used by the ingestion queue, which has already embedded the batch and added
+        it to FAISS; each entry carries conversation_turn_id, conversation_id,
+        customer_id, text, interaction_type, language, metadata and faiss_stored.
+        """
+        messages = []
+        interaction_rows = []
+        for interaction in interactions:
+            turn_id = interaction["conversation_turn_id"]
+            messages.append({
+                "message_id": turn_id,
+                "conversation_id": interaction["conversation_id"],
+                "customer_id": interaction["customer_id"],
+                "speaker": "customer",
+                "message_text": interaction["text"],
+                "message_type": interaction["interaction_type"],
+                "language": interaction["language"],
+                "embedding_id": turn_id if interaction.get("faiss_stored") else None,
+                "metadata": interaction.get("metadata")
+            })
+            interaction_rows.append({
+                "interaction_id": f"INT_{turn_id}",
+                "customer_id": interaction["customer_id"],
+                "conversation_id": interaction["conversation_id"],
+                "interaction_type": interaction["interaction_type"],
+                "interaction_data": {
+                    "text": interaction["text"],
+                    "language": interaction["language"],
+                    "faiss_stored": bool(interaction.get("faiss_stored")),
+                    "postgres_stored": True
+                }
+            })
+        return await mcp_server.store_conversation_messages(messages, interaction_rows)
+    
     async def store_response(self, customer_id: str, conversation_id: str, 
                            response_text: str, response_type: str = "assistant",
                            sentiment: str = None, additional_metadata: Dict = None) -> Dict[str, Any]:
@@ -168,12 +208,13 @@ class DatabaseService:
             if not postgres_data["success"]:
                 return postgres_data
             
-            # Get FAISS interaction history
-            faiss_history = await self._get_faiss_interaction_history(customer_id)
+            # Get FAISS interaction history (newest first) and the total stored for the customer
+            faiss_history = await self._get_faiss_interaction_history(customer_id, limit=10)
+            faiss_count = await self._count_faiss_interactions(customer_id)
             
             profile = postgres_data["rows"][0] if postgres_data["rows"] else {}
-            profile["faiss_interaction_count"] = len(faiss_history)
-            profile["faiss_interactions"] = faiss_history[-10:]  # Last 10 interactions
+            profile["faiss_interaction_count"] = faiss_count
+            profile["faiss_interactions"] = faiss_history  # Last 10 interactions
             
             return {"success": True, "profile": profile}
             
@@ -186,7 +227,8 @@ class DatabaseService:
         """Search for similar interactions using FAISS"""
         try:
             # Generate query embedding
-            query_embedding = self.embedding_generator.get_embedding(
+            query_embedding = await asyncio.to_thread(
+                self.embedding_generator.get_embedding,
                 query_text, 
                 task_type="RETRIEVAL_QUERY"
             )
@@ -194,8 +236,11 @@ class DatabaseService:
             if not query_embedding:
                 return {"success": False, "error": "Failed to generate query embedding"}
             
-            # Search FAISS
-            faiss_results = self.vector_db.query_similar_embeddings(query_embedding, top_k)
+            # Search FAISS, restricted to this customer's own interactions
+            faiss_results = await asyncio.to_thread(
+                self.vector_db.query_similar_embeddings,
+                query_embedding, top_k, filter={"customer_id": customer_id, "source": "interaction"}
+            )
             
             if not faiss_results or not faiss_results.get('matches'):
                 return {"success": True, "matches": []}
@@ -270,10 +315,27 @@ class DatabaseService:
     
     async def store_document_processing(self, filename: str, content: str, 
                                       document_type: str = "brochure",
-                                      chunks: List[Dict] = None) -> Dict[str, Any]:
-        """Store processed document and its chunks"""
+                                      chunks: List[Dict] = None,
+                                      upload_source: str = "api_upload") -> Dict[str, Any]:
+        """
+        Store processed document and its chunks, replacing any earlier upload of `filename`
+
+        The document row and all chunk rows are written in one transaction (chunks with a
+        single COPY). Chunks without a vector_id are first embedded in batches and added
+        to FAISS in one call, under the IDs /upload_pdf uses (pdf_<filename>_chunk_<index>).
+
+        Args:
+            chunks: Dicts with "text" and optionally "metadata", "chunk_index" (defaults to
+                    the position in the list) and "vector_id"
+        """
         try:
             document_id = f"doc_{uuid.uuid4().hex[:8]}_{int(datetime.now().timestamp())}"
+            chunks = [dict(chunk, chunk_index=chunk.get("chunk_index", i)) for i, chunk in enumerate(chunks or [])]
+
+            unindexed = [chunk for chunk in chunks if not chunk.get("vector_id")]
+            if unindexed:
+                # Embedding and the FAISS add are blocking; keep them off the database loop
+                await asyncio.to_thread(self._index_document_chunks, filename, unindexed)
             
             # Store document metadata
             document_data = {
@@ -281,40 +343,59 @@ class DatabaseService:
                 "filename": filename,
                 "document_type": document_type,
                 "content_text": content,
-                "chunk_count": len(chunks) if chunks else 0,
+                "chunk_count": len(chunks),
                 "processing_status": "processed",
-                "upload_source": "api_upload",
+                "upload_source": upload_source,
                 "processed_at": datetime.now()
             }
-            
-            doc_result = await mcp_insert_record("documents", document_data)
-            
-            if not doc_result["success"]:
-                return doc_result
-            
-            # Store chunks if provided
-            if chunks:
-                for i, chunk in enumerate(chunks):
-                    chunk_data = {
-                        "chunk_id": f"{document_id}_chunk_{i}",
-                        "document_id": document_id,
-                        "chunk_index": i,
-                        "chunk_text": chunk.get("text", ""),
-                        "chunk_metadata": json.dumps(chunk.get("metadata", {})),
-                        "vector_id": chunk.get("vector_id")
-                    }
-                    
-                    await mcp_insert_record("document_chunks", chunk_data)
+            chunk_rows = [
+                {
+                    "chunk_id": f"{document_id}_chunk_{chunk['chunk_index']}",
+                    "chunk_index": chunk["chunk_index"],
+                    "chunk_text": chunk.get("text", ""),
+                    "chunk_metadata": chunk.get("metadata", {}),
+                    "vector_id": chunk.get("vector_id")
+                }
+                for chunk in chunks
+            ]
+            
+            result = await mcp_server.store_document_with_chunks(document_data, chunk_rows)
+            if not result["success"]:
+                return result
+            logger.info(
+                f"Stored document '{filename}' with {result['stored_chunks']} chunks in "
+                f"{result['execution_time_ms']} ms ({result['rows_per_second']} rows/sec)"
+            )
             
             return {
                 "success": True,
                 "document_id": document_id,
-                "chunks_stored": len(chunks) if chunks else 0
+                "chunks_stored": result["stored_chunks"],
+                "replaced_documents": result["replaced_documents"],
+                "chunks_indexed": sum(1 for chunk in unindexed if chunk.get("vector_id")),
+                "execution_time_ms": result["execution_time_ms"],
+                "rows_per_second": result["rows_per_second"]
             }
             
         except Exception as e:
             logger.error(f"Failed to store document processing: {e}")
             return {"success": False, "error": str(e)}
+
+    def _index_document_chunks(self, filename: str, chunks: List[Dict]):
+        """Embed chunks in batches and add them to FAISS in one call, setting each chunk's vector_id"""
+        texts = [chunk.get("text", "") for chunk in chunks]
+        embeddings = self.embedding_generator.get_embeddings(texts, task_type="RETRIEVAL_DOCUMENT")
+        if embeddings is None:
+            logger.warning(f"Failed to generate embeddings for chunks of '{filename}'; storing them without vectors")
+            return
+        vector_ids = [f"pdf_{filename}_chunk_{chunk['chunk_index']}" for chunk in chunks]
+        metadatas = [
+            {"source": "pdf", "filename": filename, "chunk_index": chunk["chunk_index"], "text": chunk.get("text", "")}
+            for chunk in chunks
+        ]
+        if self.vector_db.upsert_embeddings(vector_ids, embeddings, metadatas):
+            for chunk, vector_id in zip(chunks, vector_ids):
+                chunk["vector_id"] = vector_id
     
     async def get_analytics_summary(self, customer_id: str = None, 
                                   days: int = 30) -> Dict[str, Any]:
@@ -382,16 +463,28 @@ class DatabaseService:
         except Exception as e:
             logger.warning(f"Failed to log interaction: {e}")
     
-    async def _get_faiss_interaction_history(self, customer_id: str) -> List[Dict]:
-        """Get interaction history from FAISS"""
+    async def _get_faiss_interaction_history(self, customer_id: str, limit: int = 20) -> List[Dict]:
+        """Get the customer's most recent interactions stored in FAISS, newest first"""
         try:
-            # This is a simplified implementation - in practice, you might want
-            # to store customer-specific vectors or use metadata filtering
-            return []  # Placeholder for now
+            # A SQLite read under the vector store's lock; keep it off the event loop
+            return await asyncio.to_thread(
+                self.vector_db.list_by_filter,
+                {"customer_id": customer_id, "source": "interaction"}, limit=limit
+            )
         except Exception as e:
             logger.warning(f"Failed to get FAISS history: {e}")
             return []
     
+    async def _count_faiss_interactions(self, customer_id: str) -> int:
+        """Count every interaction of the customer stored in FAISS"""
+        try:
+            return await asyncio.to_thread(
+                self.vector_db.count_by_filter, {"customer_id": customer_id, "source": "interaction"}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to count FAISS history: {e}")
+            return 0
+    
     async def _get_conversation_context(self, conversation_id: str) -> Dict:
         """Get conversation context from PostgreSQL"""
         try:
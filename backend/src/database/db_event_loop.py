@@ -0,0 +1,117 @@
+"""
+Background event loop for database access from synchronous code
+
+asyncpg pools belong to the event loop that created them, so the Flask handlers
+share one loop running on a daemon thread for the life of the process. The
+global PostgresMCPServer pool is opened on that loop once and reused by every
+request; handlers submit coroutines with run_db().
+
+Under the ASGI app the server's own loop is adopted instead (use_event_loop), so
+async routes await the pool directly and run_db() calls from worker threads
+land on the same loop.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import threading
+
+from src.config.config import DB_CALL_TIMEOUT_SECONDS
+from src.database.postgres_mcp_server import mcp_server
+
+logger = logging.getLogger(__name__)
+
+class DatabaseEventLoop:
+    """
+    An asyncio event loop running forever on its own daemon thread, or an
+    adopted loop that is already running elsewhere (e.g. the ASGI server's)
+    """
+
+    def __init__(self, name="db-event-loop", loop=None):
+        if loop is not None:
+            self.loop = loop
+            self._thread = None
+            return
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def is_running(self):
+        """Check if the loop is still serving requests"""
+        if self._thread is None:
+            return self.loop.is_running()
+        return self._thread.is_alive() and not self.loop.is_closed()
+
+    def run(self, coro, timeout=None):
+        """
+        Run a coroutine on the loop and block until it finishes
+
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait before cancelling it (None waits forever)
+
+        Returns:
+            The coroutine's result; its exceptions are re-raised in the caller
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        """Close the shared connection pool, then stop the loop and its thread"""
+        if self._thread is None or not self.is_running():
+            return  # An adopted loop is shut down by its owner
+        try:
+            self.run(mcp_server.close(), timeout=DB_CALL_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to close PostgreSQL pool on shutdown: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=DB_CALL_TIMEOUT_SECONDS)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+# Global event loop instance, started on first use
+_db_event_loop = None
+_db_event_loop_lock = threading.Lock()
+
+def get_db_event_loop() -> DatabaseEventLoop:
+    """Get the process-wide database event loop, starting it if needed"""
+    global _db_event_loop
+    with _db_event_loop_lock:
+        if _db_event_loop is None or not _db_event_loop.is_running():
+            _db_event_loop = DatabaseEventLoop()
+            atexit.register(_db_event_loop.stop)
+        return _db_event_loop
+
+def use_event_loop(loop):
+    """
+    Make an already running loop the database loop, e.g. from the ASGI startup hook
+
+    The pool is then opened on that loop; call this before the first database access.
+    """
+    global _db_event_loop
+    with _db_event_loop_lock:
+        _db_event_loop = DatabaseEventLoop(loop=loop)
+        return _db_event_loop
+
+async def _with_pool(coro):
+    # Opens the pool on first use (and again after a failed attempt); a no-op afterwards
+    await mcp_server.initialize()
+    return await coro
+
+def run_db(coro, timeout=DB_CALL_TIMEOUT_SECONDS):
+    """
+    Run a database coroutine on the shared loop and return its result
+
+    Safe to call from any thread that is not the database loop itself; code
+    running on that loop awaits the coroutine directly instead.
+    Raises concurrent.futures.TimeoutError if the call takes longer than `timeout` seconds.
+    """
+    return get_db_event_loop().run(_with_pool(coro), timeout=timeout)
@@ -0,0 +1,264 @@
+"""
+Background ingestion of chat interactions
+
+Every chat turn is written exactly once, off the response path: callers put it on
+a bounded in-process queue and a worker thread drains it in batches, embedding
+the batch in one call, adding it to FAISS in one block and storing the messages
+and their analytics rows in PostgreSQL in one transaction.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from src.config.config import (
+    INGEST_QUEUE_MAX_SIZE,
+    INGEST_BATCH_SIZE,
+    INGEST_FLUSH_INTERVAL_SECONDS,
+    INGEST_MAX_RETRIES,
+    INGEST_ENQUEUE_TIMEOUT_SECONDS
+)
+from src.vector_database.vector_db_client import get_vector_db_client
+
+try:
+    from src.database.database_service import get_database_service
+    from src.database.db_event_loop import get_db_event_loop, run_db
+    DATABASE_AVAILABLE = True
+except ImportError:
+    DATABASE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the first retry of a failed batch stage; doubles on every attempt
+_RETRY_BASE_DELAY_SECONDS = 0.5
+
+_STOP = object()
+
+def _store_in_postgres(interactions: List[Dict[str, Any]]) -> bool:
+    """Writes a batch of interactions to PostgreSQL through the shared database loop"""
+    async def store_batch():
+        db_service = await get_database_service()
+        return await db_service.store_interactions(interactions)
+
+    result = run_db(store_batch())
+    if not result["success"]:
+        raise RuntimeError(result.get("error", "PostgreSQL batch insert failed"))
+    return True
+
+class InteractionIngestionQueue:
+    """
+    Bounded queue of chat turns with a single background writer
+
+    A full queue applies backpressure: submit() waits up to `enqueue_timeout`
+    seconds and then writes the turn in the caller's thread, so turns are never
+    dropped. Each batch stage (FAISS, PostgreSQL) is retried with exponential
+    backoff; close() drains everything still queued before returning.
+    """
+
+    def __init__(self, vector_db=None, embedding_generator=None,
+                 store_batch: Optional[Callable[[List[Dict[str, Any]]], bool]] = None,
+                 max_size: int = None, batch_size: int = None, flush_interval: float = None,
+                 max_retries: int = None, enqueue_timeout: float = None):
+        """
+        Args:
+            vector_db: FAISS client (defaults to the shared client)
+            embedding_generator: Embedding client (defaults to the shared client)
+            store_batch: Callable writing a batch to PostgreSQL; defaults to the database
+                         service when it is available, otherwise only FAISS is written
+            max_size, batch_size, flush_interval, max_retries, enqueue_timeout:
+                         Override the INGEST_* settings
+        """
+        self.vector_db = vector_db or get_vector_db_client()
+        if embedding_generator is None:
+            from src.embedding_service.embedding_generator import get_embedding_generator
+            embedding_generator = get_embedding_generator()
+        self.embedding_generator = embedding_generator
+        self.store_batch = store_batch if store_batch is not None else (_store_in_postgres if DATABASE_AVAILABLE else None)
+        self.batch_size = batch_size or INGEST_BATCH_SIZE
+        self.flush_interval = INGEST_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self.max_retries = INGEST_MAX_RETRIES if max_retries is None else max_retries
+        self.enqueue_timeout = INGEST_ENQUEUE_TIMEOUT_SECONDS if enqueue_timeout is None else enqueue_timeout
+        self.stats = {"queued": 0, "written": 0, "written_inline": 0, "failed": 0}
+        self._stats_lock = threading.Lock()  # Callers' threads and the worker update stats concurrently
+
+        self._queue = queue.Queue(maxsize=max_size or INGEST_QUEUE_MAX_SIZE)
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="interaction-ingest", daemon=True)
+        self._worker.start()
+
+    @property
+    def stores_to_database(self) -> bool:
+        """Whether turns are written to PostgreSQL as well as FAISS"""
+        return self.store_batch is not None
+
+    def submit(self, customer_id: str, interaction_text: str, interaction_type: str = "chatbot",
+               user_language: str = 'en', additional_metadata: Dict = None) -> str:
+        """
+        Queue one customer turn for storage
+
+        Returns:
+            The conversation_turn_id the turn will be stored under (its FAISS vector ID)
+        """
+        now = datetime.now()
+        conversation_turn_id = f"{customer_id}_{int(now.timestamp())}_{uuid.uuid4().hex[:8]}"
+        interaction = {
+            "conversation_turn_id": conversation_turn_id,
+            "conversation_id": f"CONVO_{customer_id}_{now.strftime('%Y%m%d')}",
+            "customer_id": customer_id,
+            "text": interaction_text,
+            "interaction_type": interaction_type,
+            "language": user_language,
+            "timestamp": str(now),
+            "metadata": dict(additional_metadata or {})
+        }
+
+        if self._closed:
+            self._write_batch([interaction])
+            self._count("written_inline")
+            return conversation_turn_id
+        try:
+            self._queue.put(interaction, timeout=self.enqueue_timeout)
+            self._count("queued")
+        except queue.Full:
+            # Backpressure: the caller pays for its own write instead of the turn being dropped
+            logger.warning(f"Ingestion queue full; writing {conversation_turn_id} inline")
+            self._write_batch([interaction])
+            self._count("written_inline")
+        return conversation_turn_id
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def pending(self) -> int:
+        """Approximate number of queued turns not yet picked up by the worker"""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until every turn queued so far has been written (or given up on)"""
+        self._queue.join()
+
+    def close(self):
+        """Stop accepting work, write everything still queued and stop the worker"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._worker.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Unexpected error writing ingestion batch: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+        # Drain whatever was queued before close()
+        drained = []
+        while True:
+            try:
+                drained.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        leftovers = [item for item in drained if item is not _STOP]
+        for start in range(0, len(leftovers), self.batch_size):
+            try:
+                self._write_batch(leftovers[start:start + self.batch_size])
+            except Exception as e:
+                logger.error(f"Unexpected error writing ingestion batch: {e}")
+        for _ in drained:
+            self._queue.task_done()
+
+    def _with_retries(self, stage: str, operation: Callable[[], Any]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                operation()
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Ingestion {stage} failed after {attempt + 1} attempts: {e}")
+                    return False
+                delay = _RETRY_BASE_DELAY_SECONDS * (2 ** attempt)
+                logger.warning(f"Ingestion {stage} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """Embeds a batch and writes it to FAISS, then to PostgreSQL"""
+        def write_faiss():
+            embeddings = self.embedding_generator.get_embeddings(
+                [interaction["text"] for interaction in batch], task_type="RETRIEVAL_DOCUMENT"
+            )
+            if embeddings is None:
+                raise RuntimeError("Failed to generate embeddings")
+            metadatas = []
+            for interaction in batch:
+                metadata = {
+                    "customer_id": interaction["customer_id"],
+                    "conversation_id": interaction["conversation_id"],
+                    "timestamp": interaction["timestamp"],
+                    "speaker": "customer",
+                    "text": interaction["text"],
+                    "interaction_type": interaction["interaction_type"],
+                    "language": interaction["language"],
+                    "conversation_turn_id": interaction["conversation_turn_id"]
+                }
+                metadata.update(interaction["metadata"])
+                metadatas.append(metadata)
+            vector_ids = [interaction["conversation_turn_id"] for interaction in batch]
+            if not self.vector_db.upsert_embeddings(vector_ids, embeddings, metadatas):
+                raise RuntimeError("FAISS batch add failed")
+
+        faiss_stored = self._with_retries("FAISS write", write_faiss)
+        for interaction in batch:
+            interaction["faiss_stored"] = faiss_stored
+
+        postgres_stored = True
+        if self.store_batch is not None:
+            postgres_stored = self._with_retries("PostgreSQL write", lambda: self.store_batch(batch))
+
+        if faiss_stored and postgres_stored:
+            self._count("written", len(batch))
+            logger.info(f"Ingested {len(batch)} interactions")
+        else:
+            self._count("failed", len(batch))
+
+# Global ingestion queue instance, started on first use
+_ingestion_queue = None
+_ingestion_queue_lock = threading.Lock()
+
+def get_ingestion_queue() -> InteractionIngestionQueue:
+    """Get the process-wide ingestion queue; it is drained at interpreter exit"""
+    global _ingestion_queue
+    with _ingestion_queue_lock:
+        if _ingestion_queue is None:
+            if DATABASE_AVAILABLE:
+                # Start the database loop first so its exit hook runs after the queue is drained
+                get_db_event_loop()
+            _ingestion_queue = InteractionIngestionQueue()
+            atexit.register(_ingestion_queue.close)
+        return _ingestion_queue
@@ -6,8 +6,10 @@ providing a standardized interface for database interactions.
 """
 import asyncio
 import asyncpg
+import copy
 import json
 import logging
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import uuid
@@ -18,13 +20,77 @@ from src.config.config import (
     POSTGRES_DB, 
     POSTGRES_USER, 
     POSTGRES_PASSWORD,
+    POSTGRES_POOL_MIN_SIZE,
+    POSTGRES_POOL_MAX_SIZE,
+    POSTGRES_KNOWN_ENTITY_CACHE_SIZE,
+    POSTGRES_STATEMENT_CACHE_SIZE,
+    CUSTOMER_PROFILE_CACHE_TTL_SECONDS,
+    CUSTOMER_PROFILE_CACHE_MAX_ENTRIES,
     DATABASE_URL
 )
+from src.database.audit_log import AuditLog
+from src.database.statement_registry import StatementRegistry
+from src.utils.ttl_cache import TTLCache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Message insert; constant text, so asyncpg prepares it once per pooled connection and reuses it
+INSERT_MESSAGE_SQL = """
+    INSERT INTO messages (message_id, conversation_id, customer_id, speaker, message_text,
+                          message_type, sentiment, language, embedding_id, metadata)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+    RETURNING *
+"""
+
+# The same insert, creating the customer and conversation first if they are missing (one statement)
+INSERT_MESSAGE_WITH_PARENTS_SQL = """
+    WITH new_customer AS (
+        INSERT INTO customers (customer_id, preferred_language, customer_segment)
+        VALUES ($3, 'en', 'unknown')
+        ON CONFLICT (customer_id) DO NOTHING
+    ), new_conversation AS (
+        INSERT INTO conversations (conversation_id, customer_id, title, status)
+        VALUES ($2, $3, 'Chat Session', 'active')
+        ON CONFLICT (conversation_id) DO NOTHING
+    )
+""" + INSERT_MESSAGE_SQL
+
+# Writes to these tables change what get_customer_data returns for the row's customer_id
+PROFILE_TABLES = {"customers", "conversations", "messages", "customer_preferences"}
+
+# document_chunks columns written by COPY in store_document_with_chunks
+DOCUMENT_CHUNK_COLUMNS = ["chunk_id", "document_id", "chunk_index", "chunk_text", "chunk_metadata", "vector_id"]
+
+class KnownEntityCache:
+    """
+    LRU set of ("customer", id) / ("conversation", id) keys known to exist in the database
+
+    Only used on the database event loop, so it needs no lock.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or POSTGRES_KNOWN_ENTITY_CACHE_SIZE
+        self._keys = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        if key not in self._keys:
+            return False
+        self._keys.move_to_end(key)
+        return True
+
+    def add(self, *keys):
+        for key in keys:
+            self._keys[key] = True
+            self._keys.move_to_end(key)
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+
+    def discard(self, *keys):
+        for key in keys:
+            self._keys.pop(key, None)
+
 class PostgresMCPServer:
     """
     PostgreSQL MCP Server implementation for handling database operations
@@ -34,30 +100,49 @@ class PostgresMCPServer:
         self.pool = None
         self.server_name = "sbi-postgres-mcp"
         self.version = "1.0.0"
+        self._init_lock = None
+        # Operations are audited in background batches, not with extra statements per call
+        self.audit_log = AuditLog(lambda: self.pool)
+        # Customers and conversations already stored, so repeat messages skip creating them
+        self.known_entities = KnownEntityCache()
+        # Schema-checked insert/update SQL, generated once per table and column set
+        self.statements = StatementRegistry()
+        # get_customer_data results; dropped when this process writes the customer's rows
+        self.profile_cache = TTLCache(ttl=CUSTOMER_PROFILE_CACHE_TTL_SECONDS,
+                                      max_entries=CUSTOMER_PROFILE_CACHE_MAX_ENTRIES, name="customer-profiles")
+        self._profile_generation = 0
         
     async def initialize(self):
-        """Initialize the database connection pool"""
-        try:
-            self.pool = await asyncpg.create_pool(
-                host=POSTGRES_HOST,
-                port=POSTGRES_PORT,
-                database=POSTGRES_DB,
-                user=POSTGRES_USER,
-                password=POSTGRES_PASSWORD,
-                min_size=5,
-                max_size=20,
-                command_timeout=60
-            )
-            logger.info(f"PostgreSQL MCP Server '{self.server_name}' initialized successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to initialize PostgreSQL MCP Server: {e}")
-            return False
+        """Initialize the database connection pool (no-op if it is already open)"""
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if self.pool is not None:
+                return True
+            try:
+                self.pool = await asyncpg.create_pool(
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT,
+                    database=POSTGRES_DB,
+                    user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD,
+                    min_size=POSTGRES_POOL_MIN_SIZE,
+                    max_size=POSTGRES_POOL_MAX_SIZE,
+                    statement_cache_size=POSTGRES_STATEMENT_CACHE_SIZE,
+                    command_timeout=60
+                )
+                logger.info(f"PostgreSQL MCP Server '{self.server_name}' initialized successfully")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to initialize PostgreSQL MCP Server: {e}")
+                return False
     
     async def close(self):
         """Close the database connection pool"""
         if self.pool:
-            await self.pool.close()
+            await self.audit_log.close()
+            pool, self.pool = self.pool, None
+            await pool.close()
             logger.info("PostgreSQL MCP Server connection pool closed")
     
     async def execute_query(self, query: str, params: List[Any] = None) -> Dict[str, Any]:
@@ -79,56 +164,48 @@ class PostgresMCPServer:
         
         try:
             async with self.pool.acquire() as connection:
-                # Log the operation
-                await self._log_operation(
-                    connection, 
-                    operation_id, 
-                    "query", 
-                    {"query": query, "params": params}
-                )
-                
                 if params:
                     result = await connection.fetch(query, *params)
                 else:
                     result = await connection.fetch(query)
                 
-                # Convert asyncpg.Record objects to dictionaries
-                rows = [dict(row) for row in result]
-                
-                execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
-                
-                # Update operation log with success
-                await self._update_operation_status(
-                    connection, 
-                    operation_id, 
-                    "completed", 
-                    execution_time_ms=int(execution_time)
-                )
-                
-                return {
-                    "success": True,
-                    "operation_id": operation_id,
-                    "rows": rows,
-                    "row_count": len(rows),
-                    "execution_time_ms": int(execution_time)
-                }
+            # Convert asyncpg.Record objects to dictionaries
+            rows = [dict(row) for row in result]
+            
+            execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+            
+            # Audit the operation with its outcome
+            self.audit_log.record(
+                operation_id, 
+                "query", 
+                {"query": query, "params": params}, 
+                "completed", 
+                execution_time_ms=int(execution_time),
+                started_at=start_time
+            )
+            
+            return {
+                "success": True,
+                "operation_id": operation_id,
+                "rows": rows,
+                "row_count": len(rows),
+                "execution_time_ms": int(execution_time)
+            }
                 
         except Exception as e:
             logger.error(f"Query execution failed: {e}")
             execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
             
-            # Log the error
-            try:
-                async with self.pool.acquire() as connection:
-                    await self._update_operation_status(
-                        connection, 
-                        operation_id, 
-                        "failed", 
-                        error_message=str(e),
-                        execution_time_ms=int(execution_time)
-                    )
-            except:
-                pass  # Don't fail if logging fails
+            # Audit the error
+            self.audit_log.record(
+                operation_id, 
+                "query", 
+                {"query": query, "params": params}, 
+                "failed", 
+                execution_time_ms=int(execution_time),
+                error_message=str(e),
+                started_at=start_time
+            )
             
             return {
                 "success": False,
@@ -142,7 +219,7 @@ class PostgresMCPServer:
         Insert a new record into the specified table
         
         Args:
-            table: Table name
+            table: Table name (checked against the schema, like the column names)
             data: Dictionary of column-value pairs
             
         Returns:
@@ -155,60 +232,50 @@ class PostgresMCPServer:
         start_time = datetime.utcnow()
         
         try:
-            # Build insert query
             columns = list(data.keys())
-            placeholders = [f"${i+1}" for i in range(len(columns))]
             values = list(data.values())
             
-            query = f"""
-                INSERT INTO {table} ({', '.join(columns)}) 
-                VALUES ({', '.join(placeholders)}) 
-                RETURNING *
-            """
-            
             async with self.pool.acquire() as connection:
-                # Log the operation
-                await self._log_operation(
-                    connection, 
-                    operation_id, 
-                    "insert", 
-                    {"table": table, "data": data}
-                )
-                
+                # Schema-checked SQL for this table and column set, prepared once per connection
+                query = await self.statements.insert_sql(connection, table, columns)
                 result = await connection.fetchrow(query, *values)
-                execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
-                
-                # Update operation log with success
-                await self._update_operation_status(
-                    connection, 
-                    operation_id, 
-                    "completed", 
-                    execution_time_ms=int(execution_time)
-                )
-                
-                return {
-                    "success": True,
-                    "operation_id": operation_id,
-                    "inserted_record": dict(result) if result else None,
-                    "execution_time_ms": int(execution_time)
-                }
+            if table in PROFILE_TABLES and data.get("customer_id"):
+                self.invalidate_customer_data(data["customer_id"])
+            execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+            
+            # Audit the operation with its outcome
+            self.audit_log.record(
+                operation_id, 
+                "insert", 
+                {"table": table, "data": data}, 
+                "completed", 
+                execution_time_ms=int(execution_time),
+                table_name=table,
+                started_at=start_time
+            )
+            
+            return {
+                "success": True,
+                "operation_id": operation_id,
+                "inserted_record": dict(result) if result else None,
+                "execution_time_ms": int(execution_time)
+            }
                 
         except Exception as e:
             logger.error(f"Insert operation failed: {e}")
             execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
             
-            # Log the error
-            try:
-                async with self.pool.acquire() as connection:
-                    await self._update_operation_status(
-                        connection, 
-                        operation_id, 
-                        "failed", 
-                        error_message=str(e),
-                        execution_time_ms=int(execution_time)
-                    )
-            except:
-                pass
+            # Audit the error
+            self.audit_log.record(
+                operation_id, 
+                "insert", 
+                {"table": table, "data": data}, 
+                "failed", 
+                execution_time_ms=int(execution_time),
+                error_message=str(e),
+                table_name=table,
+                started_at=start_time
+            )
             
             return {
                 "success": False,
@@ -223,8 +290,8 @@ class PostgresMCPServer:
         Update records in the specified table
         
         Args:
-            table: Table name
-            where_clause: WHERE clause (without 'WHERE' keyword)
+            table: Table name (checked against the schema, like the column names)
+            where_clause: WHERE clause (without 'WHERE' keyword), using $1..$n for where_params
             where_params: Parameters for WHERE clause
             update_data: Dictionary of column-value pairs to update
             
@@ -238,75 +305,52 @@ class PostgresMCPServer:
         start_time = datetime.utcnow()
         
         try:
-            # Build update query
-            set_clauses = []
-            set_values = []
-            param_index = 1
-            
-            for column, value in update_data.items():
-                set_clauses.append(f"{column} = ${param_index}")
-                set_values.append(value)
-                param_index += 1
-            
-            # Add WHERE parameters
-            all_params = set_values + where_params
-            
-            # Update WHERE clause parameter indices
-            where_clause_updated = where_clause
-            for i, _ in enumerate(where_params):
-                where_clause_updated = where_clause_updated.replace(f"${i+1}", f"${param_index + i}")
-            
-            query = f"""
-                UPDATE {table} 
-                SET {', '.join(set_clauses)}, updated_at = CURRENT_TIMESTAMP 
-                WHERE {where_clause_updated}
-                RETURNING *
-            """
+            # The WHERE clause keeps its $1..$k placeholders; the new values follow them
+            columns = list(update_data.keys())
+            all_params = list(where_params) + list(update_data.values())
             
             async with self.pool.acquire() as connection:
-                # Log the operation
-                await self._log_operation(
-                    connection, 
-                    operation_id, 
-                    "update", 
-                    {"table": table, "where": where_clause, "data": update_data}
-                )
-                
+                # Schema-checked SQL for this table, column set and WHERE clause, prepared once per connection
+                query = await self.statements.update_sql(connection, table, columns, where_clause, len(where_params))
                 results = await connection.fetch(query, *all_params)
-                execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
-                
-                # Update operation log with success
-                await self._update_operation_status(
-                    connection, 
-                    operation_id, 
-                    "completed", 
-                    execution_time_ms=int(execution_time)
-                )
-                
-                return {
-                    "success": True,
-                    "operation_id": operation_id,
-                    "updated_records": [dict(row) for row in results],
-                    "updated_count": len(results),
-                    "execution_time_ms": int(execution_time)
-                }
+            if table in PROFILE_TABLES:
+                self.invalidate_customer_data(*{row.get("customer_id") for row in results} - {None})
+            execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+            
+            # Audit the operation with its outcome
+            self.audit_log.record(
+                operation_id, 
+                "update", 
+                {"table": table, "where": where_clause, "data": update_data}, 
+                "completed", 
+                execution_time_ms=int(execution_time),
+                table_name=table,
+                started_at=start_time
+            )
+            
+            return {
+                "success": True,
+                "operation_id": operation_id,
+                "updated_records": [dict(row) for row in results],
+                "updated_count": len(results),
+                "execution_time_ms": int(execution_time)
+            }
                 
         except Exception as e:
             logger.error(f"Update operation failed: {e}")
             execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
             
-            # Log the error
-            try:
-                async with self.pool.acquire() as connection:
-                    await self._update_operation_status(
-                        connection, 
-                        operation_id, 
-                        "failed", 
-                        error_message=str(e),
-                        execution_time_ms=int(execution_time)
-                    )
-            except:
-                pass
+            # Audit the error
+            self.audit_log.record(
+                operation_id, 
+                "update", 
+                {"table": table, "where": where_clause, "data": update_data}, 
+                "failed", 
+                execution_time_ms=int(execution_time),
+                error_message=str(e),
+                table_name=table,
+                started_at=start_time
+            )
             
             return {
                 "success": False,
@@ -315,156 +359,315 @@ class PostgresMCPServer:
                 "execution_time_ms": int(execution_time)
             }
     
+    async def store_document_with_chunks(self, document: Dict[str, Any],
+                                         chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Store a document row and all of its chunk rows in one transaction
+
+        The chunks are written with a single COPY instead of one INSERT each. A document
+        with the same filename replaces the previous one: its rows and chunk rows are
+        deleted in the same transaction, as FAISS replaces the chunk vectors in place.
+
+        Args:
+            document: documents row (column-value pairs, including document_id)
+            chunks: document_chunks rows (chunk_id, chunk_index, chunk_text, chunk_metadata, vector_id)
+
+        Returns:
+            Dict containing operation result, with the rows written per second
+        """
+        if not self.pool:
+            raise Exception("Database pool not initialized")
+
+        operation_id = str(uuid.uuid4())
+        start_time = datetime.utcnow()
+        operation_data = {"table": "document_chunks", "document_id": document["document_id"], "chunks": len(chunks)}
+        records = [
+            (chunk["chunk_id"], document["document_id"], chunk["chunk_index"], chunk["chunk_text"],
+             json.dumps(chunk.get("chunk_metadata") or {}), chunk.get("vector_id"))
+            for chunk in chunks
+        ]
+
+        try:
+            async with self.pool.acquire() as connection:
+                document_sql = await self.statements.insert_sql(connection, "documents", list(document.keys()))
+                async with connection.transaction():
+                    replaced = 0
+                    if document.get("filename") is not None:
+                        # Concurrent uploads of one file take turns, so only one version survives
+                        await connection.execute("SELECT pg_advisory_xact_lock(hashtext($1))", document["filename"])
+                        previous_ids = [row["document_id"] for row in await connection.fetch(
+                            "SELECT document_id FROM documents WHERE filename = $1", document["filename"]
+                        )]
+                        if previous_ids:
+                            await connection.execute(
+                                "DELETE FROM document_chunks WHERE document_id = ANY($1::varchar[])", previous_ids
+                            )
+                            await connection.execute(
+                                "DELETE FROM documents WHERE document_id = ANY($1::varchar[])", previous_ids
+                            )
+                            replaced = len(previous_ids)
+                    await connection.execute(document_sql, *document.values())
+                    if records:
+                        await connection.copy_records_to_table(
+                            "document_chunks", records=records, columns=DOCUMENT_CHUNK_COLUMNS
+                        )
+            execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+            rows_per_second = (len(records) + 1) / max(execution_time / 1000, 1e-6)
+            self.audit_log.record(operation_id, "bulk_insert", operation_data, "completed",
+                                  execution_time_ms=int(execution_time), table_name="document_chunks",
+                                  started_at=start_time)
+
+            return {
+                "success": True,
+                "operation_id": operation_id,
+                "document_id": document["document_id"],
+                "stored_chunks": len(records),
+                "replaced_documents": replaced,
+                "execution_time_ms": int(execution_time),
+                "rows_per_second": round(rows_per_second, 1)
+            }
+
+        except Exception as e:
+            logger.error(f"Bulk document insert failed: {e}")
+            self.audit_log.record(operation_id, "bulk_insert", operation_data, "failed",
+                                  error_message=str(e), table_name="document_chunks", started_at=start_time)
+            return {"success": False, "error": str(e), "operation_id": operation_id}
+
     async def get_customer_data(self, customer_id: str) -> Dict[str, Any]:
-        """Get comprehensive customer data including conversations and preferences"""
+        """
+        Get comprehensive customer data including conversations and preferences
+
+        Counts come from customer_stats (kept up to date by triggers); recent messages and
+        preferences are separate LATERAL subqueries, so neither multiplies the other. Results
+        are cached for CUSTOMER_PROFILE_CACHE_TTL_SECONDS and dropped when this process writes
+        the customer's messages, conversations, preferences or customer row.
+        """
+        cached = self.profile_cache.get(customer_id)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
         query = """
-            WITH customer_summary AS (
-                SELECT 
-                    c.*,
-                    COUNT(DISTINCT conv.id) as conversation_count,
-                    COUNT(DISTINCT m.id) as message_count,
-                    MAX(m.created_at) as last_interaction
-                FROM customers c
-                LEFT JOIN conversations conv ON c.customer_id = conv.customer_id
-                LEFT JOIN messages m ON c.customer_id = m.customer_id
-                WHERE c.customer_id = $1
-                GROUP BY c.id
-            ),
-            recent_messages AS (
-                SELECT m.*, conv.title as conversation_title
-                FROM messages m
-                JOIN conversations conv ON m.conversation_id = conv.conversation_id
-                WHERE m.customer_id = $1
-                ORDER BY m.created_at DESC
-                LIMIT 10
-            ),
-            preferences AS (
-                SELECT preference_type, preference_value, confidence_score
-                FROM customer_preferences
-                WHERE customer_id = $1
-                ORDER BY updated_at DESC
-            )
             SELECT 
-                cs.*,
-                COALESCE(
-                    json_agg(
-                        json_build_object(
-                            'message_id', rm.message_id,
-                            'speaker', rm.speaker,
-                            'message_text', rm.message_text,
-                            'sentiment', rm.sentiment,
-                            'conversation_title', rm.conversation_title,
-                            'created_at', rm.created_at
-                        ) ORDER BY rm.created_at DESC
-                    ) FILTER (WHERE rm.message_id IS NOT NULL),
-                    '[]'::json
-                ) as recent_messages,
-                COALESCE(
-                    json_agg(
-                        json_build_object(
-                            'preference_type', p.preference_type,
-                            'preference_value', p.preference_value,
-                            'confidence_score', p.confidence_score
-                        )
-                    ) FILTER (WHERE p.preference_type IS NOT NULL),
-                    '[]'::json
+                c.*,
+                COALESCE(stats.conversation_count, 0) as conversation_count,
+                COALESCE(stats.message_count, 0) as message_count,
+                stats.last_interaction,
+                COALESCE(recent.recent_messages, '[]'::json) as recent_messages,
+                COALESCE(prefs.preferences, '[]'::json) as preferences
+            FROM customers c
+            LEFT JOIN customer_stats stats ON stats.customer_id = c.customer_id
+            LEFT JOIN LATERAL (
+                SELECT json_agg(
+                    json_build_object(
+                        'message_id', rm.message_id,
+                        'speaker', rm.speaker,
+                        'message_text', rm.message_text,
+                        'sentiment', rm.sentiment,
+                        'conversation_title', rm.conversation_title,
+                        'created_at', rm.created_at
+                    ) ORDER BY rm.created_at DESC
+                ) as recent_messages
+                FROM (
+                    SELECT m.message_id, m.speaker, m.message_text, m.sentiment, m.created_at,
+                           conv.title as conversation_title
+                    FROM messages m
+                    JOIN conversations conv ON m.conversation_id = conv.conversation_id
+                    WHERE m.customer_id = c.customer_id
+                    ORDER BY m.created_at DESC
+                    LIMIT 10
+                ) rm
+            ) recent ON true
+            LEFT JOIN LATERAL (
+                SELECT json_agg(
+                    json_build_object(
+                        'preference_type', p.preference_type,
+                        'preference_value', p.preference_value,
+                        'confidence_score', p.confidence_score
+                    ) ORDER BY p.updated_at DESC
                 ) as preferences
-            FROM customer_summary cs
-            LEFT JOIN recent_messages rm ON true
-            LEFT JOIN preferences p ON true
-            GROUP BY cs.id, cs.customer_id, cs.first_name, cs.last_name, cs.email, 
-                     cs.phone, cs.date_of_birth, cs.preferred_language, cs.customer_segment, 
-                     cs.risk_profile, cs.created_at, cs.updated_at, cs.conversation_count, 
-                     cs.message_count, cs.last_interaction
+                FROM customer_preferences p
+                WHERE p.customer_id = c.customer_id
+            ) prefs ON true
+            WHERE c.customer_id = $1
         """
         
-        return await self.execute_query(query, [customer_id])
+        # A write during the query must not leave its older result in the cache
+        generation = self._profile_generation
+        result = await self.execute_query(query, [customer_id])
+        if result["success"] and generation == self._profile_generation:
+            self.profile_cache.put(customer_id, copy.deepcopy(result))
+        return result
+
+    def invalidate_customer_data(self, *customer_ids: str):
+        """Drop cached get_customer_data results for these customers"""
+        self._profile_generation += 1
+        for customer_id in customer_ids:
+            self.profile_cache.invalidate(customer_id)
     
     async def store_conversation_message(self, customer_id: str, conversation_id: str, 
                                       message_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Store a new conversation message with proper relationships"""
+        """
+        Store a new conversation message with proper relationships
+
+        A missing customer or conversation is created by the same statement that inserts the
+        message; once both are known to exist, later messages insert the message alone.
+
+        Returns:
+            Dict containing operation result (as insert_record)
+        """
+        if not self.pool:
+            raise Exception("Database pool not initialized")
+
+        operation_id = str(uuid.uuid4())
+        start_time = datetime.utcnow()
+        parent_keys = (("customer", customer_id), ("conversation", conversation_id))
+
+        # Insert the message
+        message_record = {
+            "message_id": message_data.get("message_id", str(uuid.uuid4())),
+            "conversation_id": conversation_id,
+            "customer_id": customer_id,
+            "speaker": message_data["speaker"],
+            "message_text": message_data["message_text"],
+            "message_type": message_data.get("message_type", "chatbot"),
+            "sentiment": message_data.get("sentiment"),
+            "language": message_data.get("language", "en"),
+            "embedding_id": message_data.get("embedding_id"),
+            "metadata": json.dumps(message_data.get("metadata", {})) if message_data.get("metadata") else None
+        }
+        values = list(message_record.values())
+
         try:
-            # Ensure customer exists
-            await self._ensure_customer_exists(customer_id)
-            
-            # Ensure conversation exists
-            await self._ensure_conversation_exists(conversation_id, customer_id)
-            
-            # Insert the message
-            message_record = {
-                "message_id": message_data.get("message_id", str(uuid.uuid4())),
-                "conversation_id": conversation_id,
-                "customer_id": customer_id,
-                "speaker": message_data["speaker"],
-                "message_text": message_data["message_text"],
-                "message_type": message_data.get("message_type", "chatbot"),
-                "sentiment": message_data.get("sentiment"),
-                "language": message_data.get("language", "en"),
-                "embedding_id": message_data.get("embedding_id"),
-                "metadata": json.dumps(message_data.get("metadata", {})) if message_data.get("metadata") else None
+            async with self.pool.acquire() as connection:
+                if all(key in self.known_entities for key in parent_keys):
+                    try:
+                        result = await connection.fetchrow(INSERT_MESSAGE_SQL, *values)
+                    except asyncpg.exceptions.ForeignKeyViolationError:
+                        # Deleted since it was cached; create it again
+                        self.known_entities.discard(*parent_keys)
+                        result = await connection.fetchrow(INSERT_MESSAGE_WITH_PARENTS_SQL, *values)
+                else:
+                    result = await connection.fetchrow(INSERT_MESSAGE_WITH_PARENTS_SQL, *values)
+            self.known_entities.add(*parent_keys)
+            self.invalidate_customer_data(customer_id)
+            execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+
+            self.audit_log.record(operation_id, "insert", {"table": "messages", "data": message_record}, "completed",
+                                  execution_time_ms=int(execution_time), table_name="messages", started_at=start_time)
+            return {
+                "success": True,
+                "operation_id": operation_id,
+                "inserted_record": dict(result) if result else None,
+                "execution_time_ms": int(execution_time)
             }
             
-            return await self.insert_record("messages", message_record)
-            
         except Exception as e:
             logger.error(f"Failed to store conversation message: {e}")
-            return {"success": False, "error": str(e)}
+            self.audit_log.record(operation_id, "insert", {"table": "messages", "data": message_record}, "failed",
+                                  error_message=str(e), table_name="messages", started_at=start_time)
+            return {"success": False, "error": str(e), "operation_id": operation_id}
     
-    async def _ensure_customer_exists(self, customer_id: str):
-        """Ensure customer record exists, create if not"""
-        check_query = "SELECT customer_id FROM customers WHERE customer_id = $1"
-        result = await self.execute_query(check_query, [customer_id])
-        
-        if not result["rows"]:
-            customer_data = {
-                "customer_id": customer_id,
-                "preferred_language": "en",
-                "customer_segment": "unknown"
-            }
-            await self.insert_record("customers", customer_data)
-    
-    async def _ensure_conversation_exists(self, conversation_id: str, customer_id: str):
-        """Ensure conversation record exists, create if not"""
-        check_query = "SELECT conversation_id FROM conversations WHERE conversation_id = $1"
-        result = await self.execute_query(check_query, [conversation_id])
-        
-        if not result["rows"]:
-            conversation_data = {
-                "conversation_id": conversation_id,
-                "customer_id": customer_id,
-                "title": "Chat Session",
-                "status": "active"
-            }
-            await self.insert_record("conversations", conversation_data)
-    
-    async def _log_operation(self, connection, operation_id: str, operation_type: str, 
-                           operation_data: Dict[str, Any]):
-        """Log MCP operation"""
-        try:
-            await connection.execute(
-                """
-                INSERT INTO mcp_operations (operation_id, operation_type, operation_data, status) 
-                VALUES ($1, $2, $3, $4)
-                """,
-                operation_id, operation_type, json.dumps(operation_data), "pending"
-            )
-        except Exception as e:
-            logger.error(f"Failed to log operation: {e}")
-    
-    async def _update_operation_status(self, connection, operation_id: str, status: str, 
-                                     error_message: str = None, execution_time_ms: int = None):
-        """Update MCP operation status"""
+    async def store_conversation_messages(self, messages: List[Dict[str, Any]],
+                                          interactions: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Store a batch of messages, and their interaction log rows, in one transaction
+
+        Missing customers and conversations are created on the way. Rows whose
+        message_id / interaction_id already exist are skipped, so a failed batch
+        can be retried as a whole.
+
+        Args:
+            messages: Message rows (message_id, conversation_id, customer_id, speaker,
+                      message_text, message_type, language, embedding_id, metadata)
+            interactions: user_interactions rows (interaction_id, customer_id,
+                          conversation_id, interaction_type, interaction_data, outcome)
+
+        Returns:
+            Dict containing operation result
+        """
+        if not self.pool:
+            raise Exception("Database pool not initialized")
+
+        interactions = interactions or []
+        operation_id = str(uuid.uuid4())
+        start_time = datetime.utcnow()
+        operation_data = {"table": "messages", "messages": len(messages), "interactions": len(interactions)}
+        # Customers and conversations already known to exist are not inserted again
+        customer_ids = list(dict.fromkeys(m["customer_id"] for m in messages))
+        conversations = list(dict.fromkeys((m["conversation_id"], m["customer_id"]) for m in messages))
+        parent_keys = [("customer", customer_id) for customer_id in customer_ids] + \
+                      [("conversation", conversation_id) for conversation_id, _ in conversations]
+        new_customers = [(customer_id,) for customer_id in customer_ids if ("customer", customer_id) not in self.known_entities]
+        new_conversations = [pair for pair in conversations if ("conversation", pair[0]) not in self.known_entities]
+
         try:
-            await connection.execute(
-                """
-                UPDATE mcp_operations 
-                SET status = $2, error_message = $3, execution_time_ms = $4, completed_at = CURRENT_TIMESTAMP
-                WHERE operation_id = $1
-                """,
-                operation_id, status, error_message, execution_time_ms
-            )
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    if new_customers:
+                        await connection.executemany(
+                            """
+                            INSERT INTO customers (customer_id, preferred_language, customer_segment)
+                            VALUES ($1, 'en', 'unknown')
+                            ON CONFLICT (customer_id) DO NOTHING
+                            """,
+                            new_customers
+                        )
+                    if new_conversations:
+                        await connection.executemany(
+                            """
+                            INSERT INTO conversations (conversation_id, customer_id, title, status)
+                            VALUES ($1, $2, 'Chat Session', 'active')
+                            ON CONFLICT (conversation_id) DO NOTHING
+                            """,
+                            new_conversations
+                        )
+                    await connection.executemany(
+                        """
+                        INSERT INTO messages (message_id, conversation_id, customer_id, speaker, message_text,
+                                              message_type, sentiment, language, embedding_id, metadata)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+                        ON CONFLICT (message_id) DO NOTHING
+                        """,
+                        [
+                            (m["message_id"], m["conversation_id"], m["customer_id"], m["speaker"], m["message_text"],
+                             m.get("message_type", "chatbot"), m.get("sentiment"), m.get("language", "en"),
+                             m.get("embedding_id"), json.dumps(m["metadata"]) if m.get("metadata") else None)
+                            for m in messages
+                        ]
+                    )
+                    await connection.executemany(
+                        """
+                        INSERT INTO user_interactions (interaction_id, customer_id, conversation_id,
+                                                       interaction_type, interaction_data, outcome)
+                        VALUES ($1, $2, $3, $4, $5, $6)
+                        ON CONFLICT (interaction_id) DO NOTHING
+                        """,
+                        [
+                            (i["interaction_id"], i["customer_id"], i.get("conversation_id"), i["interaction_type"],
+                             json.dumps(i["interaction_data"]), i.get("outcome", "successful"))
+                            for i in interactions
+                        ]
+                    )
+            self.known_entities.add(*parent_keys)
+            self.invalidate_customer_data(*customer_ids)
+            execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+            self.audit_log.record(operation_id, "batch_insert", operation_data, "completed",
+                                  execution_time_ms=int(execution_time), table_name="messages", started_at=start_time)
+
+            return {
+                "success": True,
+                "operation_id": operation_id,
+                "stored_messages": len(messages),
+                "execution_time_ms": int(execution_time)
+            }
+
         except Exception as e:
-            logger.error(f"Failed to update operation status: {e}")
+            logger.error(f"Batch message insert failed: {e}")
+            # A cached customer or conversation may have been deleted; the retry creates them again
+            self.known_entities.discard(*parent_keys)
+            self.audit_log.record(operation_id, "batch_insert", operation_data, "failed",
+                                  error_message=str(e), table_name="messages", started_at=start_time)
+            return {"success": False, "error": str(e), "operation_id": operation_id}
 
 # Global MCP server instance
 mcp_server = PostgresMCPServer()
@@ -147,16 +147,37 @@ CREATE TABLE IF NOT EXISTS mcp_operations (
     completed_at TIMESTAMP WITH TIME ZONE
 );
 
+-- Recent chat turns per customer, read by every API worker (CHAT_HISTORY_BACKEND=postgres)
+CREATE TABLE IF NOT EXISTS chat_history (
+    id BIGSERIAL PRIMARY KEY,
+    customer_id VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL, -- 'user', 'assistant'
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-customer counters for profile reads, maintained by the triggers below
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id VARCHAR(255) PRIMARY KEY,
+    conversation_count INTEGER NOT NULL DEFAULT 0,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_interaction TIMESTAMP WITH TIME ZONE,
+    FOREIGN KEY (customer_id) REFERENCES customers(customer_id) ON DELETE CASCADE
+);
+
 -- Indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_customers_customer_id ON customers(customer_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_customer_id ON conversations(customer_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON conversations(created_at);
 CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
 CREATE INDEX IF NOT EXISTS idx_messages_customer_id ON messages(customer_id);
+CREATE INDEX IF NOT EXISTS idx_chat_history_customer_id ON chat_history(customer_id, id DESC);
 CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_customer_created_at ON messages(customer_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_user_interactions_customer_id ON user_interactions(customer_id);
 CREATE INDEX IF NOT EXISTS idx_user_interactions_type ON user_interactions(interaction_type);
 CREATE INDEX IF NOT EXISTS idx_customer_preferences_customer_id ON customer_preferences(customer_id);
+CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename);
 CREATE INDEX IF NOT EXISTS idx_document_chunks_document_id ON document_chunks(document_id);
 CREATE INDEX IF NOT EXISTS idx_document_chunks_vector_id ON document_chunks(vector_id);
 CREATE INDEX IF NOT EXISTS idx_analytics_events_customer_id ON analytics_events(customer_id);
@@ -173,15 +194,76 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
--- Triggers for automatic timestamp updates
+-- Triggers for automatic timestamp updates (dropped first so the script can be re-run on an existing database)
+DROP TRIGGER IF EXISTS update_customers_updated_at ON customers;
 CREATE TRIGGER update_customers_updated_at BEFORE UPDATE ON customers
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_conversations_updated_at ON conversations;
 CREATE TRIGGER update_conversations_updated_at BEFORE UPDATE ON conversations
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_products_updated_at ON products;
 CREATE TRIGGER update_products_updated_at BEFORE UPDATE ON products
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_customer_preferences_updated_at ON customer_preferences;
 CREATE TRIGGER update_customer_preferences_updated_at BEFORE UPDATE ON customer_preferences
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- customer_stats upkeep: counts follow message and conversation inserts/deletes
+CREATE OR REPLACE FUNCTION update_customer_message_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO customer_stats (customer_id, message_count, last_interaction)
+        VALUES (NEW.customer_id, 1, NEW.created_at)
+        ON CONFLICT (customer_id) DO UPDATE
+        SET message_count = customer_stats.message_count + 1,
+            last_interaction = GREATEST(customer_stats.last_interaction, EXCLUDED.last_interaction);
+        RETURN NEW;
+    END IF;
+    UPDATE customer_stats
+    SET message_count = GREATEST(message_count - 1, 0),
+        last_interaction = CASE
+            WHEN last_interaction IS DISTINCT FROM OLD.created_at THEN last_interaction
+            ELSE (SELECT MAX(created_at) FROM messages WHERE customer_id = OLD.customer_id)
+        END
+    WHERE customer_id = OLD.customer_id;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_customer_conversation_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO customer_stats (customer_id, conversation_count)
+        VALUES (NEW.customer_id, 1)
+        ON CONFLICT (customer_id) DO UPDATE
+        SET conversation_count = customer_stats.conversation_count + 1;
+        RETURN NEW;
+    END IF;
+    UPDATE customer_stats
+    SET conversation_count = GREATEST(conversation_count - 1, 0)
+    WHERE customer_id = OLD.customer_id;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_customer_stats_on_message ON messages;
+CREATE TRIGGER update_customer_stats_on_message AFTER INSERT OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION update_customer_message_stats();
+
+DROP TRIGGER IF EXISTS update_customer_stats_on_conversation ON conversations;
+CREATE TRIGGER update_customer_stats_on_conversation AFTER INSERT OR DELETE ON conversations
+    FOR EACH ROW EXECUTE FUNCTION update_customer_conversation_stats();
+
+-- Backfill counters for customers created before customer_stats existed
+INSERT INTO customer_stats (customer_id, conversation_count, message_count, last_interaction)
+SELECT c.customer_id,
+       (SELECT COUNT(*) FROM conversations conv WHERE conv.customer_id = c.customer_id),
+       (SELECT COUNT(*) FROM messages m WHERE m.customer_id = c.customer_id),
+       (SELECT MAX(m.created_at) FROM messages m WHERE m.customer_id = c.customer_id)
+FROM customers c
+ON CONFLICT (customer_id) DO NOTHING;
@@ -0,0 +1,122 @@
+"""
+Statement registry for PostgresMCPServer's generic insert and update calls
+
+SQL for each (table, column set) shape is generated once. Table and column names
+are checked against the live schema (information_schema) and quoted, so no
+identifier passed by a caller reaches the SQL unchecked. A shape's text never
+changes, so asyncpg's per-connection statement cache prepares it once on each
+pooled connection and reuses the plan afterwards (POSTGRES_STATEMENT_CACHE_SIZE).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set
+
+from src.config.config import POSTGRES_STATEMENT_CACHE_SIZE
+
+# An unknown table triggers a schema re-read at most this often (tables created after startup)
+SCHEMA_RELOAD_INTERVAL_SECONDS = 60
+
+class StatementRegistry:
+    """
+    Generates and remembers insert/update SQL per statement shape; used on the database event loop
+    """
+
+    def __init__(self, max_statements: int = None, clock=time.monotonic):
+        self.max_statements = max_statements or POSTGRES_STATEMENT_CACHE_SIZE
+        self._clock = clock
+        self._columns: Dict[str, Set[str]] = None  # table -> column names
+        self._loaded_at = None
+        self._schema_lock = None
+        self._statements = OrderedDict()  # shape -> SQL
+
+    async def load_schema(self, connection):
+        """(Re)read the tables and columns of the current schema"""
+        rows = await connection.fetch(
+            """
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema()
+            """
+        )
+        columns = {}
+        for row in rows:
+            columns.setdefault(row["table_name"], set()).add(row["column_name"])
+        self._columns = columns
+        self._loaded_at = self._clock()
+
+    async def _table_columns(self, connection, table: str) -> Set[str]:
+        if self._schema_lock is None:
+            self._schema_lock = asyncio.Lock()
+        async with self._schema_lock:
+            if self._columns is None or (
+                table not in self._columns and self._clock() - self._loaded_at >= SCHEMA_RELOAD_INTERVAL_SECONDS
+            ):
+                await self.load_schema(connection)
+        if table not in self._columns:
+            raise ValueError(f"Unknown table: {table!r}")
+        return self._columns[table]
+
+    async def _checked(self, connection, table: str, columns: Iterable[str]) -> Set[str]:
+        table_columns = await self._table_columns(connection, table)
+        unknown = [column for column in columns if column not in table_columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s) for table {table!r}: {', '.join(map(repr, unknown))}")
+        return table_columns
+
+    def _remember(self, shape, sql: str) -> str:
+        self._statements[shape] = sql
+        while len(self._statements) > self.max_statements:
+            self._statements.popitem(last=False)
+        return sql
+
+    def _cached(self, shape):
+        sql = self._statements.get(shape)
+        if sql is not None:
+            self._statements.move_to_end(shape)
+        return sql
+
+    async def insert_sql(self, connection, table: str, columns: List[str]) -> str:
+        """INSERT ... RETURNING * for `columns`, in order, as $1..$n"""
+        shape = ("insert", table, tuple(columns))
+        sql = self._cached(shape)
+        if sql is None:
+            await self._checked(connection, table, columns)
+            sql = self._remember(shape, (
+                f"INSERT INTO {quote_identifier(table)} ({', '.join(map(quote_identifier, columns))}) "
+                f"VALUES ({', '.join(f'${i + 1}' for i in range(len(columns)))}) RETURNING *"
+            ))
+        return sql
+
+    async def update_sql(self, connection, table: str, columns: List[str], where_clause: str,
+                         where_param_count: int) -> str:
+        """
+        UPDATE ... RETURNING * setting `columns`
+
+        The WHERE clause keeps its own $1..$k placeholders (k = where_param_count); the new
+        values follow as $k+1..$k+n. updated_at is set too when the table has that column.
+        """
+        shape = ("update", table, tuple(columns), where_clause, where_param_count)
+        sql = self._cached(shape)
+        if sql is None:
+            table_columns = await self._checked(connection, table, columns)
+            set_clauses = [
+                f"{quote_identifier(column)} = ${where_param_count + i + 1}" for i, column in enumerate(columns)
+            ]
+            if "updated_at" in table_columns and "updated_at" not in columns:
+                set_clauses.append('"updated_at" = CURRENT_TIMESTAMP')
+            sql = self._remember(shape, (
+                f"UPDATE {quote_identifier(table)} SET {', '.join(set_clauses)} "
+                f"WHERE {where_clause} RETURNING *"
+            ))
+        return sql
+
+    def stats(self) -> dict:
+        return {
+            "statements": len(self._statements),
+            "max_statements": self.max_statements,
+            "tables": len(self._columns) if self._columns is not None else None
+        }
+
+def quote_identifier(name: str) -> str:
+    """Double-quote a SQL identifier"""
+    return '"' + name.replace('"', '""') + '"'
@@ -0,0 +1,27 @@
+import numpy as np
+from src.config.config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+from src.utils.sqlite_lru_cache import SQLiteLRUCache, content_key
+
+class EmbeddingCache(SQLiteLRUCache):
+    """On-disk embedding cache keyed by sha256(model, task_type, text) with LRU eviction."""
+
+    def __init__(self, path=None, max_entries=None):
+        """Opens (or creates) the SQLite cache file.
+
+        Args:
+            path: Cache file path (defaults to EMBEDDING_CACHE_PATH).
+            max_entries: Entry count above which the least recently used entries are evicted.
+        """
+        super().__init__(path or EMBEDDING_CACHE_PATH, max_entries or EMBEDDING_CACHE_MAX_ENTRIES,
+                         table="embeddings", value_column="vector", value_type="BLOB", name="Embedding cache")
+
+    @staticmethod
+    def make_key(model, task_type, text):
+        """Returns the content address for one embedding request."""
+        return content_key(model, task_type, text)
+
+    def _encode(self, vector):
+        return np.asarray(vector, dtype='float32').tobytes()
+
+    def _decode(self, blob):
+        return np.frombuffer(blob, dtype='float32')
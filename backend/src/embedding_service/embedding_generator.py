@@ -1,15 +1,52 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import google.generativeai as genai
-from src.config.config import GOOGLE_API_KEY # Use Google API Key
+from google.api_core import exceptions as google_exceptions
+from src.config.config import ( # Use Google API Key
+    GOOGLE_API_KEY,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_RETRY_BASE_DELAY_SECONDS,
+    EMBEDDING_CACHE_ENABLED
+)
+from src.embedding_service.embedding_cache import EmbeddingCache
+
+# Errors that mean "slow down and try again" rather than a bad request
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
 
 class EmbeddingGenerator:
-    def __init__(self, model="models/embedding-001"):
-        """Initializes the Google Generative AI client."""
+    def __init__(self, model="models/embedding-001", cache=None):
+        """Initializes the Google Generative AI client.
+
+        Args:
+            model: Google embedding model name.
+            cache: EmbeddingCache to consult before calling the API. Defaults to the
+                   on-disk cache at EMBEDDING_CACHE_PATH when EMBEDDING_CACHE_ENABLED.
+        """
         if not GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY environment variable not set.")
         
         try:
             genai.configure(api_key=GOOGLE_API_KEY)
             self.model = model
+            # Shared back-off deadline: a quota error pauses every in-flight batch
+            self._cooldown_until = 0.0
+            self._cooldown_lock = threading.Lock()
+            self.cache = cache
+            if self.cache is None and EMBEDDING_CACHE_ENABLED:
+                try:
+                    self.cache = EmbeddingCache()
+                except Exception as cache_error:
+                    print(f"Warning: Embedding cache unavailable ({cache_error}). Embeddings will not be cached.")
             # Optional: Test connection or list models to ensure key is valid
             # models = [m for m in genai.list_models() if 'embedContent' in m.supported_generation_methods]
             # print(f"Available Google embedding models: {models}") 
@@ -34,7 +71,14 @@ class EmbeddingGenerator:
             if not text.strip():
                 print("Warning: Attempting to embed empty or whitespace-only text.")
                 return None # Or handle as appropriate
-                
+
+            cache_key = None
+            if self.cache:
+                cache_key = EmbeddingCache.make_key(self.model, task_type, text)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached.tolist()
+
             result = genai.embed_content(
                 model=self.model,
                 content=text,
@@ -42,12 +86,120 @@ class EmbeddingGenerator:
             )
             embedding = result['embedding']
             # print(f"Generated Google embedding of dimension {len(embedding)} for task '{task_type}' and text snippet: '{text[:50]}...'") # Optional: for debugging
+            if cache_key:
+                self._cache_put({cache_key: embedding})
             return embedding
         except Exception as e:
             print(f"Error generating Google embedding: {e}")
             # Add more specific error handling if needed (e.g., for API key issues, quota limits)
             return None
 
+    def get_embeddings(self, texts, task_type="RETRIEVAL_DOCUMENT", batch_size=None, max_concurrency=None):
+        """Generates embeddings for many texts using batched, concurrent requests.
+
+        Texts are sent in batches of `batch_size` (one round trip each), with at most
+        `max_concurrency` batches in flight. Batches hitting quota/availability errors
+        are retried with exponential back-off.
+
+        Returns:
+            A float32 numpy matrix of shape (len(texts), dim) with rows aligned to `texts`,
+            or None if a text is empty or a batch still fails after all retries.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype='float32')
+        if any(not text or not text.strip() for text in texts):
+            print("Warning: Attempting to embed empty or whitespace-only text in a batch. Filter those out first.")
+            return None
+
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        max_concurrency = max_concurrency or EMBEDDING_MAX_CONCURRENCY
+
+        try:
+            # Serve repeated content from the cache; only unique misses go to the API
+            keys = [EmbeddingCache.make_key(self.model, task_type, text) for text in texts]
+            known = self.cache.get_many(keys) if self.cache else {}
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in known:
+                    missing.setdefault(key, text)
+
+            if missing:
+                missing_keys = list(missing)
+                missing_texts = list(missing.values())
+                batches = [missing_texts[start:start + batch_size] for start in range(0, len(missing_texts), batch_size)]
+                with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+                    results = list(executor.map(lambda batch: self._embed_batch(batch, task_type), batches))
+                vectors = [vector for batch_vectors in results for vector in batch_vectors]
+                if len(vectors) != len(missing_keys):
+                    raise ValueError(f"Expected {len(missing_keys)} embeddings, received {len(vectors)}")
+                fresh = dict(zip(missing_keys, vectors))
+                known.update(fresh)
+                self._cache_put(fresh)
+
+            return np.asarray([known[key] for key in keys], dtype='float32')
+        except Exception as e:
+            print(f"Error generating Google embeddings for {len(texts)} texts: {e}")
+            return None
+
+    def _cache_put(self, items):
+        """Stores freshly generated embeddings; cache failures never fail the request."""
+        if not self.cache:
+            return
+        try:
+            self.cache.put_many(items)
+        except Exception as e:
+            print(f"Warning: Failed to write embeddings to cache: {e}")
+
+    def cache_stats(self):
+        """Returns embedding cache hit/miss counters, or None if caching is disabled."""
+        return self.cache.stats() if self.cache else None
+
+    def _embed_batch(self, batch, task_type):
+        """Embeds one batch in a single request, retrying with back-off on quota errors."""
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            self._wait_for_cooldown()
+            try:
+                result = genai.embed_content(
+                    model=self.model,
+                    content=batch,
+                    task_type=task_type
+                )
+                return result['embedding']
+            except RETRYABLE_ERRORS as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = EMBEDDING_RETRY_BASE_DELAY_SECONDS * (2 ** attempt) * (1 + random.random())
+                print(f"Embedding batch rate-limited ({e.__class__.__name__}). Retrying in {delay:.1f}s (attempt {attempt + 1}/{EMBEDDING_MAX_RETRIES})...")
+                self._start_cooldown(delay)
+
+    def _wait_for_cooldown(self):
+        """Sleeps until the shared back-off deadline has passed."""
+        while True:
+            with self._cooldown_lock:
+                remaining = self._cooldown_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def _start_cooldown(self, delay):
+        """Pushes the shared back-off deadline at least `delay` seconds into the future."""
+        with self._cooldown_lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+
+# Process-wide generators, one per model
+_generators = {}
+_generators_lock = threading.Lock()
+
+def get_embedding_generator(model="models/embedding-001"):
+    """Returns the shared EmbeddingGenerator for `model`, creating it on first use."""
+    with _generators_lock:
+        generator = _generators.get(model)
+        if generator is None:
+            generator = EmbeddingGenerator(model=model)
+            _generators[model] = generator
+        return generator
+
 # --- Keep the old OpenAI class commented out or remove if no longer needed ---
 # import openai
 # from openai import OpenAI
@@ -0,0 +1,301 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.config.config import (
+    CHAT_HISTORY_BACKEND,
+    CHAT_HISTORY_DB_PATH,
+    CHAT_HISTORY_MAX_MESSAGES,
+    CHAT_HISTORY_MAX_CUSTOMERS,
+    CHAT_HISTORY_TTL_SECONDS
+)
+
+class SQLiteHistoryBackend:
+    """Durable chat history in a local SQLite file; WAL mode lets every worker process on the host share it."""
+
+    def __init__(self, path=None):
+        self.path = path or CHAT_HISTORY_DB_PATH
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chat_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_customer ON chat_history(customer_id, id)")
+
+    def load(self, customer_id, limit):
+        """Returns (the customer's last `limit` messages oldest first, id of the newest or None)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, role, content FROM chat_history WHERE customer_id = ? ORDER BY id DESC LIMIT ?",
+                (customer_id, limit)
+            ).fetchall()
+        return [{"role": role, "content": content} for _, role, content in reversed(rows)], (rows[0][0] if rows else None)
+
+    def latest_id(self, customer_id):
+        """Id of the customer's newest message, or None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MAX(id) FROM chat_history WHERE customer_id = ?", (customer_id,)
+            ).fetchone()[0]
+
+    def append(self, customer_id, messages, keep):
+        """Stores messages and deletes all but the customer's last `keep` messages.
+
+        Returns (newest id before, newest id after).
+        """
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: appends from other processes wait, so "before" is exact
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous_id = self._conn.execute(
+                    "SELECT MAX(id) FROM chat_history WHERE customer_id = ?", (customer_id,)
+                ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT INTO chat_history (customer_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    [(customer_id, message["role"], message["content"], now) for message in messages]
+                )
+                latest_id = self._conn.execute(
+                    "SELECT MAX(id) FROM chat_history WHERE customer_id = ?", (customer_id,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    """
+                    DELETE FROM chat_history WHERE customer_id = ? AND id NOT IN (
+                        SELECT id FROM chat_history WHERE customer_id = ? ORDER BY id DESC LIMIT ?
+                    )
+                    """,
+                    (customer_id, customer_id, keep)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return previous_id, latest_id
+
+    def clear(self, customer_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM chat_history WHERE customer_id = ?", (customer_id,))
+
+class PostgresHistoryBackend:
+    """Durable chat history in the PostgreSQL chat_history table, shared by every worker and host."""
+
+    def __init__(self):
+        self._table_ready = False
+
+    def _run(self, operation):
+        """Runs `operation(connection)` on the database loop, creating the table on first use."""
+        from src.database.db_event_loop import run_db
+        from src.database.postgres_mcp_server import mcp_server
+
+        async def run():
+            async with mcp_server.pool.acquire() as connection:
+                if not self._table_ready:
+                    # Databases created before chat_history existed get it here (schema.sql has the same DDL)
+                    await connection.execute("""
+                        CREATE TABLE IF NOT EXISTS chat_history (
+                            id BIGSERIAL PRIMARY KEY,
+                            customer_id VARCHAR(255) NOT NULL,
+                            role VARCHAR(20) NOT NULL,
+                            content TEXT NOT NULL,
+                            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                        );
+                        CREATE INDEX IF NOT EXISTS idx_chat_history_customer_id ON chat_history(customer_id, id DESC);
+                    """)
+                    self._table_ready = True
+                return await operation(connection)
+
+        return run_db(run())
+
+    def load(self, customer_id, limit):
+        async def fetch(connection):
+            return await connection.fetch(
+                "SELECT id, role, content FROM chat_history WHERE customer_id = $1 ORDER BY id DESC LIMIT $2",
+                customer_id, limit
+            )
+
+        rows = self._run(fetch)
+        return [{"role": row["role"], "content": row["content"]} for row in reversed(rows)], (rows[0]["id"] if rows else None)
+
+    def latest_id(self, customer_id):
+        async def fetch(connection):
+            return await connection.fetchval("SELECT MAX(id) FROM chat_history WHERE customer_id = $1", customer_id)
+
+        return self._run(fetch)
+
+    def append(self, customer_id, messages, keep):
+        async def insert(connection):
+            async with connection.transaction():
+                # Appends for one customer take turns, so "before" is exact on every worker
+                await connection.execute("SELECT pg_advisory_xact_lock(hashtext($1))", customer_id)
+                previous_id = await connection.fetchval(
+                    "SELECT MAX(id) FROM chat_history WHERE customer_id = $1", customer_id
+                )
+                ids = await connection.fetch(
+                    """
+                    INSERT INTO chat_history (customer_id, role, content)
+                    SELECT $1, role, content FROM unnest($2::text[], $3::text[]) AS m(role, content)
+                    RETURNING id
+                    """,
+                    customer_id, [message["role"] for message in messages], [message["content"] for message in messages]
+                )
+                # Trim to the window the store reads, so the table does not grow without bound
+                await connection.execute(
+                    """
+                    DELETE FROM chat_history WHERE customer_id = $1 AND id <= (
+                        SELECT id FROM chat_history WHERE customer_id = $1 ORDER BY id DESC OFFSET $2 LIMIT 1
+                    )
+                    """,
+                    customer_id, keep
+                )
+                return previous_id, max(row["id"] for row in ids)
+
+        return self._run(insert)
+
+    def clear(self, customer_id):
+        async def delete(connection):
+            await connection.execute("DELETE FROM chat_history WHERE customer_id = $1", customer_id)
+
+        self._run(delete)
+
+def create_history_backend(name=None):
+    """Durable tier for CHAT_HISTORY_BACKEND ("sqlite", "postgres" or "memory" for none)."""
+    name = (name or CHAT_HISTORY_BACKEND).lower()
+    if name == "memory":
+        return None
+    if name == "postgres":
+        try:
+            import src.database.db_event_loop  # noqa: F401 (requires asyncpg)
+            return PostgresHistoryBackend()
+        except ImportError as e:
+            print(f"Warning: PostgreSQL chat history unavailable ({e}). Using SQLite instead.")
+    return SQLiteHistoryBackend()
+
+class ChatHistoryStore:
+    """Per-customer chat history with a bounded in-memory tier over an optional durable tier.
+
+    The memory tier holds at most `max_customers` histories (least recently used are
+    dropped). A history checked against the durable tier less than `ttl` seconds ago is
+    served from memory as is. An older one is re-validated: the store asks the durable
+    tier for the id of the customer's newest message, one indexed lookup, and re-reads
+    the history only if another worker has written since. So a memory hit costs no
+    round trip within the TTL, and turns written by other workers are seen within `ttl`
+    seconds. Each history keeps the last `max_messages` messages. Durable tier errors are logged
+    and the memory tier is used on its own.
+
+    Blocking: the durable tier may be a database round trip, so async code should call
+    get()/append() through asyncio.to_thread.
+    """
+
+    def __init__(self, backend=None, max_messages=None, max_customers=None, ttl=None, clock=time.monotonic):
+        self.backend = backend
+        self.max_messages = max_messages or CHAT_HISTORY_MAX_MESSAGES
+        self.max_customers = max_customers or CHAT_HISTORY_MAX_CUSTOMERS
+        self.ttl = CHAT_HISTORY_TTL_SECONDS if ttl is None else ttl
+        self.loads = 0
+        self.validations = 0
+        self._clock = clock
+        # customer_id -> (messages, id of the newest durable message, when that id was last checked)
+        self._histories = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, customer_id):
+        """Returns a copy of the customer's recent messages, oldest first."""
+        with self._lock:
+            entry = self._histories.get(customer_id)
+            if entry is not None and (self.backend is None or self._clock() - entry[2] < self.ttl):
+                self._histories.move_to_end(customer_id)
+                return list(entry[0])
+        if entry is not None and self._is_current(customer_id, entry[1]):
+            with self._lock:
+                if self._histories.get(customer_id) is entry:
+                    self._remember(customer_id, entry[0], entry[1])
+            return list(entry[0])
+        return list(self._load(customer_id))
+
+    def append(self, customer_id, *messages):
+        """Adds messages ({"role", "content"}) to the customer's history."""
+        messages = list(messages)
+        if self.backend is not None:
+            try:
+                previous_id, latest_id = self.backend.append(customer_id, messages, self.max_messages)
+            except Exception as e:
+                print(f"Warning: Could not persist chat history for {customer_id}: {e}")
+            else:
+                with self._lock:
+                    entry = self._histories.get(customer_id)
+                    if entry is not None and entry[1] == previous_id:
+                        self._remember(customer_id, (entry[0] + messages)[-self.max_messages:], latest_id)
+                    elif previous_id is None:
+                        self._remember(customer_id, messages[-self.max_messages:], latest_id)
+                    else:
+                        # Memory copy is missing turns from another worker; read back on the next get
+                        self._histories.pop(customer_id, None)
+                return
+        # No durable tier (or it failed): keep the turn in memory
+        with self._lock:
+            history, version, checked_at = self._histories.get(customer_id, ([], None, self._clock()))
+            self._remember(customer_id, (history + messages)[-self.max_messages:], version, checked_at)
+
+    def clear(self, customer_id):
+        """Forgets the customer's history in both tiers."""
+        with self._lock:
+            self._histories.pop(customer_id, None)
+        if self.backend is not None:
+            self.backend.clear(customer_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "customers_in_memory": len(self._histories),
+                "max_customers": self.max_customers,
+                "durable_loads": self.loads,
+                "validations": self.validations,
+                "ttl": self.ttl,
+                "backend": type(self.backend).__name__ if self.backend is not None else None
+            }
+
+    def _is_current(self, customer_id, version):
+        if self.backend is None:
+            return True
+        with self._lock:
+            self.validations += 1
+        try:
+            return self.backend.latest_id(customer_id) == version
+        except Exception as e:
+            print(f"Warning: Could not check chat history for {customer_id}: {e}")
+            return True
+
+    def _load(self, customer_id):
+        messages = []
+        latest_id = None
+        if self.backend is not None:
+            try:
+                messages, latest_id = self.backend.load(customer_id, self.max_messages)
+            except Exception as e:
+                print(f"Warning: Could not load chat history for {customer_id}: {e}")
+                with self._lock:
+                    entry = self._histories.get(customer_id)
+                return entry[0] if entry is not None else []
+        with self._lock:
+            self.loads += 1
+            self._remember(customer_id, messages, latest_id)
+        return messages
+
+    def _remember(self, customer_id, messages, version, checked_at=None):
+        self._histories[customer_id] = (messages, version, self._clock() if checked_at is None else checked_at)
+        self._histories.move_to_end(customer_id)
+        while len(self._histories) > self.max_customers:
+            self._histories.popitem(last=False)
@@ -0,0 +1,130 @@
+import math
+
+from src.config.config import (
+    PROMPT_MAX_TOKENS,
+    PROMPT_HISTORY_MAX_TOKENS,
+    PROMPT_CONTEXT_MAX_TOKENS,
+    PROMPT_QUERY_MAX_TOKENS,
+    PROMPT_MIN_CHUNK_TOKENS
+)
+
+# Exact counts with tiktoken when it (and its encoding file) is available; otherwise ~4 characters per token
+try:
+    import tiktoken
+    _ENCODING = tiktoken.encoding_for_model("gpt-4o")
+except Exception:
+    _ENCODING = None
+
+# Chat formatting overhead per message
+_TOKENS_PER_MESSAGE = 4
+
+def count_tokens(text):
+    """Number of gpt-4o tokens in `text` (approximate without tiktoken)."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
+
+def truncate_to_tokens(text, max_tokens):
+    """Cuts `text` to at most `max_tokens` tokens, ending with '...' when shortened."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 1:
+        return ""
+    if _ENCODING is not None:
+        return _ENCODING.decode(_ENCODING.encode(text)[:max_tokens - 1]).rstrip() + "..."
+    cut = text[:(max_tokens - 1) * 4]
+    # Prefer ending on a word boundary
+    if " " in cut[len(cut) // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + "..."
+
+class PromptBuilder:
+    """Assembles the RAG chat prompt within a token budget.
+
+    The system prompt and the user message are always sent (the query is capped at
+    query_max_tokens by fit_query). The rest of max_tokens goes to chat history (up to
+    history_max_tokens, newest messages first, oldest dropped) and then to retrieved
+    context (up to context_max_tokens, most relevant chunks first; the first chunk that
+    does not fit is truncated if at least min_chunk_tokens remain, the rest dropped).
+    """
+
+    def __init__(self, max_tokens=None, history_max_tokens=None, context_max_tokens=None,
+                 query_max_tokens=None, min_chunk_tokens=None):
+        self.max_tokens = max_tokens or PROMPT_MAX_TOKENS
+        self.history_max_tokens = history_max_tokens or PROMPT_HISTORY_MAX_TOKENS
+        self.context_max_tokens = context_max_tokens or PROMPT_CONTEXT_MAX_TOKENS
+        self.query_max_tokens = query_max_tokens or PROMPT_QUERY_MAX_TOKENS
+        self.min_chunk_tokens = min_chunk_tokens or PROMPT_MIN_CHUNK_TOKENS
+
+    def fit_query(self, query_text):
+        """The user's query, cut to query_max_tokens."""
+        return truncate_to_tokens(query_text, self.query_max_tokens)
+
+    def build(self, system_prompt, history, context_parts, user_message):
+        """Returns (prompt_messages, token_breakdown).
+
+        Args:
+            history: Chat messages, oldest first.
+            context_parts: (text, distance) pairs; lower distance is more relevant.
+            user_message: Final user message content (built around fit_query's result).
+        """
+        system_tokens = count_tokens(system_prompt) + _TOKENS_PER_MESSAGE
+        query_tokens = count_tokens(user_message) + _TOKENS_PER_MESSAGE
+        context_header = "Context from similar past interactions or documents:\n"
+        separator = "\n\n---\n\n"
+        available = self.max_tokens - system_tokens - query_tokens - count_tokens(context_header) - _TOKENS_PER_MESSAGE
+
+        # History: newest first until its share (or the whole budget) is used
+        history_budget = max(0, min(self.history_max_tokens, available))
+        kept_history, history_tokens = [], 0
+        for message in reversed(history):
+            tokens = count_tokens(message["content"]) + _TOKENS_PER_MESSAGE
+            if history_tokens + tokens > history_budget:
+                break
+            kept_history.insert(0, message)
+            history_tokens += tokens
+
+        # Context: most relevant first, with whatever the history left over
+        context_budget = max(0, min(self.context_max_tokens, available - history_tokens))
+        kept_context, context_tokens, truncated = [], 0, 0
+        separator_tokens = count_tokens(separator)
+        for text, _ in sorted(context_parts, key=lambda part: part[1]):
+            tokens = count_tokens(text) + (separator_tokens if kept_context else 0)
+            if context_tokens + tokens <= context_budget:
+                kept_context.append(text)
+                context_tokens += tokens
+                continue
+            remaining = context_budget - context_tokens - (separator_tokens if kept_context else 0)
+            if remaining >= self.min_chunk_tokens:
+                shortened = truncate_to_tokens(text, remaining)
+                kept_context.append(shortened)
+                context_tokens += count_tokens(shortened) + (separator_tokens if len(kept_context) > 1 else 0)
+                truncated += 1
+            break
+
+        context_content = (
+            context_header + separator.join(kept_context) if kept_context
+            else "No relevant context found in knowledge base."
+        )
+        prompt_messages = [
+            {"role": "system", "content": system_prompt},
+            *kept_history,
+            {"role": "system", "content": context_content},
+            {"role": "user", "content": user_message}
+        ]
+        context_message_tokens = count_tokens(context_content) + _TOKENS_PER_MESSAGE
+        breakdown = {
+            "system": system_tokens,
+            "history": history_tokens,
+            "history_messages": f"{len(kept_history)}/{len(history)}",
+            "context": context_message_tokens,
+            "context_chunks": f"{len(kept_context)}/{len(context_parts)}",
+            "truncated_chunks": truncated,
+            "query": query_tokens,
+            "total": system_tokens + history_tokens + context_message_tokens + query_tokens,
+            "budget": self.max_tokens,
+            "exact": _ENCODING is not None
+        }
+        return prompt_messages, breakdown
@@ -1,37 +1,39 @@
 import json
 import os
-# Ensure relative imports work correctly
+# Ensure absolute `src.` imports work when this file is run directly
 import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from vector_database.vector_db_client import VectorDBClient
-from embedding_service.embedding_generator import EmbeddingGenerator
-from config import config
+# Import through the `src.` package only, so this module shares the same
+# vector index, embedding generator and database service as the API
+from src.vector_database.vector_db_client import get_vector_db_client
+from src.embedding_service.embedding_generator import get_embedding_generator
+from src.config import config
 import pandas as pd
 import openai # Keep for now as chat completion uses it
-from collections import defaultdict # Import defaultdict for chat history
-import re # Import regex for parsing sentiment
 import time # Add time for unique IDs
 import httpx # Import httpx
-import asyncio # Add asyncio for database operations
+import asyncio # Async request path used by the ASGI app
 
-# Add database service import
-try:
-    from database.database_service import get_database_service
-    DATABASE_AVAILABLE = True
-except ImportError:
-    print("Warning: Database service not available. Running in FAISS-only mode.")
-    DATABASE_AVAILABLE = False
+# Chat turns are stored through the background ingestion queue (FAISS, plus PostgreSQL when available)
+from src.database.ingestion_queue import get_ingestion_queue
+from src.utils.response_streaming import MarkdownStreamCleaner, strip_markdown
+from src.personalization_engine.response_cache import SemanticResponseCache, context_fingerprint
+from src.personalization_engine.chat_history import ChatHistoryStore, create_history_backend
+from src.personalization_engine.prompt_builder import PromptBuilder
 
 class RecommendationEngine:
     def __init__(self):
-        self.vector_db_client = VectorDBClient() # Uses FAISS client
-        self.embedding_generator = EmbeddingGenerator() # Now uses Google client
+        self.vector_db_client = get_vector_db_client() # Shared FAISS client
+        self.embedding_generator = get_embedding_generator() # Shared Google client
         # Check for Google API key for embeddings
         if not config.GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY not set in config for EmbeddingGenerator.")
         # Keep OpenAI key check for Chat Completion part
         self.openai_client = None # Initialize client attribute
+        self.async_openai_client = None # Same, for the async (ASGI) request path
+        # Answers to near-identical questions over the same retrieved context are reused
+        self.response_cache = SemanticResponseCache() if config.RESPONSE_CACHE_ENABLED else None
         if not config.OPENAI_API_KEY:
             print("Warning: OPENAI_API_KEY not set in config. Chat completion might fail.")
         else:
@@ -49,6 +51,10 @@ class RecommendationEngine:
                     api_key=config.OPENAI_API_KEY,
                     http_client=httpx_client
                 )
+                self.async_openai_client = openai.AsyncClient(
+                    api_key=config.OPENAI_API_KEY,
+                    http_client=httpx.AsyncClient()
+                )
             finally:
                 # Restore original environment variables
                 for key, value in original_proxies.items():
@@ -66,21 +72,16 @@ class RecommendationEngine:
             print(f"Error loading system prompt: {e}. Using default prompt.")
             self.system_prompt = "You are an AI assistant for SBI Life Insurance. Respond helpfully."
 
-        # In-memory chat history store (simple implementation)
-        # Stores history as {customer_id: [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]}
-        self.chat_history = defaultdict(list)
+        # Chat history per customer: [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
+        # Bounded in memory, persisted to CHAT_HISTORY_BACKEND so it survives restarts and is shared by workers
+        self.chat_history = ChatHistoryStore(backend=create_history_backend())
+        # Fits system prompt, history, retrieved context and query into the PROMPT_* token budget
+        self.prompt_builder = PromptBuilder()
 
-        # Initialize database service
-        self.db_service = None
-        if DATABASE_AVAILABLE:
-            try:
-                # We'll initialize this asynchronously when needed
-                self.db_service_available = True
-            except Exception as e:
-                print(f"Warning: Failed to initialize database service: {e}")
-                self.db_service_available = False
-        else:
-            self.db_service_available = False
+        # Single writer for interactions; falls back to FAISS-only when PostgreSQL is unavailable
+        self.ingestion_queue = get_ingestion_queue()
+        if not self.ingestion_queue.stores_to_database:
+            print("Warning: Database service not available. Running in FAISS-only mode.")
 
     def clean_json_response(self, response_text):
         """Clean OpenAI response text to ensure valid JSON"""
@@ -90,10 +91,8 @@ class RecommendationEngine:
         cleaned = cleaned.strip()
         return cleaned
 
-    def process_user_interaction(self, customer_id, interaction_text, interaction_type="chatbot", user_language='en'): 
-        """Processes user interaction with enhanced database integration, stores it in FAISS and PostgreSQL, gets a personalized response, and updates chat history."""
-        conversation_turn_id = f"{customer_id}_{int(pd.Timestamp.now().timestamp())}"
-        
+    def _smart_swadhan_guidance_response(self, interaction_text):
+        """Returns the visual guidance response if the user asks to be guided to Smart Swadhan, else None."""
         # Check if this is a Smart Swadhan guidance request (explicit guidance intent required)
         guidance_keywords = [
             'guide me', 'show me', 'navigate', 'navigate to', 'how to find', 'where is', 
@@ -119,109 +118,94 @@ class RecommendationEngine:
                 "show_visual_guidance": True,
                 "product_focus": "smart_swadhan_supreme"
             }
-        
-        # Store interaction using database service (async) if available
-        if self.db_service_available:
-            try:
-                # Run the async database operation
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                async def store_interaction_async():
-                    if not self.db_service:
-                        self.db_service = await get_database_service()
-                    
-                    return await self.db_service.store_interaction(
-                        customer_id=customer_id,
-                        interaction_text=interaction_text,
-                        interaction_type=interaction_type,
-                        user_language=user_language,
-                        additional_metadata={
-                            "conversation_turn_id": conversation_turn_id,
-                            "timestamp": str(pd.Timestamp.now())
-                        }
-                    )
-                
-                db_result = loop.run_until_complete(store_interaction_async())
-                loop.close()
-                
-                if db_result["success"]:
-                    print(f"✅ Stored interaction in PostgreSQL and FAISS: {conversation_turn_id}")
-                    # If database service returns an LLM response, use it
-                    if 'llm_response' in db_result:
-                        # Add to chat history
-                        self.chat_history[customer_id].append({"role": "user", "content": interaction_text})
-                        self.chat_history[customer_id].append({"role": "assistant", "content": db_result['llm_response']})
-                        self.chat_history[customer_id] = self.chat_history[customer_id][-20:]  # Keep last 20 messages
-                        
-                        return {
-                            "response": db_result['llm_response'],
-                            "conversation_id": db_result.get('conversation_id'),
-                            "customer_id": customer_id,
-                            "success": True,
-                            "source": "database_service"
-                        }
-                else:
-                    print(f"⚠️ Database storage failed: {db_result.get('error', 'Unknown error')}")
-                    # Fall back to FAISS-only storage
-                    self._store_faiss_only(customer_id, interaction_text, interaction_type, conversation_turn_id)
-                    
-            except Exception as e:
-                print(f"⚠️ Database service error: {e}. Falling back to FAISS-only storage.")
-                self._store_faiss_only(customer_id, interaction_text, interaction_type, conversation_turn_id)
-        else:
-            # Fallback to FAISS-only storage
-            self._store_faiss_only(customer_id, interaction_text, interaction_type, conversation_turn_id)
+        return None
+
+    def process_user_interaction(self, customer_id, interaction_text, interaction_type="chatbot", user_language='en', additional_metadata=None): 
+        """Processes user interaction: queues it for storage in FAISS and PostgreSQL, gets a personalized response, and updates chat history."""
+        # Store the turn exactly once; embedding and the FAISS/PostgreSQL writes happen in background batches
+        self.ingestion_queue.submit(customer_id, interaction_text, interaction_type, user_language, additional_metadata)
+
+        guidance_response = self._smart_swadhan_guidance_response(interaction_text)
+        if guidance_response:
+            return guidance_response
 
         # Add user message to chat history BEFORE getting the response
         # Store the original English query for context
-        self.chat_history[customer_id].append({"role": "user", "content": interaction_text})
+        self.chat_history.append(customer_id, {"role": "user", "content": interaction_text})
 
         # Get personalized response, passing user_language
         response_data = self.get_rag_personalized_response(customer_id, interaction_text, user_language)
+        self._remember_response(customer_id, response_data)
+        return response_data
+
+    async def aprocess_user_interaction(self, customer_id, interaction_text, interaction_type="chatbot", user_language='en', additional_metadata=None):
+        """Async version of process_user_interaction for the ASGI app; the OpenAI call is awaited instead of blocking a thread."""
+        # submit() only blocks when the queue is full (backpressure), so keep it off the event loop
+        await asyncio.to_thread(self.ingestion_queue.submit, customer_id, interaction_text, interaction_type, user_language, additional_metadata)
+
+        guidance_response = self._smart_swadhan_guidance_response(interaction_text)
+        if guidance_response:
+            return guidance_response
+
+        # The history store may read from or write to its database, so keep it off the event loop too
+        await asyncio.to_thread(self.chat_history.append, customer_id, {"role": "user", "content": interaction_text})
+
+        response_data = await self.aget_rag_personalized_response(customer_id, interaction_text, user_language)
+        await asyncio.to_thread(self._remember_response, customer_id, response_data)
+        return response_data
+
+    def stream_user_interaction(self, customer_id, interaction_text, interaction_type="chatbot", user_language='en', additional_metadata=None):
+        """Streaming version of process_user_interaction.
+
+        Yields ("token", {"text": ...}) events with cleaned answer text as OpenAI generates it,
+        then one ("done", response_data) event with the same dict process_user_interaction returns.
+        """
+        self.ingestion_queue.submit(customer_id, interaction_text, interaction_type, user_language, additional_metadata)
+
+        guidance_response = self._smart_swadhan_guidance_response(interaction_text)
+        if guidance_response:
+            yield "done", guidance_response
+            return
+
+        self.chat_history.append(customer_id, {"role": "user", "content": interaction_text})
+
+        for event, payload in self.stream_rag_personalized_response(customer_id, interaction_text, user_language):
+            if event == "done":
+                self._remember_response(customer_id, payload)
+            yield event, payload
+
+    async def astream_user_interaction(self, customer_id, interaction_text, interaction_type="chatbot", user_language='en', additional_metadata=None):
+        """Async version of stream_user_interaction for the ASGI app."""
+        await asyncio.to_thread(self.ingestion_queue.submit, customer_id, interaction_text, interaction_type, user_language, additional_metadata)
 
+        guidance_response = self._smart_swadhan_guidance_response(interaction_text)
+        if guidance_response:
+            yield "done", guidance_response
+            return
+
+        await asyncio.to_thread(self.chat_history.append, customer_id, {"role": "user", "content": interaction_text})
+
+        async for event, payload in self.astream_rag_personalized_response(customer_id, interaction_text, user_language):
+            if event == "done":
+                await asyncio.to_thread(self._remember_response, customer_id, payload)
+            yield event, payload
+
+    def _remember_response(self, customer_id, response_data):
+        """Adds the assistant's answer to the customer's chat history"""
         # Add assistant response to chat history (use the English response before translation)
         if "response" in response_data and not response_data.get("error"):
              # Store the original English response from the LLM
              assistant_response_english = response_data.get('original_llm_response', response_data["response"]) # Get raw LLM response if available
-             self.chat_history[customer_id].append({"role": "assistant", "content": assistant_response_english})
-             # Limit history size (e.g., keep last 10 turns = 20 messages)
-             self.chat_history[customer_id] = self.chat_history[customer_id][-20:]
+             # The store keeps the last CHAT_HISTORY_MAX_MESSAGES messages (10 turns by default)
+             self.chat_history.append(customer_id, {"role": "assistant", "content": assistant_response_english})
 
-        return response_data
+    def _prepare_rag_prompt(self, customer_id, user_input_text, user_language='en'):
+        """Embeds the query and builds the OpenAI messages from FAISS context and chat history.
 
-    def _store_faiss_only(self, customer_id, interaction_text, interaction_type, conversation_turn_id):
-        """Fallback method to store interaction only in FAISS"""
-        # Embed interaction text (usually document context)
-        embedding = self.embedding_generator.get_embedding(interaction_text, task_type="RETRIEVAL_DOCUMENT") # Specify task type
-        if not embedding:
-            print(f"Error: Failed to generate embedding for interaction: {interaction_text[:100]}...")
-            return False
-
-        metadata = {
-            "customer_id": customer_id,
-            "conversation_id": "BASIC_CONVO_" + str(int(pd.Timestamp.now().timestamp())), # Basic convo ID for now
-            "timestamp": str(pd.Timestamp.now()),
-            "speaker": "customer",
-            "text": interaction_text,
-            "interaction_type": interaction_type,
-            "outcome": "message_stored" # Basic outcome for now
-        }
-        
-        if self.vector_db_client:
-            success = self.vector_db_client.upsert_embedding(conversation_turn_id, embedding, metadata)
-            if success:
-                print(f"Stored interaction in FAISS: {conversation_turn_id}") # Confirmation log (Updated to FAISS)
-                return True
-            else:
-                print(f"Failed to store interaction in FAISS: {conversation_turn_id}")
-                return False
-        else:
-             print("Warning: Vector DB client not initialized. Interaction not stored.")
-             return False
-
-    def get_rag_personalized_response(self, customer_id, user_input_text, user_language='en'): # Add user_language
-        """Generates a formatted personalized response using RAG with FAISS, chat history, sentiment analysis, and OpenAI."""
+        Returns (prompt_messages, None, cache_key), or (None, response, None) when there is nothing
+        to send to OpenAI (including a cached answer). cache_key is passed to _cache_response once
+        the answer is generated; it is None when the answer must not be cached.
+        """
         # Generate embedding for the query using the correct task type
         query_embedding = self.embedding_generator.get_embedding(user_input_text, task_type="RETRIEVAL_QUERY") # Specify task type
 
@@ -229,13 +213,19 @@ class RecommendationEngine:
         if not query_embedding:
             print("Error generating query embedding.")
             # Return structure consistent with successful response but indicating error
-            return {
+            return None, {
                 "response": "Sorry, I encountered an issue understanding your request.",
                 "source": "Embedding Error"
-            }
-
-        # Query similar embeddings from FAISS
-        query_results = self.vector_db_client.query_similar_embeddings(query_embedding, top_k=5) # Use top_k=5 or more if needed for better context
+            }, None
+
+        # Query similar embeddings from FAISS: brochure chunks, plus this customer's own similar turns
+        # (filtered searches, so other customers' conversations never end up in the context)
+        query_results = self.vector_db_client.query_similar_embeddings(query_embedding, top_k=5, filter={"source": "pdf"})
+        own_turns = self.vector_db_client.query_similar_embeddings(
+            query_embedding, top_k=2, filter={"customer_id": customer_id, "source": "interaction"}
+        )
+        if query_results is not None and own_turns:
+            query_results['matches'].extend(own_turns['matches'])
         print(f"FAISS Query Results: {query_results}") # Updated print statement
 
         # Handle case when no similar interactions found or query fails
@@ -244,12 +234,32 @@ class RecommendationEngine:
             print("No similar interactions found in FAISS or query failed.")
             # Provide a generic, helpful response
             general_response_content = "I'm here to help you with SBI Life insurance. How can I assist you today?"
-            return {
+            return None, {
                 "response": general_response_content,
                 "source": "No Similar Interactions Found"
+            }, None
+
+        # Reuse a cached answer to a near-identical question over the same context. Only on the
+        # first turn of a conversation: later answers also depend on the chat history.
+        cache_key = None
+        history = self.chat_history.get(customer_id)
+        if self.response_cache is not None and not any(message["role"] == "assistant" for message in history):
+            cache_key = {
+                "query_embedding": query_embedding,
+                "language": user_language,
+                "fingerprint": context_fingerprint(query_results['matches']),
+                "sources": [
+                    (match.get('id'), {key: match.get('metadata', {}).get(key) for key in ("source", "filename", "customer_id")})
+                    for match in query_results['matches']
+                ],
+                "query_text": user_input_text
             }
+            cached_response = self.response_cache.lookup(cache_key["query_embedding"], user_language, cache_key["fingerprint"])
+            if cached_response:
+                print(f"Serving cached RAG response (similarity {cached_response['cache_similarity']})")
+                return None, cached_response, None
 
-        # Build context from similar interactions/documents
+        # Build context from similar interactions/documents, with each match's FAISS distance
         # Use the full 'text' field from metadata, which now contains the complete PDF content
         context_parts = []
         # Correctly access the 'matches' key in the dictionary
@@ -259,29 +269,45 @@ class RecommendationEngine:
             source_text = metadata.get('text', 'No text available') # Get text from metadata
             source_type = metadata.get('source', 'unknown')
             filename = metadata.get('filename', 'N/A') if source_type == 'pdf' else None # Check if filename exists for PDFs
+            distance = match.get('score', float('inf'))
 
             # Adjust context string based on source type
             if source_type == 'pdf' and filename:
-                context_parts.append(f"Context from PDF '{filename}':\n{source_text}")
+                context_parts.append((f"Context from PDF '{filename}':\n{source_text}", distance))
             elif source_type != 'pdf': # Assuming other sources are interaction texts
-                 context_parts.append(f"Similar interaction text: {source_text}")
+                 context_parts.append((f"Similar interaction text: {source_text}", distance))
             else: # Fallback if source is pdf but no filename, or unknown source
-                 context_parts.append(f"Relevant context: {source_text}")
-
-        context_string = "\n\n---\n\n".join(context_parts) # Join parts with separator
+                 context_parts.append((f"Relevant context: {source_text}", distance))
 
         # --- OpenAI Prompt ---
-        # Retrieve chat history for the customer
-        history = self.chat_history.get(customer_id, [])
+        # Chat history for the customer (retrieved above). Its last message is this query, which the
+        # final user message below already carries.
+        if history and history[-1] == {"role": "user", "content": user_input_text}:
+            history = history[:-1]
 
-        prompt_messages = [
+        query_text = self.prompt_builder.fit_query(user_input_text)
+        prompt_messages, token_breakdown = self.prompt_builder.build(
             # Use the system prompt loaded during initialization
-            {"role": "system", "content": self.system_prompt},
-            *history,
-            {"role": "system", "content": f"Context from similar past interactions or documents:\n{context_string}" if context_string else "No relevant context found in knowledge base."},
+            self.system_prompt,
+            history,
+            context_parts,
             # Pass the user input in English for analysis but specify response language clearly
-            {"role": "user", "content": f"User query: {user_input_text}\nuser_language: {user_language}\n\nPlease respond to this query ONLY in the language specified by user_language code. Do not mix languages in your response."}
-        ]
+            f"User query: {query_text}\nuser_language: {user_language}\n\nPlease respond to this query ONLY in the language specified by user_language code. Do not mix languages in your response."
+        )
+        print(f"RAG prompt tokens for {customer_id}: {token_breakdown}")
+        return prompt_messages, None, cache_key
+
+    def _cache_response(self, cache_key, response_data):
+        """Stores a freshly generated RAG answer in the semantic response cache"""
+        if cache_key is not None:
+            self.response_cache.store(response=response_data, **cache_key)
+        return response_data
+
+    def get_rag_personalized_response(self, customer_id, user_input_text, user_language='en'): # Add user_language
+        """Generates a formatted personalized response using RAG with FAISS, chat history, sentiment analysis, and OpenAI."""
+        prompt_messages, early_response, cache_key = self._prepare_rag_prompt(customer_id, user_input_text, user_language)
+        if early_response:
+            return early_response
 
         try:
             print("\n--- Calling OpenAI for RAG response --- ")
@@ -296,56 +322,156 @@ class RecommendationEngine:
                 messages=prompt_messages,
                 max_tokens=450 # Slightly more tokens for response + sentiment line
             )
-            raw_llm_output = openai_response.choices[0].message.content.strip()
-            print(f"Raw OpenAI Output:\n{raw_llm_output}")
-
-            # Parse the response and sentiment
-            response_lines = raw_llm_output.split('\n')
-            detected_sentiment = "Neutral" # Default sentiment
-            main_response = raw_llm_output # Default to full output if parsing fails
-
-            if len(response_lines) > 1 and response_lines[-1].lower().startswith("sentiment:"):
-                sentiment_line = response_lines[-1].split(':', 1)
-                if len(sentiment_line) > 1:
-                    detected_sentiment = sentiment_line[1].strip()
-                    # Validate sentiment (optional)
-                    if detected_sentiment not in ["Positive", "Negative", "Neutral"]:
-                        print(f"Warning: Unexpected sentiment value '{detected_sentiment}'. Defaulting to Neutral.")
-                        detected_sentiment = "Neutral"
-                main_response = "\n".join(response_lines[:-1]).strip()
-            else:
-                print("Warning: Could not parse sentiment from LLM response. Defaulting to Neutral.")
-
-            # --- ADD MARKDOWN CLEANING STEP ---
-            # Remove bold (**text**)
-            cleaned_response = re.sub(r'\*\*(.*?)\*\*', r'\1', main_response)
-            # Remove italics (*text* or _text_)
-            cleaned_response = re.sub(r'[_*]([^*_]+?)[_*]', r'\1', cleaned_response)
-            # Remove inline code (`text`)
-            cleaned_response = re.sub(r'`(.*?)`', r'\1', cleaned_response)
-            # Standardize list markers (* or - at start of line) to just '-'
-            cleaned_response = re.sub(r'^\s*[\*\-]\s+', '- ', cleaned_response, flags=re.MULTILINE)
-
-            print(f"Cleaned Response (No Markdown):\n{cleaned_response}")
-            print(f"Detected Sentiment: {detected_sentiment}")
-
-            # Return the cleaned response, sentiment, and original LLM output
-            return {
-                "response": cleaned_response, # Use the cleaned response
-                "sentiment": detected_sentiment,
-                "original_llm_response": raw_llm_output, # Store the raw output for history
-                "source": "RAG+OpenAI (FAISS + History + Sales Guidance + Sentiment)" # Updated source
-            }
+            return self._cache_response(cache_key, self._parse_rag_output(openai_response.choices[0].message.content.strip()))
 
         except Exception as e:
-            error_message = f"Error calling OpenAI API for RAG response: {e}"
-            print(f"ERROR in get_rag_personalized_response (OpenAI call): {error_message}")
-            # Return structure consistent with successful response but indicating error
-            return {
-                "response": "Sorry, I encountered an issue generating a personalized response at this time.",
-                "sentiment": "Neutral", # Default sentiment on error
-                "source": "RAG+OpenAI Error"
-            }
+            return self._rag_error_response(e)
+
+    async def aget_rag_personalized_response(self, customer_id, user_input_text, user_language='en'):
+        """Async version of get_rag_personalized_response; the OpenAI call is awaited on the event loop."""
+        # Embedding and FAISS search use blocking clients (FAISS releases the GIL)
+        prompt_messages, early_response, cache_key = await asyncio.to_thread(self._prepare_rag_prompt, customer_id, user_input_text, user_language)
+        if early_response:
+            return early_response
+
+        try:
+            print("\n--- Calling OpenAI for RAG response (async) --- ")
+            print(f"Target Language: {user_language}")
+            if not self.async_openai_client:
+                 raise ValueError("OpenAI client not initialized. Check API key.")
+
+            openai_response = await self.async_openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=prompt_messages,
+                max_tokens=450 # Slightly more tokens for response + sentiment line
+            )
+            return self._cache_response(cache_key, self._parse_rag_output(openai_response.choices[0].message.content.strip()))
+
+        except Exception as e:
+            return self._rag_error_response(e)
+
+    def stream_rag_personalized_response(self, customer_id, user_input_text, user_language='en'):
+        """Streaming version of get_rag_personalized_response.
+
+        Markdown is stripped as tokens arrive and the sentiment trailer line is held back;
+        the final ("done", response) event carries the parsed sentiment and the full answer.
+        """
+        prompt_messages, early_response, cache_key = self._prepare_rag_prompt(customer_id, user_input_text, user_language)
+        if early_response:
+            yield "done", early_response
+            return
+
+        cleaner = MarkdownStreamCleaner()
+        try:
+            print("\n--- Streaming OpenAI RAG response --- ")
+            print(f"Target Language: {user_language}")
+            if not self.openai_client:
+                 raise ValueError("OpenAI client not initialized. Check API key.")
+
+            stream = self.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=prompt_messages,
+                max_tokens=450, # Slightly more tokens for response + sentiment line
+                stream=True
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    text = cleaner.feed(delta)
+                    if text:
+                        yield "token", {"text": text}
+
+        except Exception as e:
+            yield "done", self._rag_error_response(e)
+            return
+
+        remaining_text = cleaner.finish()
+        if remaining_text:
+            yield "token", {"text": remaining_text}
+        yield "done", self._cache_response(cache_key, self._parse_rag_output(cleaner.raw_text.strip()))
+
+    async def astream_rag_personalized_response(self, customer_id, user_input_text, user_language='en'):
+        """Async version of stream_rag_personalized_response; the OpenAI stream is consumed on the event loop."""
+        prompt_messages, early_response, cache_key = await asyncio.to_thread(self._prepare_rag_prompt, customer_id, user_input_text, user_language)
+        if early_response:
+            yield "done", early_response
+            return
+
+        cleaner = MarkdownStreamCleaner()
+        try:
+            print("\n--- Streaming OpenAI RAG response (async) --- ")
+            print(f"Target Language: {user_language}")
+            if not self.async_openai_client:
+                 raise ValueError("OpenAI client not initialized. Check API key.")
+
+            stream = await self.async_openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=prompt_messages,
+                max_tokens=450, # Slightly more tokens for response + sentiment line
+                stream=True
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    text = cleaner.feed(delta)
+                    if text:
+                        yield "token", {"text": text}
+
+        except Exception as e:
+            yield "done", self._rag_error_response(e)
+            return
+
+        remaining_text = cleaner.finish()
+        if remaining_text:
+            yield "token", {"text": remaining_text}
+        yield "done", self._cache_response(cache_key, self._parse_rag_output(cleaner.raw_text.strip()))
+
+    def _parse_rag_output(self, raw_llm_output):
+        """Splits the sentiment trailer off the raw LLM output and strips markdown from the rest."""
+        print(f"Raw OpenAI Output:\n{raw_llm_output}")
+        # Parse the response and sentiment
+        response_lines = raw_llm_output.split('\n')
+        detected_sentiment = "Neutral" # Default sentiment
+        main_response = raw_llm_output # Default to full output if parsing fails
+
+        if len(response_lines) > 1 and response_lines[-1].lower().startswith("sentiment:"):
+            sentiment_line = response_lines[-1].split(':', 1)
+            if len(sentiment_line) > 1:
+                detected_sentiment = sentiment_line[1].strip()
+                # Validate sentiment (optional)
+                if detected_sentiment not in ["Positive", "Negative", "Neutral"]:
+                    print(f"Warning: Unexpected sentiment value '{detected_sentiment}'. Defaulting to Neutral.")
+                    detected_sentiment = "Neutral"
+            main_response = "\n".join(response_lines[:-1]).strip()
+        else:
+            print("Warning: Could not parse sentiment from LLM response. Defaulting to Neutral.")
+
+        # --- ADD MARKDOWN CLEANING STEP ---
+        # Bold, italics and inline code are removed and list markers standardised to '-',
+        # line by line, exactly as the streaming path cleans them
+        cleaned_response = strip_markdown(main_response)
+
+        print(f"Cleaned Response (No Markdown):\n{cleaned_response}")
+        print(f"Detected Sentiment: {detected_sentiment}")
+
+        # Return the cleaned response, sentiment, and original LLM output
+        return {
+            "response": cleaned_response, # Use the cleaned response
+            "sentiment": detected_sentiment,
+            "original_llm_response": raw_llm_output, # Store the raw output for history
+            "source": "RAG+OpenAI (FAISS + History + Sales Guidance + Sentiment)" # Updated source
+        }
+
+    def _rag_error_response(self, e):
+        """Response returned when the OpenAI call for a RAG answer fails."""
+        error_message = f"Error calling OpenAI API for RAG response: {e}"
+        print(f"ERROR in get_rag_personalized_response (OpenAI call): {error_message}")
+        # Return structure consistent with successful response but indicating error
+        return {
+            "response": "Sorry, I encountered an issue generating a personalized response at this time.",
+            "sentiment": "Neutral", # Default sentiment on error
+            "source": "RAG+OpenAI Error"
+        }
 
 
 if __name__ == '__main__':
@@ -388,30 +514,29 @@ if __name__ == '__main__':
             # --- END OF ENHANCED CONVERSATION ---
 
             conversation_id_seed = f"SEED_CONVO_{int(pd.Timestamp.now().timestamp())}"
-            for i, turn in enumerate(successful_conversation):
-                text_to_embed = turn["content"]
-                # Use RETRIEVAL_DOCUMENT type for storing context
-                embedding = recommender.embedding_generator.get_embedding(text_to_embed, task_type="RETRIEVAL_DOCUMENT")
-                if embedding:
-                    # Create a unique ID for each turn, ensuring chronological order if needed later
-                    turn_id = f"{successful_customer_id}_{conversation_id_seed}_turn{i:02d}"
-                    metadata = {
+            # Embed every turn in one batched call, using RETRIEVAL_DOCUMENT type for storing context
+            seed_texts = [turn["content"] for turn in successful_conversation]
+            seed_embeddings = recommender.embedding_generator.get_embeddings(seed_texts, task_type="RETRIEVAL_DOCUMENT")
+            if seed_embeddings is None:
+                print("Failed to generate embeddings for the seed conversation.")
+            else:
+                # Create a unique ID for each turn, ensuring chronological order if needed later
+                turn_ids = [f"{successful_customer_id}_{conversation_id_seed}_turn{i:02d}" for i in range(len(successful_conversation))]
+                seed_metadatas = [
+                    {
                         "customer_id": successful_customer_id,
                         "conversation_id": conversation_id_seed,
                         "timestamp": str(pd.Timestamp.now()),
                         "speaker": turn["role"],
-                        "text": text_to_embed,
+                        "text": turn["content"],
                         "interaction_type": "chatbot_seed",
                         "outcome": "successful_purchase_path" # Mark this as part of a successful path
                     }
-                    success = recommender.vector_db_client.upsert_embedding(turn_id, embedding, metadata)
-                    if success:
-                        print(f"Seeded turn {i} for {successful_customer_id} into FAISS.")
-                    else:
-                        print(f"Failed to seed turn {i} for {successful_customer_id}.")
-                    time.sleep(0.1) # Small delay to ensure distinct timestamps if needed
-                else:
-                    print(f"Failed to generate embedding for seeding turn {i}.")
+                    for turn in successful_conversation
+                ]
+                seeded = recommender.vector_db_client.upsert_embeddings(turn_ids, seed_embeddings, seed_metadatas)
+                recommender.vector_db_client.flush()
+                print(f"Seeded {seeded}/{len(successful_conversation)} turns for {successful_customer_id} into FAISS.")
             print("--- Seeding Complete ---")
 
             # --- Regular Testing Starts Here ---
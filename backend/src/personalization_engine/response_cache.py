@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from src.config.config import (
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES
+)
+
+def context_fingerprint(matches):
+    """Fingerprint of retrieved context: the IDs and texts of the matches, in any order."""
+    parts = sorted(
+        f"{match.get('id')}\0{hashlib.sha256(match.get('metadata', {}).get('text', '').encode('utf-8')).hexdigest()}"
+        for match in matches
+    )
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+class SemanticResponseCache:
+    """In-memory cache of RAG answers, looked up by query embedding similarity.
+
+    Entries are grouped by (language, context fingerprint), so an answer is only
+    reused when the same documents were retrieved; within a group the entry whose
+    query embedding has the highest cosine similarity at or above `threshold` is
+    returned. Entries expire after `ttl` seconds and the least recently used are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(self, threshold=None, ttl=None, max_entries=None, clock=time.monotonic):
+        """
+        Args:
+            threshold: Minimum cosine similarity between query embeddings for a hit.
+            ttl: Seconds an answer is reused.
+            max_entries: Entry count above which the least recently used entries are evicted.
+            clock: Time source (seconds); injectable for tests.
+        """
+        self.threshold = RESPONSE_CACHE_SIMILARITY_THRESHOLD if threshold is None else threshold
+        self.ttl = ttl or RESPONSE_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or RESPONSE_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()  # entry_id -> entry dict
+        self._groups = {}              # (language, fingerprint) -> set of entry_ids
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_embedding, language, fingerprint):
+        """Returns a copy of the cached response for a similar query, or None."""
+        query = self._normalize(query_embedding)
+        now = self._clock()
+        with self._lock:
+            best_id, best_similarity = None, self.threshold
+            for entry_id in list(self._groups.get((language, fingerprint), ())):
+                entry = self._entries[entry_id]
+                if now - entry["created_at"] >= self.ttl:
+                    self._remove(entry_id)
+                    continue
+                similarity = float(np.dot(query, entry["embedding"]))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            entry["hits"] += 1
+            self.hits += 1
+            return dict(entry["response"], cached=True, cache_similarity=round(best_similarity, 4))
+
+    def store(self, query_embedding, language, fingerprint, response, sources, query_text=None):
+        """Caches a response.
+
+        Args:
+            sources: (vector_id, metadata) pairs of the context the answer was built from,
+                     checked by invalidate().
+            query_text: Kept for stats().
+        """
+        entry_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[entry_id] = {
+                "embedding": self._normalize(query_embedding),
+                "group": (language, fingerprint),
+                "response": dict(response),
+                "sources": list(sources),
+                "query_text": query_text,
+                "created_at": self._clock(),
+                "hits": 0
+            }
+            self._groups.setdefault((language, fingerprint), set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, predicate=None):
+        """Drops entries built from any context source for which predicate(vector_id, metadata)
+        is true, or every entry when predicate is None. Returns the number dropped."""
+        with self._lock:
+            if predicate is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._groups.clear()
+                return dropped
+            stale = [
+                entry_id for entry_id, entry in self._entries.items()
+                if any(predicate(vector_id, metadata) for vector_id, metadata in entry["sources"])
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+            return len(stale)
+
+    def stats(self, top=10):
+        """Hit/miss counters, size, and the most reused entries with their hit counts."""
+        now = self._clock()
+        with self._lock:
+            lookups = self.hits + self.misses
+            top_entries = sorted(self._entries.values(), key=lambda entry: entry["hits"], reverse=True)[:top]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "top_entries": [
+                    {
+                        "query": entry["query_text"],
+                        "language": entry["group"][0],
+                        "hits": entry["hits"],
+                        "age_seconds": round(now - entry["created_at"], 1)
+                    }
+                    for entry in top_entries
+                ]
+            }
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        group = self._groups.get(entry["group"])
+        if group is not None:
+            group.discard(entry_id)
+            if not group:
+                del self._groups[entry["group"]]
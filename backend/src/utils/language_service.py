@@ -1,15 +1,50 @@
 # backend/src/utils/language_service.py
 
-from typing import Dict, Optional
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from deep_translator import GoogleTranslator
+from src.config.config import (
+    TRANSLATION_CACHE_ENABLED,
+    TRANSLATION_MEMORY_CACHE_ENTRIES,
+    TRANSLATION_CHUNK_CHARS,
+    TRANSLATION_MAX_CONCURRENCY
+)
+from src.utils.translation_cache import TranslationCache
+from src.utils.ttl_cache import TTLCache
+
+# Indentation plus an optional bullet or list number; kept as-is and not sent for translation
+_LINE_PREFIX = re.compile(r'^\s*(?:(?:[-•*]|\d+[.)])\s+)?')
 
 class LanguageService:
-    def __init__(self):
+    def __init__(self, cache=None, translator_factory=GoogleTranslator, chunk_chars=None, max_concurrency=None):
+        """
+        Args:
+            cache: TranslationCache consulted before calling the translator. Defaults to the
+                   on-disk cache at TRANSLATION_CACHE_PATH when TRANSLATION_CACHE_ENABLED.
+            translator_factory: Called as factory(source=..., target=...) to build a translator
+            chunk_chars, max_concurrency: Override TRANSLATION_CHUNK_CHARS / TRANSLATION_MAX_CONCURRENCY
+        """
         self.supported_languages = {
             'en': 'english',
             'ta': 'tamil',
             'hi': 'hindi'
         }
+        self.cache = cache
+        if self.cache is None and TRANSLATION_CACHE_ENABLED:
+            try:
+                self.cache = TranslationCache()
+            except Exception as cache_error:
+                print(f"Warning: Translation cache unavailable ({cache_error}). Translations will only be cached in memory.")
+        # In-memory LRU in front of the disk cache; concurrent requests for the same text share one call
+        self.memory_cache = TTLCache(ttl=float("inf"), max_entries=TRANSLATION_MEMORY_CACHE_ENTRIES, name="translation-cache")
+        self.chunk_chars = chunk_chars or TRANSLATION_CHUNK_CHARS
+        self._translator_factory = translator_factory
+        # Translators keep per-request state, so each thread reuses its own instance per language pair
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency or TRANSLATION_MAX_CONCURRENCY,
+                                            thread_name_prefix="translate")
     
     def detect_language(self, text: str) -> str:
         """
@@ -60,9 +95,8 @@ class LanguageService:
         try:
             if source_lang == 'en':
                 return text
-                
-            translator = GoogleTranslator(source=source_lang, target='en')
-            return translator.translate(text)
+
+            return self.translate(text, source_lang, 'en')
         except Exception as e:
             print(f"Error translating to English: {e}")
             return text
@@ -72,13 +106,97 @@ class LanguageService:
         try:
             if target_lang == 'en':
                 return text
-                
-            translator = GoogleTranslator(source='en', target=target_lang)
-            return translator.translate(text)
+
+            return self.translate(text, 'en', target_lang)
         except Exception as e:
             print(f"Error translating from English: {e}")
             return text
 
+    def translate(self, text: str, source: str, target: str) -> str:
+        """
+        Translate text, keeping its line layout
+
+        Short single-line text is translated in one (cached) call. Longer text is split
+        into lines; indentation, bullets and blank lines are kept aside, and the line
+        contents are packed into chunks of up to `chunk_chars` characters that are
+        translated concurrently and put back in place. Raises on translator errors.
+        """
+        if not text or not text.strip():
+            return text
+        if "\n" not in text and len(text) <= self.chunk_chars:
+            return self._translate_cached(text, source, target)
+
+        prefixes, bodies = [], []
+        for line in text.split("\n"):
+            prefix = _LINE_PREFIX.match(line).group(0)
+            prefixes.append(prefix)
+            bodies.append(line[len(prefix):].rstrip())
+
+        # Pack consecutive non-empty lines into chunks
+        chunks, chunk, chunk_size = [], [], 0
+        for index, body in enumerate(bodies):
+            if not body:
+                continue
+            if chunk and chunk_size + len(body) + 1 > self.chunk_chars:
+                chunks.append(chunk)
+                chunk, chunk_size = [], 0
+            chunk.append(index)
+            chunk_size += len(body) + 1
+        if chunk:
+            chunks.append(chunk)
+
+        def translate_chunk(indices):
+            return self._translate_lines([bodies[index] for index in indices], source, target)
+
+        if len(chunks) == 1:
+            results = [translate_chunk(chunks[0])]
+        else:
+            results = list(self._executor.map(translate_chunk, chunks))
+
+        translated = list(bodies)
+        for indices, lines in zip(chunks, results):
+            for index, line in zip(indices, lines):
+                translated[index] = line
+        return "\n".join(prefix + body for prefix, body in zip(prefixes, translated))
+
+    def translation_stats(self) -> Dict[str, Dict]:
+        """Hit rates of the in-memory and on-disk translation caches"""
+        return {
+            "memory": self.memory_cache.stats(),
+            "disk": self.cache.stats() if self.cache is not None else None
+        }
+
+    def _translate_lines(self, lines: List[str], source: str, target: str) -> List[str]:
+        """Translates lines in one request, or one by one if the translator merged or split lines"""
+        translated = self._translate_cached("\n".join(lines), source, target).split("\n")
+        if len(translated) == len(lines):
+            return [line.strip() for line in translated]
+        return [self._translate_cached(line, source, target).strip() for line in lines]
+
+    def _translate_cached(self, text: str, source: str, target: str) -> str:
+        key = TranslationCache.make_key(source, target, text)
+        return self.memory_cache.get_or_load(key, lambda: self._load_translation(key, text, source, target))
+
+    def _load_translation(self, key: str, text: str, source: str, target: str) -> str:
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        translated = self._translator(source, target).translate(text)
+        if translated is None:
+            raise ValueError("Translator returned no text")
+        if self.cache is not None:
+            self.cache.put(key, translated)
+        return translated
+
+    def _translator(self, source: str, target: str):
+        translators = getattr(self._local, "translators", None)
+        if translators is None:
+            translators = self._local.translators = {}
+        if (source, target) not in translators:
+            translators[(source, target)] = self._translator_factory(source=source, target=target)
+        return translators[(source, target)]
+
     def get_supported_languages(self) -> Dict[str, str]:
         """Return dictionary of supported languages"""
         return self.supported_languages
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Helpers for streaming LLM answers to the browser as Server-Sent Events
+
+The chat and search endpoints normally post-process the complete completion
+(markdown removal, sentiment trailer, paragraph formatting). The classes here
+apply the same clean-up incrementally, so text can be forwarded as tokens
+arrive instead of after generation finishes.
+"""
+import json
+import re
+
+# Inline markdown removed from chat answers
+_INLINE_RULES = [
+    (re.compile(r'\*\*(.*?)\*\*'), r'\1'),      # Bold (**text**)
+    (re.compile(r'[_*]([^*_]+?)[_*]'), r'\1'),  # Italics (*text* or _text_)
+    (re.compile(r'`(.*?)`'), r'\1'),            # Inline code (`text`)
+]
+_LIST_MARKER = re.compile(r'^\s*[\*\-]\s+')
+_MARKER_CHARS = "*_`"
+
+def strip_markdown_line(line):
+    """Cleans one line: a leading list marker (* or -) becomes '- ', then inline markers are removed"""
+    marker = _LIST_MARKER.match(line)
+    prefix, body = ("- ", line[marker.end():]) if marker else ("", line)
+    for pattern, replacement in _INLINE_RULES:
+        body = pattern.sub(replacement, body)
+    return prefix + body
+
+def strip_markdown(text):
+    """
+    Removes bold, italics and inline code markers and standardises list markers to '-'
+
+    Works line by line (list markers first) so a streamed answer cleans to exactly
+    the same text as the complete one.
+    """
+    return "\n".join(strip_markdown_line(line) for line in text.split("\n"))
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def wants_event_stream(data, accept_header):
+    """Whether a request opted into streaming ("stream": true, or Accept: text/event-stream)"""
+    return bool((data or {}).get('stream')) or 'text/event-stream' in (accept_header or '')
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _safe_cut(line):
+    """Longest prefix of an unfinished line, ending after whitespace, whose markdown markers are all paired"""
+    body_start = 0
+    marker = _LIST_MARKER.match(line)
+    if marker:
+        body_start = marker.end()
+    elif line.strip() in ("*", "-"):
+        return 0  # Could still become a list marker
+    counts = dict.fromkeys(("**",) + tuple(_MARKER_CHARS), 0)
+    cut = 0
+    position = body_start
+    while position < len(line):
+        marker = "**" if line.startswith("**", position) else line[position]
+        if marker in counts:
+            counts[marker] += 1
+        elif marker.isspace() and all(count % 2 == 0 for count in counts.values()):
+            cut = position + 1
+        position += len(marker)
+    return max(cut, body_start)
+
+class MarkdownStreamCleaner:
+    """
+    Strips markdown from a chat answer while it streams
+
+    feed() returns the cleaned text that is safe to show so far: a line is only
+    released up to the last point where its markers are balanced, and a line
+    starting with the trailer prefix ("Sentiment: ...") is held back until it is
+    clear it was not the last line. Leading and trailing blank lines are dropped,
+    like str.strip() on the full answer. The raw output is kept in `raw_text`.
+    """
+
+    def __init__(self, trailer_prefix="sentiment:"):
+        self.raw_text = ""
+        self._trailer_prefix = trailer_prefix
+        self._line = ""             # Raw text of the unfinished line
+        self._line_emitted = ""     # Cleaned text already released for that line
+        self._pending_newlines = 0  # Newlines held until more content follows
+        self._held_line = None      # Finished trailer-like line that may be the last one
+        self._held_newlines = 0     # Blank lines seen after the held line
+        self._started = False
+
+    def feed(self, text):
+        """Adds streamed text; returns the cleaned text that can be shown now"""
+        self.raw_text += text
+        output = []
+        pieces = text.split("\n")
+        for index, piece in enumerate(pieces):
+            self._line += piece
+            if index < len(pieces) - 1:
+                output.append(self._finish_line())
+        output.append(self._emit_line(final=False))
+        return "".join(output)
+
+    def finish(self):
+        """Returns any remaining cleaned text; a trailing trailer line is left out"""
+        if self._line.strip() and not self._is_trailer(self._line):
+            output = self._emit_line(final=True)
+        else:
+            output = ""
+        self._line, self._line_emitted = "", ""
+        return output
+
+    def _is_trailer(self, line):
+        return not self._line_emitted and line.strip().lower().startswith(self._trailer_prefix)
+
+    def _finish_line(self):
+        line = self._line
+        if self._is_trailer(line):
+            output = self._release_held()
+            self._held_line = line
+            self._line, self._line_emitted = "", ""
+            return output
+        output = self._emit_line(final=True) if line.strip() else ""
+        had_content = bool(self._line_emitted.strip())
+        self._line, self._line_emitted = "", ""
+        if self._held_line is not None and not had_content:
+            self._held_newlines += 1
+        elif self._started:
+            self._pending_newlines += 1
+        return output
+
+    def _emit_line(self, final):
+        line = self._line
+        if not final:
+            start = line.lstrip().lower()
+            if not self._line_emitted and (self._trailer_prefix.startswith(start) or start.startswith(self._trailer_prefix)):
+                return ""  # Might be the trailer line
+            line = line[:_safe_cut(line)]
+        cleaned = strip_markdown_line(line)
+        if not final:
+            cleaned = cleaned.rstrip()
+        if not cleaned.startswith(self._line_emitted):
+            return ""  # Marker pairing changed; the rest is released when the line ends
+        new_text = cleaned[len(self._line_emitted):]
+        line_start = not self._line_emitted
+        if not new_text or (line_start and not new_text.strip()):
+            return ""
+        self._line_emitted = cleaned
+        return self._write(new_text, line_start)
+
+    def _release_held(self):
+        if self._held_line is None:
+            return ""
+        held, self._held_line = strip_markdown_line(self._held_line), None
+        output = self._prefix() + held
+        self._pending_newlines = 1 + self._held_newlines
+        self._held_newlines = 0
+        return output
+
+    def _prefix(self):
+        prefix = "\n" * self._pending_newlines if self._started else ""
+        self._pending_newlines = 0
+        self._started = True
+        return prefix
+
+    def _write(self, text, line_start):
+        output = self._release_held()
+        if line_start:
+            output += self._prefix()
+        return output + text
+
+class ParagraphStreamer:
+    """
+    Formats streamed text one paragraph (blank-line separated block) at a time
+
+    feed() and finish() return the paragraphs completed so far, each passed
+    through `format_paragraph`; empty results are skipped.
+    """
+
+    def __init__(self, format_paragraph):
+        self.format_paragraph = format_paragraph
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        paragraphs = self._buffer.split("\n\n")
+        self._buffer = paragraphs.pop()
+        return self._format(paragraphs)
+
+    def finish(self):
+        paragraphs, self._buffer = [self._buffer], ""
+        return self._format(paragraphs)
+
+    def _format(self, paragraphs):
+        formatted = [self.format_paragraph(paragraph) for paragraph in paragraphs if paragraph.strip()]
+        return [paragraph for paragraph in formatted if paragraph]
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# SQLite limits the number of bound parameters per statement
+_MAX_KEYS_PER_QUERY = 500
+
+def content_key(*parts):
+    """Returns a sha256 content address for the given request parts."""
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+class SQLiteLRUCache:
+    """On-disk key/value cache in one SQLite table with LRU eviction.
+
+    Shared by the embedding and translation caches; subclasses pick the table and value
+    column and convert values with _encode()/_decode() (stored as-is by default).
+    """
+
+    def __init__(self, path, max_entries, table, value_column, value_type, name):
+        """Opens (or creates) the SQLite cache file.
+
+        Args:
+            path: Cache file path.
+            max_entries: Entry count above which the least recently used entries are evicted.
+            table: Table holding the entries (key, value_column, last_used).
+            value_column: Name of the value column.
+            value_type: SQLite type of the value column ("BLOB" or "TEXT").
+            name: Cache name used in log messages.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._table = table
+        self._value_column = value_column
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; WAL lets several worker processes read while one writes
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                {value_column} {value_type} NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_last_used ON {table}(last_used)")
+        self._entries = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, stored):
+        return stored
+
+    def get(self, key):
+        """Returns the cached value for `key`, or None on a miss."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Returns {key: value} for every cached key and refreshes their LRU position."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _MAX_KEYS_PER_QUERY):
+                chunk = keys[start:start + _MAX_KEYS_PER_QUERY]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, {self._value_column} FROM {self._table} WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, stored in rows:
+                    found[key] = self._decode(stored)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    f"UPDATE {self._table} SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, value):
+        """Stores one value."""
+        self.put_many({key: value})
+
+    def put_many(self, items):
+        """Stores {key: value} pairs and evicts least recently used entries if over capacity."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, self._encode(value), now) for key, value in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO {self._table} (key, {self._value_column}, last_used) VALUES (?, ?, ?)", rows
+                )
+                self._entries += self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """Deletes the least recently used entries down to 90% of max_entries."""
+        target = int(self.max_entries * 0.9)
+        self._conn.execute(
+            f"""
+            DELETE FROM {self._table} WHERE key IN (
+                SELECT key FROM {self._table} ORDER BY last_used ASC LIMIT ?
+            )
+            """,
+            (self._entries - target,)
+        )
+        self._entries = self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+        print(f"{self.name} evicted entries down to {self._entries} (max {self.max_entries}).")
+
+    def stats(self):
+        """Returns hit/miss counters and the current entry count."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": self._entries,
+                "max_entries": self.max_entries
+            }
+
+    def close(self):
+        """Closes the SQLite connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,20 @@
+from src.config.config import TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_MAX_ENTRIES
+from src.utils.sqlite_lru_cache import SQLiteLRUCache, content_key
+
+class TranslationCache(SQLiteLRUCache):
+    """On-disk translation cache keyed by sha256(source, target, text) with LRU eviction."""
+
+    def __init__(self, path=None, max_entries=None):
+        """Opens (or creates) the SQLite cache file.
+
+        Args:
+            path: Cache file path (defaults to TRANSLATION_CACHE_PATH).
+            max_entries: Entry count above which the least recently used entries are evicted.
+        """
+        super().__init__(path or TRANSLATION_CACHE_PATH, max_entries or TRANSLATION_CACHE_MAX_ENTRIES,
+                         table="translations", value_column="translated", value_type="TEXT", name="Translation cache")
+
+    @staticmethod
+    def make_key(source, target, text):
+        """Returns the content address for one translation request."""
+        return content_key(source, target, text)
@@ -0,0 +1,138 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(text):
+    """Cache key form of a free-text query: NFKC, lower case, single spaces, no trailing punctuation."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?.!¿¡। ").strip()
+
+class TTLCache:
+    """In-memory LRU cache whose entries expire after a TTL, with stale-while-revalidate.
+
+    An entry is fresh for `ttl` seconds and then stale for another `stale_ttl` seconds.
+    A stale entry is still returned immediately while one background thread reloads it;
+    after that it is treated as missing. Concurrent misses for the same key share one load.
+    """
+
+    def __init__(self, ttl, max_entries, stale_ttl=0, name="cache", clock=time.monotonic):
+        """
+        Args:
+            ttl: Seconds an entry is served without reloading.
+            max_entries: Entry count above which the least recently used entries are evicted.
+            stale_ttl: Extra seconds an expired entry may be served while it is refreshed.
+            name: Used in log messages and refresh thread names.
+            clock: Time source (seconds); injectable for tests.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._loading = {}             # key -> Event set when the in-flight load finishes
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ("hits", "stale_hits", "misses", "refreshes", "refresh_failures", "evictions"), 0
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for `key`, calling `loader()` on a miss.
+
+        Exceptions from `loader` propagate on a miss and nothing is cached.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    value, stored_at = entry
+                    age = self._clock() - stored_at
+                    if age < self.ttl:
+                        self._entries.move_to_end(key)
+                        self._counters["hits"] += 1
+                        return value
+                    if age < self.ttl + self.stale_ttl:
+                        self._entries.move_to_end(key)
+                        self._counters["stale_hits"] += 1
+                        if key not in self._refreshing:
+                            self._refreshing.add(key)
+                            threading.Thread(target=self._refresh, args=(key, loader),
+                                             name=f"{self.name}-refresh", daemon=True).start()
+                        return value
+                    del self._entries[key]
+
+                in_flight = self._loading.get(key)
+                if in_flight is None:
+                    self._loading[key] = threading.Event()
+                    self._counters["misses"] += 1
+                    break
+            # Another caller is loading this key; use its result (or retry if it failed)
+            in_flight.wait()
+
+        try:
+            value = loader()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def get(self, key):
+        """Returns the fresh cached value for `key`, or None (for callers that load it themselves)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        """Stores `value` as fresh, evicting the least recently used entries over the limit."""
+        with self._lock:
+            self._entries[key] = (value, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, key=None):
+        """Drops one key, or every entry when `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Counters plus current size and hit rate (fresh and stale hits over all lookups)."""
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries), max_entries=self.max_entries)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _refresh(self, key, loader):
+        try:
+            self.put(key, loader())
+            with self._lock:
+                self._counters["refreshes"] += 1
+        except Exception as e:
+            # Keep serving the stale value until it ages out
+            logger.warning(f"{self.name}: background refresh of {key!r} failed: {e}")
+            with self._lock:
+                self._counters["refresh_failures"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
@@ -0,0 +1,147 @@
+import functools
+import math
+import re
+import faiss
+import numpy as np
+from src.config.config import (
+    FAISS_ANN_MIN_TRAIN_VECTORS,
+    FAISS_IVF_REBUILD_GROWTH,
+    FAISS_IVF_NPROBE,
+    FAISS_HNSW_EF_SEARCH
+)
+
+# Exact brute-force search; also used while an ANN index has too few vectors to train
+FLAT_SPEC = "Flat"
+
+# Rows handed to FAISS per add/search call when streaming from the raw vector sidecar
+_ADD_CHUNK_ROWS = 65536
+# Upper bound on the sample used to train IVF / PQ quantizers
+_MAX_TRAINING_VECTORS = 262144
+
+def choose_nlist(num_vectors):
+    """Picks an IVF list count of ~4*sqrt(n), keeping at least 39 training points per list."""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39, 65536))
+
+def resolve_index_spec(spec, dim, num_vectors):
+    """Returns the concrete faiss.index_factory string to use for `num_vectors` vectors.
+
+    `spec` may contain an "{nlist}" placeholder (e.g. "IVF{nlist},PQ48") that is sized
+    from the vector count. Specs that need training fall back to FLAT_SPEC until enough
+    vectors exist to train them.
+    """
+    concrete = spec.replace("{nlist}", str(choose_nlist(num_vectors)))
+    if concrete == FLAT_SPEC or not needs_training(concrete, dim):
+        return concrete
+    if num_vectors < min_training_vectors(concrete):
+        return FLAT_SPEC
+    return concrete
+
+@functools.lru_cache(maxsize=64)
+def needs_training(spec, dim):
+    """True if an index built from `spec` must be trained before vectors can be added."""
+    return not faiss.index_factory(dim, spec).is_trained
+
+def min_training_vectors(spec):
+    """Number of vectors required before `spec` is trained."""
+    return max(FAISS_ANN_MIN_TRAIN_VECTORS, 39 * _ivf_nlist(spec))
+
+def should_rebuild(active_spec, target_spec):
+    """True if the active index should be replaced by one built from `target_spec`.
+
+    IVF indexes are only rebuilt once the ideal list count has grown by
+    FAISS_IVF_REBUILD_GROWTH, so steady growth does not cause constant retraining.
+    """
+    if active_spec == target_spec:
+        return False
+    active_nlist, target_nlist = _ivf_nlist(active_spec), _ivf_nlist(target_spec)
+    if active_nlist and target_nlist and _strip_nlist(active_spec) == _strip_nlist(target_spec):
+        return target_nlist >= active_nlist * FAISS_IVF_REBUILD_GROWTH
+    return True
+
+def build_index(spec, vectors, ids, rows=None):
+    """Builds, trains (if needed) and fills an index from `spec` with `vectors` labelled by `ids`.
+
+    `rows` optionally selects the rows of the (memory-mapped) `vectors` / `ids` to index;
+    they are added in chunks so the selection is never copied into memory at once.
+    Specs without native id support are wrapped in IndexIDMap2.
+    """
+    rows = np.arange(len(ids)) if rows is None else np.asarray(rows)
+    index = faiss.index_factory(vectors.shape[1], with_ids(spec))
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, size=min(len(rows), _MAX_TRAINING_VECTORS), replace=False))
+        index.train(np.ascontiguousarray(vectors[sample], dtype='float32'))
+    for start in range(0, len(rows), _ADD_CHUNK_ROWS):
+        chunk = rows[start:start + _ADD_CHUNK_ROWS]
+        index.add_with_ids(np.ascontiguousarray(vectors[chunk], dtype='float32'),
+                           np.ascontiguousarray(ids[chunk], dtype='int64'))
+    configure_search(index)
+    return index
+
+def with_ids(spec):
+    """Returns the factory string for `spec` with support for add_with_ids / remove_ids.
+
+    IVF indexes carry ids natively; everything else is wrapped in IndexIDMap2.
+    """
+    return spec if "IVF" in spec else "IDMap2," + spec
+
+def configure_search(index):
+    """Applies the configured nprobe / efSearch to whichever of them the index has."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", FAISS_IVF_NPROBE), ("efSearch", FAISS_HNSW_EF_SEARCH)):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # Parameter does not apply to this index type
+
+def search_parameters(index, selector):
+    """SearchParameters restricting a search of `index` to `selector`.
+
+    FAISS requires the parameter class matching the (wrapped) index type, so this also
+    carries the configured nprobe / efSearch, which would otherwise fall back to defaults.
+    """
+    base = index
+    if isinstance(base, faiss.IndexIDMap):
+        base = faiss.downcast_index(base.index)
+    if isinstance(base, faiss.IndexPreTransform):
+        base = faiss.downcast_index(base.index)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=FAISS_IVF_NPROBE)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=FAISS_HNSW_EF_SEARCH)
+    return faiss.SearchParameters(sel=selector)
+
+def measure_recall(index, vectors, ids, rows=None, k=10, num_queries=100, seed=0):
+    """Recall@k of `index` against exact L2 search over the indexed rows of `vectors`.
+
+    Queries are sampled from the indexed vectors themselves; `rows` selects the
+    indexed rows as in build_index.
+    """
+    rows = np.arange(len(ids)) if rows is None else np.asarray(rows)
+    total = len(rows)
+    if total == 0:
+        return None
+    k = min(k, total)
+    rng = np.random.default_rng(seed)
+    query_rows = np.sort(rng.choice(rows, size=min(num_queries, total), replace=False))
+    queries = np.ascontiguousarray(vectors[query_rows], dtype='float32')
+
+    # Brute-force ground truth streamed over chunks of the (memory-mapped) rows, without building an index
+    heap = faiss.ResultHeap(len(queries), k)
+    for start in range(0, total, _ADD_CHUNK_ROWS):
+        chunk = rows[start:start + _ADD_CHUNK_ROWS]
+        distances, positions = faiss.knn(queries, np.ascontiguousarray(vectors[chunk], dtype='float32'), min(k, len(chunk)))
+        labels = np.where(positions >= 0, np.asarray(ids[chunk], dtype='int64')[positions], -1)
+        heap.add_result(np.ascontiguousarray(distances), np.ascontiguousarray(labels))
+    heap.finalize()
+    _, found = index.search(queries, k)
+
+    hits = sum(len(set(heap.I[i]) & set(found[i])) for i in range(len(queries)))
+    return hits / float(len(queries) * k)
+
+def _ivf_nlist(spec):
+    match = re.search(r"IVF(\d+)", spec)
+    return int(match.group(1)) if match else 0
+
+def _strip_nlist(spec):
+    return re.sub(r"IVF\d+", "IVF", spec)
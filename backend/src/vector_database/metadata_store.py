@@ -0,0 +1,289 @@
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# SQLite limits the number of bound parameters per statement
+_MAX_KEYS_PER_QUERY = 500
+
+# Metadata attributes stored in their own indexed columns, usable as search filters
+FILTERABLE_FIELDS = ("customer_id", "source", "document", "language", "outcome")
+
+def filter_values(metadata):
+    """Extracts the FILTERABLE_FIELDS values of one metadata dict.
+
+    PDF chunks written by the startup loader carry the file name as `source`; they are
+    normalised to source "pdf" with the file name as `document`, like uploaded PDFs.
+    Vectors with a customer_id and no source are conversation turns ("interaction").
+    """
+    source = metadata.get("source")
+    document = metadata.get("document") or metadata.get("filename")
+    if isinstance(source, str) and source.lower().endswith(".pdf"):
+        document = document or source
+        source = "pdf"
+    if source is None and metadata.get("customer_id") is not None:
+        source = "interaction"
+    values = {
+        "customer_id": metadata.get("customer_id"),
+        "source": source,
+        "document": document,
+        "language": metadata.get("language"),
+        "outcome": metadata.get("outcome")
+    }
+    return tuple(None if values[field] is None else str(values[field]) for field in FILTERABLE_FIELDS)
+
+class MetadataStore:
+    """SQLite (WAL) store for the vector id mapping, per-vector metadata and index state.
+
+    Rows are keyed by the int64 id the vector carries in FAISS, so a search only reads
+    the rows of its hits and nothing is loaded up front. Writes go into an open
+    transaction that the client commits at the end of each write call, so no write
+    lock is held between calls; int ids come from a counter in the state table shared
+    by every process.
+    """
+
+    def __init__(self, path):
+        """Opens (or creates) the SQLite metadata file at `path`."""
+        self.path = path
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode with explicit transactions; WAL lets other workers read while one writes
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                int_id INTEGER PRIMARY KEY,
+                vector_id TEXT NOT NULL UNIQUE,
+                metadata TEXT NOT NULL
+            )
+        """)
+        self._add_filter_columns()
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+
+    def _add_filter_columns(self):
+        """Adds and indexes the FILTERABLE_FIELDS columns, backfilling stores created without them.
+
+        Each column index acts as an inverted list from attribute value to int ids.
+        """
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(vectors)")}
+        missing = [field for field in FILTERABLE_FIELDS if field not in existing]
+        if missing:
+            self._conn.execute("BEGIN")
+            for field in missing:
+                self._conn.execute(f"ALTER TABLE vectors ADD COLUMN {field} TEXT")
+            rows = self._conn.execute("SELECT int_id, metadata FROM vectors").fetchall()
+            assignments = ", ".join(f"{field} = ?" for field in FILTERABLE_FIELDS)
+            self._conn.executemany(
+                f"UPDATE vectors SET {assignments} WHERE int_id = ?",
+                [filter_values(json.loads(metadata)) + (int_id,) for int_id, metadata in rows]
+            )
+            self._conn.execute("COMMIT")
+        for field in FILTERABLE_FIELDS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_vectors_{field} ON vectors({field})")
+
+    def _begin(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def commit(self):
+        """Makes all writes since the last commit durable and visible to other processes."""
+        with self._lock:
+            if self._conn.in_transaction:
+                self._conn.execute("COMMIT")
+
+    def rollback(self):
+        """Discards all writes since the last commit."""
+        with self._lock:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+
+    def get_state(self):
+        """Returns the stored index state as a dict (empty for a new store)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM state").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_state(self, **values):
+        """Stores index state values (next id, index spec, sidecar row count)."""
+        with self._lock:
+            self._begin()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in values.items()]
+            )
+
+    def allocate_int_ids(self, count):
+        """Reserves `count` new consecutive int ids from the shared counter; returns the first.
+
+        The counter moves in the caller's write transaction, so ids are never handed out twice.
+        """
+        with self._lock:
+            self._begin()
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'next_int_id'").fetchone()
+            first = json.loads(row[0]) if row else 0
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('next_int_id', ?)", (json.dumps(first + count),)
+            )
+        return first
+
+    def data_version(self):
+        """A number that changes whenever another connection (process) commits to the store."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def count(self):
+        """Number of stored vectors."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def insert(self, int_ids, vector_ids, metadatas):
+        """Appends rows; callers delete any previous row of a vector_id first."""
+        rows = [(int(int_id), vector_id, json.dumps(metadata or {}, default=str)) + filter_values(metadata or {})
+                for int_id, vector_id, metadata in zip(int_ids, vector_ids, metadatas)]
+        columns = ", ".join(FILTERABLE_FIELDS)
+        placeholders = ", ".join("?" * len(FILTERABLE_FIELDS))
+        with self._lock:
+            self._begin()
+            self._conn.executemany(
+                f"INSERT INTO vectors (int_id, vector_id, metadata, {columns}) VALUES (?, ?, ?, {placeholders})", rows
+            )
+
+    def delete(self, int_ids):
+        """Deletes rows by int id."""
+        with self._lock:
+            self._begin()
+            self._conn.executemany("DELETE FROM vectors WHERE int_id = ?", [(int(int_id),) for int_id in int_ids])
+
+    def lookup(self, vector_ids):
+        """Returns {vector_id: int_id} for the given string IDs that are stored."""
+        found = {}
+        vector_ids = list(vector_ids)
+        with self._lock:
+            for start in range(0, len(vector_ids), _MAX_KEYS_PER_QUERY):
+                chunk = vector_ids[start:start + _MAX_KEYS_PER_QUERY]
+                placeholders = ", ".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT vector_id, int_id FROM vectors WHERE vector_id IN ({placeholders})", chunk
+                ).fetchall())
+        return found
+
+    def fetch(self, int_ids):
+        """Returns {int_id: (vector_id, metadata)} for the given int ids that are stored."""
+        found = {}
+        int_ids = [int(int_id) for int_id in int_ids]
+        with self._lock:
+            for start in range(0, len(int_ids), _MAX_KEYS_PER_QUERY):
+                chunk = int_ids[start:start + _MAX_KEYS_PER_QUERY]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT int_id, vector_id, metadata FROM vectors WHERE int_id IN ({placeholders})", chunk
+                ).fetchall()
+                for int_id, vector_id, metadata in rows:
+                    found[int_id] = (vector_id, json.loads(metadata))
+        return found
+
+    def get_metadata(self, vector_id):
+        """Returns the metadata dict of `vector_id`, or None if it is not stored."""
+        with self._lock:
+            row = self._conn.execute("SELECT metadata FROM vectors WHERE vector_id = ?", (vector_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def present_int_ids(self, int_ids):
+        """The given int ids that are stored, as a sorted int64 array."""
+        found = []
+        int_ids = [int(int_id) for int_id in int_ids]
+        with self._lock:
+            for start in range(0, len(int_ids), _MAX_KEYS_PER_QUERY):
+                chunk = int_ids[start:start + _MAX_KEYS_PER_QUERY]
+                placeholders = ", ".join("?" * len(chunk))
+                found.extend(row[0] for row in self._conn.execute(
+                    f"SELECT int_id FROM vectors WHERE int_id IN ({placeholders})", chunk
+                ))
+        return np.sort(np.asarray(found, dtype='int64'))
+
+    def live_int_ids(self):
+        """All stored int ids as a sorted int64 array."""
+        with self._lock:
+            rows = self._conn.execute("SELECT int_id FROM vectors ORDER BY int_id").fetchall()
+        return np.fromiter((row[0] for row in rows), dtype='int64', count=len(rows))
+
+    def matching_int_ids(self, filters, limit=None):
+        """Int ids of vectors matching every FILTERABLE_FIELDS condition in `filters`.
+
+        A condition value may be a single value or a list of accepted values. Returns a
+        sorted int64 array; with `limit`, only the newest `limit` matches are returned.
+        """
+        clauses, params = self._filter_clauses(filters)
+        query = f"SELECT int_id FROM vectors WHERE {clauses} ORDER BY int_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return np.sort(np.fromiter((row[0] for row in rows), dtype='int64', count=len(rows)))
+
+    def count_matching(self, filters):
+        """Number of vectors matching every FILTERABLE_FIELDS condition in `filters`."""
+        clauses, params = self._filter_clauses(filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM vectors WHERE {clauses}", params).fetchone()[0]
+
+    def _filter_clauses(self, filters):
+        clauses, params = [], []
+        for field, value in filters.items():
+            if field not in FILTERABLE_FIELDS:
+                raise ValueError(f"Cannot filter on '{field}'; filterable fields are {', '.join(FILTERABLE_FIELDS)}")
+            if isinstance(value, (list, tuple, set)):
+                values = [str(item) for item in value]
+                clauses.append(f"{field} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+            else:
+                clauses.append(f"{field} = ?")
+                params.append(str(value))
+        return " AND ".join(clauses) or "1", params
+
+    def find(self, expected):
+        """Returns the vector_ids whose metadata has all key/value pairs in `expected`."""
+        clauses = " AND ".join("json_extract(metadata, ?) = ?" for _ in expected) or "1"
+        params = []
+        for key, value in expected.items():
+            params.extend([f'$."{key}"', value])
+        with self._lock:
+            rows = self._conn.execute(f"SELECT vector_id FROM vectors WHERE {clauses}", params).fetchall()
+        return [row[0] for row in rows]
+
+    def iter_metadata(self, page_size=1000):
+        """Yields (vector_id, metadata) for every stored vector, reading one page at a time."""
+        last_int_id = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT int_id, vector_id, metadata FROM vectors WHERE int_id > ? ORDER BY int_id LIMIT ?",
+                    (last_int_id, page_size)
+                ).fetchall()
+            for last_int_id, vector_id, metadata in rows:
+                yield vector_id, json.loads(metadata)
+            if len(rows) < page_size:
+                return
+
+    def clear(self):
+        """Deletes every row and the index state."""
+        with self._lock:
+            self._begin()
+            self._conn.execute("DELETE FROM vectors")
+            self._conn.execute("DELETE FROM state")
+
+    def close(self):
+        """Closes the SQLite connection, discarding uncommitted writes."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,120 @@
+import os
+import numpy as np
+
+# Rows copied per step when compacting, to bound memory use
+_COMPACT_CHUNK_ROWS = 65536
+
+class RawVectorStore:
+    """Append-only float32 sidecar holding the exact vectors behind a FAISS index.
+
+    Compressed or graph indexes (IVF, PQ, HNSW) cannot always give their input vectors
+    back, so the raw rows are kept here, memory-mapped, for training, background
+    rebuilds and exact-search recall checks. Each row is tagged with its int64 vector
+    id in a parallel `.vids` file; rows of deleted or replaced ids stay until compact().
+    """
+
+    def __init__(self, path, dim):
+        self.path = path
+        self.ids_path = os.path.splitext(path)[0] + ".vids"
+        self.dim = dim
+        self._row_bytes = dim * np.dtype('float32').itemsize
+        self._pending_ids = []
+        self._pending = []
+        self._flushed_count = 0
+        self.reload()
+
+    def reload(self, count=None):
+        """Re-reads the row count from disk, up to `count` rows if given, and drops unflushed rows."""
+        self._pending_ids = []
+        self._pending = []
+        try:
+            vector_rows = os.path.getsize(self.path) // self._row_bytes
+            id_rows = os.path.getsize(self.ids_path) // np.dtype('int64').itemsize
+            self._flushed_count = min(vector_rows, id_rows)
+        except OSError:
+            self._flushed_count = 0
+        if count is not None:
+            self._flushed_count = min(self._flushed_count, count)
+
+    @property
+    def count(self):
+        return self._flushed_count + sum(len(block) for block in self._pending_ids)
+
+    def append(self, ids, matrix):
+        """Buffers rows in memory; they reach disk on flush()."""
+        ids = np.asarray(ids, dtype='int64').reshape(-1)
+        matrix = np.asarray(matrix, dtype='float32').reshape(-1, self.dim)
+        if len(ids):
+            self._pending_ids.append(ids.copy())
+            self._pending.append(matrix.copy())
+
+    def flush(self):
+        """Appends buffered rows to the sidecar files."""
+        if not self._pending:
+            return
+        with open(self.path, 'ab') as vectors_file, open(self.ids_path, 'ab') as ids_file:
+            for ids, block in zip(self._pending_ids, self._pending):
+                vectors_file.write(np.ascontiguousarray(block).tobytes())
+                ids_file.write(ids.tobytes())
+        self._flushed_count = self.count
+        self._pending_ids = []
+        self._pending = []
+
+    def read(self, stop=None):
+        """Returns (ids, vectors) for rows [0, stop); flushed rows are memory-mapped, not loaded."""
+        stop = self.count if stop is None else stop
+        if stop == 0:
+            return np.empty(0, dtype='int64'), np.empty((0, self.dim), dtype='float32')
+        if stop > self._flushed_count:
+            self.flush()
+        ids = np.memmap(self.ids_path, dtype='int64', mode='r', shape=(stop,))
+        vectors = np.memmap(self.path, dtype='float32', mode='r', shape=(stop, self.dim))
+        return ids, vectors
+
+    def truncate(self, count):
+        """Drops rows past `count`, e.g. rows flushed here but never saved with the index.
+
+        Also realigns the two files if a crash left one of them longer than the other.
+        """
+        self.flush()
+        count = min(count, self._flushed_count)
+        for path, row_bytes in ((self.path, self._row_bytes), (self.ids_path, np.dtype('int64').itemsize)):
+            if os.path.exists(path) and os.path.getsize(path) > count * row_bytes:
+                with open(path, 'r+b') as f:
+                    f.truncate(count * row_bytes)
+        self._flushed_count = count
+
+    def rewrite(self, ids, matrix):
+        """Atomically replaces the whole sidecar with the given rows."""
+        ids = np.ascontiguousarray(np.asarray(ids, dtype='int64').reshape(-1))
+        matrix = np.ascontiguousarray(np.asarray(matrix, dtype='float32').reshape(-1, self.dim))
+        with open(self.path + ".tmp", 'wb') as f:
+            f.write(matrix.tobytes())
+        with open(self.ids_path + ".tmp", 'wb') as f:
+            f.write(ids.tobytes())
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(self.ids_path + ".tmp", self.ids_path)
+        self._pending_ids = []
+        self._pending = []
+        self._flushed_count = len(ids)
+
+    def compact(self, live_ids):
+        """Rewrites the sidecar keeping only rows whose id is in `live_ids`; returns the row count.
+
+        Kept rows are written in ascending id order, which rows appended by several
+        processes may not be in.
+        """
+        ids, vectors = self.read()
+        keep = np.isin(ids, np.asarray(live_ids, dtype='int64'))
+        rows = np.flatnonzero(keep)
+        rows = rows[np.argsort(ids[rows], kind='stable')]
+        with open(self.path + ".tmp", 'wb') as vectors_file, open(self.ids_path + ".tmp", 'wb') as ids_file:
+            for start in range(0, len(rows), _COMPACT_CHUNK_ROWS):
+                chunk = rows[start:start + _COMPACT_CHUNK_ROWS]
+                vectors_file.write(np.ascontiguousarray(vectors[chunk]).tobytes())
+                ids_file.write(np.ascontiguousarray(ids[chunk]).tobytes())
+        del ids, vectors  # Release the memory maps before replacing the files
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(self.ids_path + ".tmp", self.ids_path)
+        self._flushed_count = len(rows)
+        return len(rows)
@@ -0,0 +1,213 @@
+import glob
+import heapq
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.config.config import FAISS_INDEX_PATH, FAISS_INTERACTION_SHARDS
+from src.vector_database.vector_db_client import VectorDBClient
+
+class ShardedVectorDBClient:
+    """Spreads vectors over several VectorDBClients and searches them in parallel.
+
+    Vectors without a customer_id (PDF chunks and other documents) go to the documents
+    shard, stored at `index_file` itself, which also keeps everything written before
+    sharding was enabled. Conversation turns go to one of `num_shards` interaction
+    shards picked by a stable hash of customer_id. Each shard has its own files, lock
+    and background rebuilds; searches fan out over a thread pool (FAISS releases the
+    GIL) and the per-shard top-k lists are merged with a heap.
+
+    Exposes the same read/write methods as VectorDBClient.
+    """
+
+    def __init__(self, index_file=None, num_shards=None, **client_kwargs):
+        """Opens (or creates) the documents shard and `num_shards` interaction shards.
+
+        Args:
+            index_file: Path of the documents shard; interaction shard files are named
+                        after it (defaults to FAISS_INDEX_PATH).
+            num_shards: Number of interaction shards (defaults to FAISS_INTERACTION_SHARDS).
+                        Changing it re-partitions customers, so existing interaction
+                        shards are not read under a different count.
+            client_kwargs: Passed to every shard's VectorDBClient.
+        """
+        self.index_file = index_file or FAISS_INDEX_PATH
+        self.num_shards = num_shards or FAISS_INTERACTION_SHARDS
+        if self.num_shards < 1:
+            raise ValueError("ShardedVectorDBClient needs at least one interaction shard")
+
+        root, extension = os.path.splitext(self.index_file)
+        shard_files = [f"{root}.interactions-{shard}-of-{self.num_shards}{extension}" for shard in range(self.num_shards)]
+        stale_files = set(glob.glob(f"{glob.escape(root)}.interactions-*-of-*{extension}")) - set(shard_files)
+        if stale_files:
+            print(f"Warning: Ignoring interaction shards from a different shard count: {sorted(stale_files)}")
+
+        self.documents = VectorDBClient(index_file=self.index_file, **client_kwargs)
+        self.interaction_shards = [VectorDBClient(index_file=path, **client_kwargs) for path in shard_files]
+        self.shards = [self.documents] + self.interaction_shards
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="faiss-shard")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def shard_for_customer(self, customer_id):
+        """The interaction shard holding `customer_id`'s vectors (stable across processes)."""
+        return self.interaction_shards[zlib.crc32(str(customer_id).encode("utf-8")) % self.num_shards]
+
+    def shard_for(self, metadata):
+        """The shard a vector with `metadata` is stored in."""
+        customer_id = (metadata or {}).get("customer_id")
+        return self.documents if customer_id is None else self.shard_for_customer(customer_id)
+
+    def _shards_for_filter(self, filter):
+        """Shards that can hold vectors matching `filter` (documents shard always included for older data)."""
+        customer_ids = (filter or {}).get("customer_id")
+        if customer_ids is None:
+            return self.shards
+        if not isinstance(customer_ids, (list, tuple, set)):
+            customer_ids = [customer_ids]
+        selected = {id(self.documents): self.documents}
+        for customer_id in customer_ids:
+            shard = self.shard_for_customer(customer_id)
+            selected[id(shard)] = shard
+        return list(selected.values())
+
+    def _fan_out(self, call, shards=None):
+        """Runs call(shard) on every shard in parallel and returns the results in shard order."""
+        return list(self._executor.map(call, shards or self.shards))
+
+    def upsert_embedding(self, vector_id, embedding, metadata):
+        """Adds a vector to its shard, replacing any existing vector with the same ID."""
+        target = self.shard_for(metadata)
+        if not target.upsert_embedding(vector_id, embedding, metadata):
+            return False
+        # An ID whose customer changed moves shards; drop the copy left behind (a read on the others)
+        for shard in self.shards:
+            if shard is not target and vector_id in shard:
+                shard.delete([vector_id])
+        return True
+
+    def upsert_embeddings(self, vector_ids, embeddings, metadatas):
+        """Adds or replaces a block of vectors, writing the shards in parallel.
+
+        Returns the number of unique IDs written, or 0 if any shard failed. Shards that
+        succeeded keep their writes and copies on other shards are left in place, so the
+        store stays consistent and the call can be repeated (upserts replace by ID).
+        """
+        matrix = np.asarray(embeddings, dtype='float32')
+        if matrix.ndim != 2 or matrix.shape[0] != len(vector_ids) or len(metadatas) != len(vector_ids):
+            print(f"Error bulk adding embeddings to FAISS: Expected {len(vector_ids)} embeddings and metadata entries, got matrix {matrix.shape} and {len(metadatas)} metadata entries")
+            return 0
+        if not vector_ids:
+            return 0
+        rows_by_shard = {}
+        for row, metadata in enumerate(metadatas):
+            rows_by_shard.setdefault(id(self.shard_for(metadata)), []).append(row)
+        targets = [shard for shard in self.shards if id(shard) in rows_by_shard]
+
+        def upsert_shard(shard):
+            rows = rows_by_shard[id(shard)]
+            return shard.upsert_embeddings([vector_ids[row] for row in rows], matrix[rows], [metadatas[row] for row in rows])
+
+        written = self._fan_out(upsert_shard, targets)
+        failed = [shard.index_file for shard, count in zip(targets, written) if not count]
+        if failed:
+            print(f"Error bulk adding embeddings to FAISS: shard(s) {failed} failed; "
+                  f"{sum(written)} vectors were written to the other shards")
+            return 0
+
+        # IDs whose customer changed move shards: only shards that really hold a copy are written
+        owner = {vector_ids[row]: shard_key for shard_key, rows in rows_by_shard.items() for row in rows}
+        moved = {}
+        for shard in self.shards:
+            others = [vector_id for vector_id, shard_key in owner.items() if shard_key != id(shard)]
+            stale = shard.stored_ids(others) if others else set()
+            if stale:
+                moved[id(shard)] = list(stale)
+        if moved:
+            self._fan_out(lambda shard: shard.delete(moved[id(shard)]),
+                          [shard for shard in self.shards if id(shard) in moved])
+        return sum(written)
+
+    def delete(self, vector_ids):
+        """Removes vectors by string ID from whichever shard holds them. Returns the number removed."""
+        if isinstance(vector_ids, str):
+            vector_ids = [vector_ids]
+        return sum(self._fan_out(lambda shard: shard.delete(vector_ids)))
+
+    def delete_by_filter(self, predicate):
+        """Removes every vector whose metadata matches `predicate` (see VectorDBClient.delete_by_filter)."""
+        shards = self._shards_for_filter(predicate) if isinstance(predicate, dict) else self.shards
+        return sum(self._fan_out(lambda shard: shard.delete_by_filter(predicate), shards))
+
+    def list_by_filter(self, filter, limit=None):
+        """Returns [{'id', 'metadata'}] for vectors matching `filter`, newest first by metadata timestamp."""
+        per_shard = self._fan_out(lambda shard: shard.list_by_filter(filter, limit=limit), self._shards_for_filter(filter))
+        entries = [entry for shard_entries in per_shard for entry in shard_entries]
+        entries.sort(key=lambda entry: str(entry['metadata'].get('timestamp', '')), reverse=True)
+        return entries[:limit] if limit is not None else entries
+
+    def count_by_filter(self, filter):
+        """Number of vectors matching `filter` across the relevant shards."""
+        return sum(self._fan_out(lambda shard: shard.count_by_filter(filter), self._shards_for_filter(filter)))
+
+    def query_similar_embeddings(self, query_embedding, top_k=5, filter=None):
+        """Queries every relevant shard for similar embeddings (see VectorDBClient.query_similar_embeddings)."""
+        results = self.query_batch([query_embedding], top_k=top_k, filters=filter)
+        return results[0] if results is not None else None
+
+    def query_batch(self, query_embeddings, top_k=5, filters=None):
+        """Runs query_batch on the relevant shards in parallel and merges the top_k matches per query.
+
+        Returns a list with one {'matches': [...]} per query, or None if any shard failed.
+        """
+        queries = np.ascontiguousarray(query_embeddings, dtype='float32')
+        if filters is None or isinstance(filters, dict):
+            shards = self._shards_for_filter(filters)
+        else:
+            selected = {}
+            for query_filter in filters:
+                for shard in self._shards_for_filter(query_filter):
+                    selected[id(shard)] = shard
+            shards = list(selected.values())
+
+        per_shard = self._fan_out(lambda shard: shard.query_batch(queries, top_k=top_k, filters=filters), shards)
+        if any(results is None for results in per_shard):
+            return None
+        return [
+            {'matches': heapq.nsmallest(top_k, (match for results in per_shard for match in results[row]['matches']),
+                                        key=lambda match: match['score'])} # Lower score (distance) is better
+            for row in range(len(queries))
+        ]
+
+    def __contains__(self, vector_id):
+        return any(vector_id in shard for shard in self.shards)
+
+    def get_metadata(self, vector_id):
+        """Returns the metadata dict stored for `vector_id`, or None."""
+        for shard in self.shards:
+            metadata = shard.get_metadata(vector_id)
+            if metadata is not None:
+                return metadata
+        return None
+
+    def reload_if_changed(self, force=False):
+        """Reloads shards rewritten by another process. Returns True if any shard was replaced."""
+        return any(self._fan_out(lambda shard: shard.reload_if_changed(force=force)))
+
+    def compact(self):
+        """Compacts every shard; each shard only blocks its own writers while swapping."""
+        return all(self._fan_out(lambda shard: shard.compact()))
+
+    def flush(self):
+        """Persists pending writes of every shard. Returns True when nothing is left unsaved."""
+        return all(self._fan_out(lambda shard: shard.flush()))
+
+    def close(self):
+        """Flushes and closes every shard."""
+        self._fan_out(lambda shard: shard.close())
+        self._executor.shutdown(wait=True)
@@ -1,139 +1,849 @@
+import atexit
+import contextlib
 import faiss
+import json
 import numpy as np
 import os
 import pickle
-from src.config.config import FAISS_INDEX_PATH # Use absolute import from src
+import threading
+import time
+import weakref
+from src.config.config import ( # Use absolute import from src
+    FAISS_INDEX_PATH,
+    FAISS_WRITE_BEHIND,
+    FAISS_FLUSH_INTERVAL_SECONDS,
+    FAISS_FLUSH_MAX_PENDING,
+    FAISS_RELOAD_CHECK_INTERVAL_SECONDS,
+    FAISS_INDEX_FACTORY,
+    FAISS_COMPACT_DEAD_RATIO,
+    FAISS_EXACT_FILTER_MAX_IDS,
+    FAISS_INTERACTION_SHARDS
+)
+from src.vector_database.index_factory import (
+    FLAT_SPEC,
+    resolve_index_spec,
+    should_rebuild,
+    build_index,
+    configure_search,
+    search_parameters,
+    measure_recall
+)
+from src.vector_database.raw_vector_store import RawVectorStore
+from src.vector_database.metadata_store import MetadataStore
+from src.vector_database.file_lock import FileLock
 # Removed Pinecone import
 # from pinecone import Pinecone, ServerlessSpec
 
 # Adjust dimension for Google's embedding-001 model
 EMBEDDING_DIM = 768
 
+# Clients with write-behind persistence, so pending vectors are flushed when the process exits
+_live_clients = weakref.WeakSet()
+
+def _flush_all_clients():
+    """Final flush of every live client's pending writes at interpreter shutdown."""
+    for client in list(_live_clients):
+        client.flush()
+
+atexit.register(_flush_all_clients)
+
+# Process-wide registry: one shared client per index file
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_vector_db_client(index_file=None):
+    """Returns the shared VectorDBClient for `index_file`, creating it on first use.
+
+    Every caller in the process gets the same in-memory index, which reloads itself
+    when another process rewrites the files on disk. With FAISS_INTERACTION_SHARDS set,
+    this is a ShardedVectorDBClient with the same methods.
+    """
+    path = os.path.abspath(index_file or FAISS_INDEX_PATH)
+    with _clients_lock:
+        client = _clients.get(path)
+        if client is None:
+            if FAISS_INTERACTION_SHARDS > 0:
+                # Imported here: the sharded client is built from VectorDBClient
+                from src.vector_database.sharded_vector_db_client import ShardedVectorDBClient
+                client = ShardedVectorDBClient(index_file=path)
+            else:
+                client = VectorDBClient(index_file=path)
+            _clients[path] = client
+            return client
+    client.reload_if_changed()
+    return client
+
 class VectorDBClient:
-    def __init__(self):
-        """Initializes the FAISS index, loading from disk if available."""
-        self.index_file = FAISS_INDEX_PATH
-        self.metadata_file = self.index_file + ".meta"
+    def __init__(self, index_file=None, write_behind=None, flush_interval=None, flush_max_pending=None,
+                 index_spec=None):
+        """Initializes the FAISS index, loading from disk if available.
+
+        Args:
+            index_file: Path of the FAISS index file (defaults to FAISS_INDEX_PATH).
+            write_behind: If True, upserts only mark the index dirty and are persisted
+                          by flush(); if False, every upsert is saved immediately.
+            flush_interval: Seconds after the first pending write before a background flush.
+            flush_max_pending: Number of pending vectors that triggers an immediate flush.
+            index_spec: faiss.index_factory string such as "Flat", "HNSW32" or
+                        "IVF{nlist},PQ48" (defaults to FAISS_INDEX_FACTORY).
+        """
+        self.index_file = index_file or FAISS_INDEX_PATH
+        self.legacy_metadata_file = self.index_file + ".meta"  # Pickle sidecar of earlier versions
         self.index = None
-        self.index_to_id = []
-        self.id_to_metadata = {}
+        # Vectors are labelled in FAISS with stable int64 ids; string IDs and metadata live in
+        # the SQLite store and are read per hit. Ids are never reused, so a replaced or
+        # deleted vector can't be mistaken for a new one.
+        self.metadata = MetadataStore(self.index_file + ".metadata.sqlite3")
+        self._live_count = 0
 
-        self.load_index()
+        # Every process writing these files takes the file lock for each write and save.
+        # A write commits its sidecar rows and metadata at once; the index file is a
+        # checkpoint of the first `index_raw_count` sidecar rows, saved by write-behind,
+        # and loads add the committed rows after it from the sidecar.
+        self._file_lock = FileLock(self.index_file + ".lock")
+        self._raw_epoch = 0  # Bumped in the state whenever the sidecar is rewritten
+        self._data_version = None  # Metadata version _live_count was last counted at
 
-        if self.index is None:
-            print(f"FAISS index file '{self.index_file}' not found or failed to load. Creating a new index.")
-            # Using IndexFlatL2 for simple Euclidean distance search
-            self.index = faiss.IndexFlatL2(EMBEDDING_DIM)
-            self.index_to_id = []
-            self.id_to_metadata = {}
-        else:
-            print(f"FAISS index loaded from '{self.index_file}' with {self.index.ntotal} vectors.")
-            print(f"Metadata loaded for {len(self.id_to_metadata)} IDs.")
+        # Index family: the configured spec, the spec the live index was built from,
+        # and the exact vectors needed to train, rebuild and measure it
+        self.index_spec = index_spec or FAISS_INDEX_FACTORY
+        self.active_spec = FLAT_SPEC
+        self.raw_vectors = RawVectorStore(self.index_file + ".vecs", EMBEDDING_DIM)
+        self.last_recall = None
+        self._raw_complete = True
+        self._load_failed = False  # Set when the stored index could not be loaded
+        self._rebuild_thread = None
+        self._rebuild_lock = threading.Lock()
+
+        # Write-behind state
+        self.write_behind = FAISS_WRITE_BEHIND if write_behind is None else write_behind
+        self.flush_interval = FAISS_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self.flush_max_pending = FAISS_FLUSH_MAX_PENDING if flush_max_pending is None else flush_max_pending
+        self._lock = threading.RLock()
+        # Searches run outside the lock; in-place index changes wait until none is running.
+        # The condition has its own lock, so a waiting writer keeps holding self._lock.
+        self._searches_done = threading.Condition()
+        self._active_searches = 0
+        self._dirty = False
+        self._pending_writes = 0
+        self._flush_timer = None
+
+        # Hot-reload state: file signature of the last load/save and a reload counter
+        self.generation = 0
+        self._disk_signature = None
+        self._last_reload_check = time.monotonic()
+
+        self._load_or_create()
+        _live_clients.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _load_or_create(self):
+        """Loads the index from disk, or starts an empty one for a new store. Returns True if the in-memory index was replaced.
+
+        Nothing on disk is cleared here. If a reload fails, the in-memory index is kept and
+        the load is retried on the next check. If the first load fails, the client starts
+        with an empty in-memory index and refuses to save until rebuild_index() has rebuilt
+        it from the raw vector sidecar.
+        """
+        with self._lock, self._file_lock:
+            if self.load_index():
+                print(f"FAISS index loaded from '{self.index_file}' with {self.index.ntotal} vectors ({self.active_spec}).")
+                print(f"Metadata store holds {self._live_count} IDs.")
+                self._load_failed = False
+                configure_search(self.index)
+                self._sync_raw_vectors()
+            elif self.index is not None:
+                print(f"Keeping the in-memory FAISS index for '{self.index_file}'; the load is retried on the next check.")
+                return False
+            else:
+                print(f"Starting with an empty in-memory FAISS index for '{self.index_file}'. Nothing is saved until rebuild_index() rebuilds it from the raw vector sidecar.")
+                state = self.metadata.get_state()
+                self.active_spec = FLAT_SPEC
+                self.index = build_index(FLAT_SPEC, np.empty((0, EMBEDDING_DIM), dtype='float32'),
+                                         np.empty(0, dtype='int64'))
+                self.raw_vectors.reload(state.get('raw_vector_count', 0))
+                self._raw_epoch = state.get('raw_vector_epoch', 0)
+                self._live_count = self.metadata.count()
+                self._raw_complete = True
+                self._load_failed = True
+                return True
+
+            if self._dirty:
+                self._mark_dirty(0)  # Saves the caught-up rows by the write-behind policy
+            self._disk_signature = self._read_disk_signature()
+        self._maybe_rebuild()
+        return True
+
+    def _sync_raw_vectors(self):
+        """Makes sure every live vector has its exact copy in the raw vector sidecar. Caller holds the file lock."""
+        ids, _ = self.raw_vectors.read()
+        missing = np.setdiff1d(self._live_int_ids(), ids)
+        self._raw_complete = True
+        if len(missing) == 0:
+            return
+        try:
+            # Sidecar lost or never written: recover the rows from the index itself
+            self.raw_vectors.append(missing, self.index.reconstruct_batch(missing))
+            self.raw_vectors.flush()
+            self.metadata.set_state(raw_vector_count=self.raw_vectors.count)
+            self.metadata.commit()
+            self._dirty = True  # Saved so the index checkpoint covers the restored rows
+            print(f"Restored {len(missing)} vectors to the raw vector sidecar from the FAISS index.")
+        except RuntimeError as e:
+            self._raw_complete = False
+            print(f"Warning: Raw vector sidecar is missing {len(missing)} vectors and the index cannot reconstruct them ({e}). Retraining and recall checks are disabled.")
+
+    def _read_disk_signature(self):
+        """Returns (mtime_ns, size) of the index file, or None if it is missing.
+
+        The index file is replaced after the metadata commit on every save, so it
+        alone tells whether another process saved.
+        """
+        try:
+            stat = os.stat(self.index_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def reload_if_changed(self, force=False):
+        """Reloads the index if its files were rewritten by another process.
+
+        The stat check runs at most once per FAISS_RELOAD_CHECK_INTERVAL_SECONDS unless
+        `force` is set. Returns True if the in-memory index was replaced.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_reload_check < FAISS_RELOAD_CHECK_INTERVAL_SECONDS:
+            return False
+        self._last_reload_check = now
+
+        with self._lock:
+            if self._read_disk_signature() == self._disk_signature:
+                return False
+            # Unsaved local writes are committed to the sidecar and metadata, so the
+            # reloaded index picks them up again
+            print(f"FAISS index '{self.index_file}' changed on disk. Reloading...")
+            if not self._load_or_create():
+                return False
+            self.generation += 1
+            return True
 
     def load_index(self):
-        """Loads the FAISS index and metadata from disk."""
+        """Loads the saved FAISS index and adds the sidecar rows committed after it. Returns True on success.
+
+        Caller holds the file lock. On failure the in-memory index is left as it is and
+        nothing on disk is changed.
+        """
+        previous_raw_count = self.raw_vectors.count
         try:
+            state = self.metadata.get_state()
             if os.path.exists(self.index_file):
-                self.index = faiss.read_index(self.index_file)
-            if os.path.exists(self.metadata_file):
-                with open(self.metadata_file, 'rb') as f:
-                    saved_data = pickle.load(f)
-                    self.index_to_id = saved_data.get('index_to_id', [])
-                    self.id_to_metadata = saved_data.get('id_to_metadata', {})
-            # Basic consistency check
-            if self.index is not None and self.index.ntotal != len(self.index_to_id):
-                 print(f"Warning: Index size ({self.index.ntotal}) and ID mapping size ({len(self.index_to_id)}) mismatch. Resetting index.")
-                 self.index = None # Force recreation
-                 self.index_to_id = []
-                 self.id_to_metadata = {}
+                index = faiss.read_index(self.index_file)
+                if index.d != EMBEDDING_DIM:
+                    raise ValueError(f"Index dimension {index.d} does not match EMBEDDING_DIM {EMBEDDING_DIM}")
+                if not state and os.path.exists(self.legacy_metadata_file):
+                    self.raw_vectors.reload()
+                    index, state = self._import_legacy_metadata(index)
+                if not state:
+                    raise ValueError("The metadata store has no saved index state")
+                index_spec = state.get('index_spec', FLAT_SPEC)
+            else:
+                index = None
+            # Stores saved before writes were committed one at a time: the index covers every committed row
+            index_raw_count = state.get('index_raw_count', state.get('raw_vector_count', 0))
+            if index is None:
+                if index_raw_count:
+                    raise FileNotFoundError(f"The index file is missing but {index_raw_count} saved sidecar rows refer to it")
+                # New store: the configured index, or exact search until it can be trained
+                index_spec = resolve_index_spec(self.index_spec, EMBEDDING_DIM, 0)
+                index = build_index(index_spec, np.empty((0, EMBEDDING_DIM), dtype='float32'), np.empty(0, dtype='int64'))
+            committed = state.get('raw_vector_count', 0)
+            if index_raw_count > committed:
+                raise ValueError(f"The index covers {index_raw_count} sidecar rows but only {committed} are committed")
 
+            self.raw_vectors.reload()
+            self.raw_vectors.truncate(committed)  # Rows of a write that never committed
+            added = self._add_raw_rows(index, index_raw_count)
+            if 'index_raw_count' not in state:
+                self.metadata.set_state(index_raw_count=index_raw_count)
+            self.metadata.commit()
         except Exception as e:
-            print(f"Error loading FAISS index or metadata: {e}. A new index will be created.")
-            self.index = None # Ensure index is reset on error
-            self.index_to_id = []
-            self.id_to_metadata = {}
+            print(f"Error loading FAISS index or metadata from '{self.index_file}': {e}")
+            self.metadata.rollback()
+            self.raw_vectors.reload(previous_raw_count)
+            return False
+
+        if self.index is not None:
+            self._wait_for_searches()
+        self.index = index
+        self.active_spec = index_spec
+        self._raw_epoch = state.get('raw_vector_epoch', 0)
+        self._live_count = self.metadata.count()
+        self._dirty = self._dirty or index_raw_count < committed
+        if added:
+            print(f"Added {added} vectors committed after the saved FAISS index.")
+        return True
+
+    def _add_raw_rows(self, index, start):
+        """Adds live sidecar rows from row `start` on to `index`. Returns how many were added.
+
+        Used for rows committed after the saved index and rows written by other processes.
+        """
+        stop = self.raw_vectors.count
+        if stop <= start:
+            return 0
+        ids, vectors = self.raw_vectors.read(stop)
+        new_ids = np.asarray(ids[start:stop])
+        live = np.flatnonzero(np.isin(new_ids, self.metadata.present_int_ids(new_ids)))
+        if len(live):
+            if index is self.index:
+                self._wait_for_searches()
+            index.add_with_ids(np.ascontiguousarray(vectors[start + live]), np.ascontiguousarray(new_ids[live]))
+        return len(live)
+
+    def _sync_with_store(self):
+        """Adds the rows other processes committed since this client last wrote or loaded.
+
+        Caller holds the lock and the file lock. Vectors they deleted stay in the in-memory
+        index as rows without metadata, which searches skip, until the next compaction.
+        """
+        state = self.metadata.get_state()
+        if state.get('raw_vector_epoch', 0) != self._raw_epoch:
+            # Another process rewrote the sidecar (compaction): start again from its saved index
+            if not self._load_or_create():
+                raise RuntimeError(f"Could not reload FAISS index '{self.index_file}' after another process compacted it")
+            self.generation += 1
+            return
+        start = self.raw_vectors.count
+        committed = state.get('raw_vector_count', 0)
+        self.raw_vectors.reload()
+        self.raw_vectors.truncate(committed)  # Rows of a write that never committed
+        self._add_raw_rows(self.index, start)
+        self._live_count = self.metadata.count()
+
+    @contextlib.contextmanager
+    def _write(self):
+        """Runs one write call under the file lock and commits it at the end. Caller holds the lock.
+
+        Sidecar rows are flushed before the metadata commit that counts them, so a
+        crash in between leaves only an uncommitted sidecar tail, cut off by the next
+        writer. On error the metadata is rolled back and the index reloaded on the next check.
+        """
+        with self._file_lock:
+            self._sync_with_store()
+            try:
+                yield
+                self.raw_vectors.flush()
+                self.metadata.set_state(raw_vector_count=self.raw_vectors.count)
+                self.metadata.commit()
+            except BaseException:
+                self.metadata.rollback()
+                self._disk_signature = None
+                raise
+
+    def _import_legacy_metadata(self, index):
+        """Moves the pickled metadata of earlier versions into the store. Returns (index, state).
+
+        The pickle file is left in place as a backup; it is ignored once the store has state.
+        """
+        with open(self.legacy_metadata_file, 'rb') as f:
+            saved_data = pickle.load(f)
+        id_to_metadata = saved_data.get('id_to_metadata', {})
+        index_spec = saved_data.get('index_spec', FLAT_SPEC)
+        if 'index_to_id' in saved_data:
+            index, id_to_int = self._migrate_positional_ids(index, index_spec, saved_data['index_to_id'])
+            next_int_id = len(id_to_int)
+            raw_vector_count = self.raw_vectors.count
+        else:
+            id_to_int = saved_data.get('id_to_int', {})
+            next_int_id = saved_data.get('next_int_id', 0)
+            raw_vector_count = saved_data.get('raw_vector_count', 0)
+        self.metadata.insert(id_to_int.values(), id_to_int.keys(), [id_to_metadata.get(vector_id, {}) for vector_id in id_to_int])
+        state = {'next_int_id': next_int_id, 'index_spec': index_spec, 'raw_vector_count': raw_vector_count}
+        self.metadata.set_state(**state)
+        self._dirty = True
+        print(f"Imported metadata for {len(id_to_int)} IDs from '{self.legacy_metadata_file}'.")
+        return index, state
+
+    def _migrate_positional_ids(self, index, index_spec, index_to_id):
+        """Converts an index saved with positional IDs into one labelled with int64 ids.
+
+        Position i becomes id i, and the index is rebuilt with id support from its own
+        vectors. Returns the new index and the {vector_id: int_id} mapping.
+        """
+        count = index.ntotal
+        if count != len(index_to_id):
+            raise ValueError(f"Index size ({count}) and ID mapping size ({len(index_to_id)}) mismatch")
+        print(f"Migrating FAISS index '{self.index_file}' ({count} vectors) to stable int64 ids...")
+        try:
+            vectors = index.reconstruct_n(0, count)
+        except RuntimeError:
+            # ANN indexes from before the migration kept their exact rows in the old sidecar
+            vectors = np.fromfile(self.raw_vectors.path, dtype='float32').reshape(-1, EMBEDDING_DIM)[:count]
+        int_ids = np.arange(count, dtype='int64')
+        index = build_index(index_spec, vectors, int_ids)
+        self.raw_vectors.rewrite(int_ids, vectors)
+        return index, {vector_id: position for position, vector_id in enumerate(index_to_id)}
 
     def save_index(self):
-        """Saves the FAISS index and metadata to disk."""
+        """Saves the FAISS index to disk as a checkpoint of the committed sidecar rows. Returns True on success.
+
+        Only one process saves at a time (file lock); rows other processes committed
+        since our last write are added first, so a save never drops their vectors.
+        """
+        with self._lock:
+            if self._load_failed:
+                print(f"Not saving FAISS index '{self.index_file}': it failed to load. Call rebuild_index() to rebuild it from the raw vector sidecar.")
+                return False
+            try:
+                with self._file_lock:
+                    self._sync_with_store()
+                    print(f"Saving FAISS index to '{self.index_file}' ({self._live_count} vectors)...")
+                    # Write to a temp file and rename, so readers never see a half-written index
+                    faiss.write_index(self.index, self.index_file + ".tmp")
+                    self.metadata.set_state(index_spec=self.active_spec, index_raw_count=self.raw_vectors.count)
+                    self.metadata.commit()
+                    os.replace(self.index_file + ".tmp", self.index_file)
+                    self._disk_signature = self._read_disk_signature()
+                self._dirty = False
+                self._pending_writes = 0
+                print("FAISS index and metadata saved successfully.")
+                return True
+            except Exception as e:
+                self.metadata.rollback()
+                print(f"Error saving FAISS index or metadata: {e}")
+                return False
+
+    def flush(self):
+        """Persists pending writes if the index is dirty. Returns True when nothing is left unsaved."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return True
+            return self.save_index()
+
+    def close(self):
+        """Waits for a running rebuild and flushes pending writes; the client should not be used for new writes afterwards."""
+        rebuild_thread = self._rebuild_thread
+        if rebuild_thread is not None and rebuild_thread is not threading.current_thread():
+            rebuild_thread.join()
+        self.flush()
+        _live_clients.discard(self)
+        self.metadata.close()
+
+    def _mark_dirty(self, count):
+        """Records `count` unsaved vectors and persists them according to the write-behind policy."""
+        self._dirty = True
+        self._pending_writes += count
+        if not self.write_behind or self._pending_writes >= self.flush_max_pending:
+            self.flush()
+        elif self._flush_timer is None:
+            # First pending write since the last flush: schedule a background flush
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _live_int_ids(self):
+        return self.metadata.live_int_ids()
+
+    def _refresh_live_count(self):
+        """Recounts the stored vectors if another process committed since the last count. Caller holds the lock."""
+        version = self.metadata.data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._live_count = self.metadata.count()
+
+    def _wait_for_searches(self):
+        """Blocks until no search is reading the index. Caller holds the lock, so no new search can start."""
+        with self._searches_done:
+            while self._active_searches:
+                self._searches_done.wait()
+
+    def _add_vectors(self, vector_ids, matrix, metadatas):
+        """Adds rows under fresh int ids, replacing earlier versions of the same IDs. Caller is inside _write()."""
+        replaced = self._remove_vectors(vector_ids)
+        first_int_id = self.metadata.allocate_int_ids(len(vector_ids))
+        int_ids = np.arange(first_int_id, first_int_id + len(vector_ids), dtype='int64')
+        self._wait_for_searches()
+        self.index.add_with_ids(matrix, int_ids)
+        self.raw_vectors.append(int_ids, matrix)
+        self.metadata.insert(int_ids.tolist(), vector_ids, metadatas)
+        self._live_count += len(vector_ids)
+        return replaced
+
+    def _remove_vectors(self, vector_ids):
+        """Drops IDs from the metadata store and the index. Caller is inside _write(). Returns how many existed."""
+        existing = self.metadata.lookup(vector_ids)
+        if not existing:
+            return 0
+        int_ids = np.fromiter(existing.values(), dtype='int64', count=len(existing))
+        self.metadata.delete(int_ids)
+        self._live_count -= len(existing)
+        self._wait_for_searches()
         try:
-            print(f"Saving FAISS index to '{self.index_file}' ({self.index.ntotal} vectors)...")
-            faiss.write_index(self.index, self.index_file)
-            metadata_to_save = {
-                'index_to_id': self.index_to_id,
-                'id_to_metadata': self.id_to_metadata
-            }
-            with open(self.metadata_file, 'wb') as f:
-                pickle.dump(metadata_to_save, f)
-            print("FAISS index and metadata saved successfully.")
-        except Exception as e:
-            print(f"Error saving FAISS index or metadata: {e}")
+            self.index.remove_ids(int_ids)
+        except RuntimeError:
+            pass  # HNSW can't remove: the rows stay as unmapped tombstones until compaction
+        return len(existing)
+
+    def __contains__(self, vector_id):
+        return bool(self.metadata.lookup([vector_id]))
+
+    def stored_ids(self, vector_ids):
+        """The given string IDs that are stored, as a set (one indexed metadata read, no locks)."""
+        return set(self.metadata.lookup(vector_ids))
+
+    def get_metadata(self, vector_id):
+        """Returns the metadata dict stored for `vector_id`, or None."""
+        return self.metadata.get_metadata(vector_id)
 
     def upsert_embedding(self, vector_id, embedding, metadata):
-        """Adds or updates a vector in the FAISS index."""
-        # Note: FAISS IndexFlatL2 doesn't directly support updates or deletions by ID.
-        # This implementation currently only adds. True upsert would require rebuilding
-        # or using an index type that supports removals (like IndexIDMap).
-        # For simplicity, we just add and store metadata.
+        """Adds a vector, replacing any existing vector with the same ID."""
         try:
-            if vector_id in self.id_to_metadata:
-                # Simple approach: Ignore if ID already exists to avoid duplicates in this basic setup.
-                # More complex logic could involve removing the old vector first if using IndexIDMap.
-                print(f"Warning: Vector ID '{vector_id}' already exists. Skipping add. (FAISS IndexFlatL2 doesn't easily support updates)")
-                return True # Or False, depending on desired behavior for existing IDs
-
-            vector = np.array([embedding]).astype('float32') # FAISS expects float32 and 2D array
-            self.index.add(vector)
-            faiss_index = self.index.ntotal - 1 # Index of the added vector
-            self.index_to_id.append(vector_id)
-            self.id_to_metadata[vector_id] = metadata
-
-            # Check consistency after adding
-            if self.index.ntotal != len(self.index_to_id):
-                 print(f"CRITICAL ERROR: Index size ({self.index.ntotal}) and ID mapping size ({len(self.index_to_id)}) mismatch after add! Aborting save.")
-                 # Potentially try to recover or raise a more specific error
-                 return False
-
-            self.save_index() # Save after each addition for persistence
-            return True  # Indicate successful add
+            self.reload_if_changed()
+            with self._lock:
+                vector = np.array([embedding]).astype('float32') # FAISS expects float32 and 2D array
+                with self._write():
+                    self._add_vectors([vector_id], vector, [metadata])
+                self._mark_dirty(1) # Persisted by the write-behind flush (or immediately if disabled)
+            self._maybe_rebuild()
+            return True  # Indicate successful upsert
         except Exception as e:
             print(f"Error adding embedding to FAISS: {e}")
             return False # Indicate add failure
 
-    def query_similar_embeddings(self, query_embedding, top_k=5):
-        """Queries FAISS for similar embeddings."""
-        if self.index is None or self.index.ntotal == 0:
-            print("FAISS index is not initialized or is empty.")
-            return {'matches': []} # Return empty matches structure
+    def upsert_embeddings(self, vector_ids, embeddings, metadatas):
+        """Adds or replaces a block of vectors with a single index add.
+
+        Args:
+            vector_ids: List of string IDs, one per row. If an ID repeats, its last row wins.
+            embeddings: 2D array-like of shape (len(vector_ids), EMBEDDING_DIM).
+            metadatas: List of metadata dicts, one per row.
+
+        Returns:
+            The number of unique IDs written (repeated IDs count once), or 0 if the add failed.
+        """
+        try:
+            matrix = np.asarray(embeddings, dtype='float32')
+            if matrix.ndim != 2 or matrix.shape[0] != len(vector_ids) or len(metadatas) != len(vector_ids):
+                raise ValueError(f"Expected {len(vector_ids)} embeddings and metadata entries, got matrix {matrix.shape} and {len(metadatas)} metadata entries")
+            if not vector_ids:
+                return 0
+
+            self.reload_if_changed()
+            with self._lock:
+                rows = sorted({vector_id: row for row, vector_id in enumerate(vector_ids)}.values())
+                with self._write():
+                    replaced = self._add_vectors([vector_ids[row] for row in rows],
+                                                 np.ascontiguousarray(matrix[rows]),
+                                                 [metadatas[row] for row in rows])
+                if replaced:
+                    print(f"Replaced {replaced} existing vector(s) in FAISS.")
+                self._mark_dirty(len(rows))
+            self._maybe_rebuild()
+            return len(rows)
+        except Exception as e:
+            print(f"Error bulk adding embeddings to FAISS: {e}")
+            return 0
+
+    def delete(self, vector_ids):
+        """Removes vectors by string ID. Returns the number of IDs that were present."""
+        if isinstance(vector_ids, str):
+            vector_ids = [vector_ids]
+        if not vector_ids or not self.metadata.lookup(vector_ids):
+            return 0  # Nothing to remove: skip the file lock and the write transaction
+        self.reload_if_changed()
+        with self._lock:
+            with self._write():
+                removed = self._remove_vectors(vector_ids)
+            if removed:
+                self._mark_dirty(removed)
+        if removed:
+            self._maybe_rebuild()
+        return removed
+
+    def delete_by_filter(self, predicate):
+        """Removes every vector whose metadata matches `predicate`.
+
+        Args:
+            predicate: Callable taking a metadata dict and returning True for vectors to
+                       delete, or a dict of metadata key/value pairs that must all match
+                       (e.g. {"customer_id": "CUST001"}).
+
+        Returns:
+            The number of vectors removed.
+        """
+        with self._lock:
+            if isinstance(predicate, dict):
+                matching = self.metadata.find(predicate)
+            else:
+                matching = [vector_id for vector_id, metadata in self.metadata.iter_metadata() if predicate(metadata)]
+            return self.delete(matching)
+
+    def compact(self):
+        """Rebuilds the index and raw vector sidecar without deleted or replaced vectors."""
+        with self._lock:
+            spec = self.active_spec
+        return self.rebuild_index(spec)
+
+    def _needs_compaction(self):
+        """True once dead sidecar rows (deleted or replaced vectors) exceed FAISS_COMPACT_DEAD_RATIO."""
+        total = self.raw_vectors.count
+        dead = total - self._live_count
+        return dead > 0 and dead >= FAISS_COMPACT_DEAD_RATIO * total
+
+    def _maybe_rebuild(self):
+        """Starts a background rebuild if the index should be trained, has outgrown its lists or needs compaction."""
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            if not self._raw_complete or self._load_failed:
+                return  # Cannot rebuild without every exact vector; a failed load is only rebuilt on request
+            target_spec = resolve_index_spec(self.index_spec, EMBEDDING_DIM, self._live_count)
+            if should_rebuild(self.active_spec, target_spec):
+                reason = f"{self.active_spec} -> {target_spec}"
+            elif self._needs_compaction():
+                target_spec = self.active_spec
+                reason = f"compaction of {self.raw_vectors.count - self._live_count} dead rows"
+            else:
+                return
+            print(f"Scheduling background FAISS rebuild: {reason} ({self._live_count} vectors).")
+            self._rebuild_thread = threading.Thread(
+                target=self.rebuild_index, args=(target_spec,), name="faiss-rebuild", daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def rebuild_index(self, target_spec=None):
+        """Builds a new index from the live raw vectors and swaps it in. Returns True on success.
+
+        Deleted and replaced vectors are left out, so this also compacts the index and the
+        sidecar; it is also how an index that failed to load is restored. Training and
+        adding run outside the lock, so searches and upserts continue against the old
+        index; changes made meanwhile, in this or another process, are applied before the swap.
+        """
+        with self._rebuild_lock:
+            try:
+                with self._lock:
+                    if not self._raw_complete:
+                        print("Cannot rebuild FAISS index: the raw vector sidecar is incomplete.")
+                        return False
+                    target_spec = target_spec or resolve_index_spec(self.index_spec, EMBEDDING_DIM, self._live_count)
+                    start_generation = self.generation
+                    snapshot_count = self.raw_vectors.count
+                    ids, vectors = self.raw_vectors.read(snapshot_count)
+                    rows = np.flatnonzero(np.isin(ids, self._live_int_ids()))
+
+                new_index = build_index(target_spec, vectors, ids, rows)
+                recall = measure_recall(new_index, vectors, ids, rows) if target_spec != FLAT_SPEC else 1.0
+
+                with self._lock, self._file_lock:
+                    self._sync_with_store()
+                    if self.generation != start_generation:
+                        print("FAISS index was reloaded during rebuild. Discarding the rebuilt index.")
+                        return False
+                    live_ids = self._live_int_ids()
+                    if self.raw_vectors.count > snapshot_count:
+                        # Vectors added during the build
+                        all_ids, all_vectors = self.raw_vectors.read()
+                        new_rows = snapshot_count + np.flatnonzero(np.isin(all_ids[snapshot_count:], live_ids))
+                        new_index.add_with_ids(np.ascontiguousarray(all_vectors[new_rows]),
+                                               np.ascontiguousarray(all_ids[new_rows]))
+                    # Vectors deleted or replaced during the build
+                    removed_ids = np.setdiff1d(ids[rows], live_ids)
+                    if len(removed_ids):
+                        try:
+                            new_index.remove_ids(removed_ids)
+                        except RuntimeError:
+                            pass  # Left as tombstones for the next compaction
+                    self.index = new_index
+                    self.active_spec = target_spec
+                    kept = self.raw_vectors.compact(live_ids)
+                    # Publish the rewritten sidecar; other processes reload when they see the new epoch
+                    self._raw_epoch += 1
+                    self.metadata.set_state(raw_vector_count=kept, raw_vector_epoch=self._raw_epoch, index_raw_count=kept)
+                    self.metadata.commit()
+                    self.last_recall = {"index_spec": target_spec, "recall_at_10": recall, "vectors": len(rows)}
+                    self._load_failed = False
+                    print(f"FAISS index rebuilt as {target_spec} with {len(live_ids)} vectors, {kept} sidecar rows kept (recall@10 vs flat: {recall}).")
+                    self._dirty = True
+                    self.save_index()
+                return True
+            except Exception as e:
+                print(f"Error rebuilding FAISS index: {e}")
+                return False
+
+    def evaluate_recall(self, k=10, num_queries=100):
+        """Measures recall@k of the live index against exact flat search over the raw vectors."""
+        with self._lock:
+            if not self._raw_complete:
+                return None
+            ids, vectors = self.raw_vectors.read()
+            rows = np.flatnonzero(np.isin(ids, self._live_int_ids()))
+            recall = measure_recall(self.index, vectors, ids, rows, k=k, num_queries=num_queries)
+            return {"index_spec": self.active_spec, f"recall_at_{k}": recall, "vectors": len(rows)}
+
+    def query_similar_embeddings(self, query_embedding, top_k=5, filter=None):
+        """Queries FAISS for similar embeddings.
 
+        Args:
+            query_embedding: The query vector.
+            top_k: Number of matches to return.
+            filter: Optional {field: value or list of values} over the metadata fields
+                    customer_id, source ("pdf" or "interaction"), document, language and
+                    outcome, e.g. {"source": "pdf"} or {"customer_id": "CUST001"}. Only
+                    matching vectors are searched.
+        """
+        results = self.query_batch([query_embedding], top_k=top_k, filters=filter)
+        return results[0] if results is not None else None
+
+    def query_batch(self, query_embeddings, top_k=5, filters=None):
+        """Searches many query vectors with one FAISS search call.
+
+        Args:
+            query_embeddings: 2D array-like of shape (num_queries, EMBEDDING_DIM).
+            top_k: Number of matches per query.
+            filters: None, one filter dict for all queries (as in query_similar_embeddings),
+                     or a list with one filter dict (or None) per query. Queries sharing
+                     a filter are searched together.
+
+        Returns:
+            A list with one {'matches': [...]} per query, or None on error.
+        """
+        self.reload_if_changed()
         try:
-            query_vector = np.array([query_embedding]).astype('float32')
-            # Search returns distances (D) and indices (I)
-            distances, indices = self.index.search(query_vector, top_k)
+            queries = np.ascontiguousarray(query_embeddings, dtype='float32')
+            if queries.ndim != 2 or queries.shape[1] != EMBEDDING_DIM:
+                raise ValueError(f"Expected query matrix of shape (n, {EMBEDDING_DIM}), got {queries.shape}")
+            if self.index is None or self._live_count == 0:
+                print("FAISS index is not initialized or is empty.")
+                return [{'matches': []} for _ in range(len(queries))] # Return empty matches structure
+
+            if filters is None or isinstance(filters, dict):
+                groups = {None: (filters, np.arange(len(queries)))}
+            else:
+                if len(filters) != len(queries):
+                    raise ValueError(f"Expected {len(queries)} filters, got {len(filters)}")
+                grouped_rows = {}
+                for row, query_filter in enumerate(filters):
+                    key = json.dumps(query_filter, sort_keys=True, default=str) if query_filter else None
+                    grouped_rows.setdefault(key, (query_filter, []))[1].append(row)
+                groups = {key: (query_filter, np.asarray(rows)) for key, (query_filter, rows) in grouped_rows.items()}
+
+            # Take the index and each group's candidates under the lock; search without it.
+            # Writers wait for running searches before changing the index in place.
+            with self._lock:
+                self._refresh_live_count()
+                index = self.index
+                tombstones = max(0, index.ntotal - self._live_count)
+                plans = []
+                for query_filter, rows in groups.values():
+                    allowed_ids = self.metadata.matching_int_ids(query_filter) if query_filter else None
+                    plans.append((rows, allowed_ids, self._exact_candidates(allowed_ids)))
+                with self._searches_done:
+                    self._active_searches += 1
+            try:
+                distances = [None] * len(queries)
+                labels = [None] * len(queries)
+                for rows, allowed_ids, candidates in plans:
+                    # Search returns distances (D) and int64 ids (I)
+                    group_distances, group_labels = self._search(index, queries[rows], top_k, tombstones,
+                                                                 allowed_ids, candidates)
+                    for position, row in enumerate(rows):
+                        distances[row], labels[row] = group_distances[position], group_labels[position]
+            finally:
+                with self._searches_done:
+                    self._active_searches -= 1
+                    if self._active_searches == 0:
+                        self._searches_done.notify_all()
 
+            # One metadata lookup for every distinct hit; -1 (no neighbor) and deleted vectors have no row
+            hit_ids = np.unique(np.concatenate(labels))
+            rows = self.metadata.fetch(hit_ids[hit_ids != -1].tolist())
+
+            found_ids = np.fromiter(rows.keys(), dtype='int64', count=len(rows))
             results = []
-            if len(indices[0]) > 0:
-                for i, faiss_index in enumerate(indices[0]):
-                    if faiss_index != -1: # -1 indicates no neighbor found
-                        vector_id = self.index_to_id[faiss_index]
-                        metadata = self.id_to_metadata.get(vector_id, {}) # Get metadata
-                        score = distances[0][i] # Lower score (distance) is better
-                        results.append({
-                            'id': vector_id,
-                            'score': float(score), # Ensure score is standard float
-                            'metadata': metadata
-                        })
-            return {'matches': results}
+            for row_distances, row_labels in zip(distances, labels):
+                keep = np.flatnonzero(np.isin(row_labels, found_ids))[:top_k]
+                results.append({'matches': [
+                    {
+                        'id': rows[label][0],
+                        'score': score, # Lower score (distance) is better
+                        'metadata': rows[label][1]
+                    }
+                    for score, label in zip(row_distances[keep].tolist(), row_labels[keep].tolist())
+                ]})
+            return results
         except Exception as e:
             print(f"Error querying FAISS: {e}")
             return None
 
+    def _search(self, index, queries, top_k, tombstones, allowed_ids=None, candidates=None):
+        """Runs one FAISS search on `index`, restricted to the sorted int ids `allowed_ids` if given.
+
+        `candidates` are the allowed vectors read by _exact_candidates; when present they
+        are scanned exactly instead of searching the index. Runs without the lock.
+        """
+        if allowed_ids is None:
+            # Over-fetch past tombstoned rows that indexes without removal (HNSW) still return
+            return index.search(queries, min(top_k + tombstones, index.ntotal))
+        if len(allowed_ids) == 0:
+            return np.empty((len(queries), 0), dtype='float32'), np.empty((len(queries), 0), dtype='int64')
+        if candidates is not None:
+            distances, positions = faiss.knn(queries, candidates, min(top_k, len(candidates)))
+            return distances, np.where(positions >= 0, allowed_ids[positions], -1)
+        # IDSelector pre-filtering: FAISS skips every vector outside the allowed ids
+        selector = faiss.IDSelectorBatch(allowed_ids)
+        return index.search(queries, min(top_k, len(allowed_ids)),
+                            params=search_parameters(index, selector))
+
+    def _exact_candidates(self, allowed_ids):
+        """Copies the allowed vectors out of the raw sidecar for a brute-force search, or returns None.
+
+        Small filtered sets (one customer's turns) are cheaper and more accurate to scan
+        exactly than to look up through an ANN index. Sidecar rows are in ascending id
+        order, so they are located by binary search; returns None if that fails. Caller
+        holds the lock.
+        """
+        if allowed_ids is None or not 0 < len(allowed_ids) <= FAISS_EXACT_FILTER_MAX_IDS or not self._raw_complete:
+            return None
+        ids, vectors = self.raw_vectors.read()
+        if len(ids) == 0:
+            return None
+        rows = np.minimum(np.searchsorted(ids, allowed_ids), len(ids) - 1)
+        if not np.array_equal(ids[rows], allowed_ids):
+            return None
+        return np.ascontiguousarray(vectors[rows])
+
+    def list_by_filter(self, filter, limit=None):
+        """Returns [{'id', 'metadata'}] for vectors matching `filter`, newest first.
+
+        Uses the same filter format as query_similar_embeddings; no vector search is
+        involved, e.g. list_by_filter({"customer_id": "CUST001"}, limit=10) gives that
+        customer's last 10 stored turns.
+        """
+        with self._lock:
+            int_ids = self.metadata.matching_int_ids(filter, limit=limit)[::-1]
+            rows = self.metadata.fetch(int_ids.tolist())
+            return [{'id': rows[int_id][0], 'metadata': rows[int_id][1]} for int_id in int_ids.tolist() if int_id in rows]
+
+    def count_by_filter(self, filter):
+        """Number of vectors matching `filter` (same format as list_by_filter)."""
+        return self.metadata.count_matching(filter)
+
 # Example Usage needs to be updated
 if __name__ == '__main__':
     # Import necessary components for the example
     # This assumes embedding_generator is in the parent directory's embedding_service
     import sys
     sys.path.append(os.path.join(os.path.dirname(__file__), '..')) # Add src to path
-    from embedding_service.embedding_generator import EmbeddingGenerator
+    from embedding_service.embedding_generator import get_embedding_generator
     from config.config import OPENAI_API_KEY # Need API key for embedding gen
 
     if not OPENAI_API_KEY:
@@ -141,8 +851,8 @@ if __name__ == '__main__':
     else:
         try:
             print("\n--- Running FAISS VectorDBClient Example ---")
-            db_client = VectorDBClient()
-            embed_gen = EmbeddingGenerator() # Uses OpenAI by default now
+            db_client = get_vector_db_client()
+            embed_gen = get_embedding_generator()
 
             # --- Test Data ---
             test_data = {
@@ -188,6 +898,7 @@ if __name__ == '__main__':
             else:
                 print("Failed to generate query embedding.")
 
+            db_client.flush() # Persist the example vectors before exiting
             print("\n--- Example Finished ---")
 
         except Exception as e:
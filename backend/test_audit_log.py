@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test Script for the buffered MCP operation audit log
+Uses an in-memory stand-in for the asyncpg pool (no database needed).
+"""
+
+import sys
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.audit_log import AuditLog, AUDIT_COLUMNS
+
+class RecordingPool:
+    """Collects the batches passed to copy_records_to_table"""
+
+    def __init__(self, fail=False):
+        self.copies = []
+        self.fail = fail
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        assert table == "mcp_operations" and columns == AUDIT_COLUMNS
+        self.copies.append(list(records))
+
+def row(record, column):
+    return record[AUDIT_COLUMNS.index(column)]
+
+def test_records_are_batched_and_sampled():
+    """Finished operations are written as single rows, in batches; only sampled successes are kept"""
+    print("\n🔍 Testing batched audit writes...")
+
+    async def scenario():
+        pool = RecordingPool()
+        samples = iter([0.5, 0.001] * 10)
+        audit = AuditLog(lambda: pool, success_sample_rate=0.01, batch_size=3, flush_interval=60,
+                         sample=lambda: next(samples))
+        for index in range(6):
+            audit.record(f"op{index}", "query", {"query": "SELECT 1"}, "completed", execution_time_ms=2)
+        audit.record("bad", "insert", {"table": "messages"}, "failed", error_message="boom", table_name="messages")
+        audit.record("bad2", "insert", {"table": "messages"}, "failed", error_message="boom")
+        await asyncio.sleep(0.01)
+        assert [len(batch) for batch in pool.copies] == [3, 2], "A full batch triggers a write without waiting"
+
+        await audit.close()
+        records = [record for batch in pool.copies for record in batch]
+        assert [row(record, "operation_id") for record in records] == ["op1", "op3", "op5", "bad", "bad2"]
+        assert row(records[3], "status") == "failed" and row(records[3], "error_message") == "boom"
+        assert row(records[3], "table_name") == "messages"
+        assert row(records[0], "completed_at") >= row(records[0], "created_at")
+        assert audit.stats()["sampled_out"] == 3 and audit.stats()["buffered"] == 0
+
+    asyncio.run(scenario())
+    print("✅ Batched audit writes work")
+
+def test_buffer_is_bounded_and_failures_do_not_raise():
+    """The oldest records are dropped when the buffer is full, and write errors are only logged"""
+    print("\n🔍 Testing buffer limits...")
+
+    async def scenario():
+        pool = None
+        audit = AuditLog(lambda: pool, max_buffer=4, batch_size=100, flush_interval=60)
+        for index in range(6):
+            audit.record(f"op{index}", "query", {}, "completed")
+        assert await audit.flush() == 0 and audit.stats()["buffered"] == 4, "Kept until the pool opens"
+
+        pool = RecordingPool()
+        await audit.close()
+        assert [row(record, "operation_id") for record in pool.copies[0]] == ["op2", "op3", "op4", "op5"]
+
+        failing = AuditLog(lambda: RecordingPool(fail=True), batch_size=100, flush_interval=60)
+        failing.record("op", "query", {"params": [object()]}, "failed", error_message="x")
+        await failing.close()
+        assert failing.stats()["dropped"] == 1
+
+    asyncio.run(scenario())
+    print("✅ Buffer limits work")
+
+def main():
+    """Run all audit log tests"""
+    print("🚀 Starting Audit Log Tests")
+    print("=" * 60)
+    test_records_are_batched_and_sampled()
+    test_buffer_is_bounded_and_failures_do_not_raise()
+    print("\n🎉 All audit log tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Audit log test failed: {e}")
+        sys.exit(1)
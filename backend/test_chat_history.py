@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test Script for the tiered chat history store
+Uses a throwaway SQLite file and a fake clock (no API keys or database server needed).
+"""
+
+import sys
+import os
+import tempfile
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.personalization_engine.chat_history import ChatHistoryStore, SQLiteHistoryBackend
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def user(text):
+    return {"role": "user", "content": text}
+
+def assistant(text):
+    return {"role": "assistant", "content": text}
+
+def test_history_survives_restart_and_is_trimmed():
+    """A new store (restart, or another worker) reads the same trimmed history"""
+    print("\n🔍 Testing durable history...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "history.sqlite3")
+        store = ChatHistoryStore(backend=SQLiteHistoryBackend(path), max_messages=4)
+        for turn in range(3):
+            store.append("CUST1", user(f"q{turn}"))
+            store.append("CUST1", assistant(f"a{turn}"))
+
+        expected = [user("q1"), assistant("a1"), user("q2"), assistant("a2")]
+        assert store.get("CUST1") == expected
+
+        other_worker = ChatHistoryStore(backend=SQLiteHistoryBackend(path), max_messages=4)
+        assert other_worker.get("CUST1") == expected
+        assert other_worker.get("NEW_CUSTOMER") == []
+
+        other_worker.clear("CUST1")
+        assert ChatHistoryStore(backend=SQLiteHistoryBackend(path)).get("CUST1") == []
+
+    print("✅ Durable history works")
+
+def test_memory_tier_is_bounded_and_refreshed():
+    """Least recently used histories leave memory; after the TTL, histories another worker wrote to are re-read"""
+    print("\n🔍 Testing the memory tier...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "history.sqlite3")
+        clock = FakeClock()
+        worker_a = ChatHistoryStore(backend=SQLiteHistoryBackend(path), max_customers=2, ttl=60, clock=clock)
+        worker_b = ChatHistoryStore(backend=SQLiteHistoryBackend(path), ttl=60, clock=clock)
+
+        for customer in ("C1", "C2", "C3"):
+            worker_a.append(customer, user(f"hello from {customer}"))
+        assert worker_a.stats()["customers_in_memory"] == 2
+
+        loads = worker_a.loads
+        assert worker_a.get("C1") == [user("hello from C1")], "Evicted history is read back"
+        assert worker_a.loads == loads + 1
+        worker_a.get("C1")
+        assert worker_a.loads == loads + 1, "Second read is served from memory"
+
+        worker_a.append("C1", assistant("reply"))
+        assert worker_a.get("C1") == [user("hello from C1"), assistant("reply")]
+        assert worker_a.loads == loads + 1, "Own appends extend the memory copy"
+
+        worker_b.append("C1", user("follow-up served by worker B"))
+        validations = worker_a.validations
+        assert len(worker_a.get("C1")) == 2, "Within the TTL worker A serves its memory copy"
+        assert worker_a.validations == validations, "...without asking the durable tier"
+        clock.now = 61
+        assert worker_a.get("C1")[-1] == user("follow-up served by worker B"), "After the TTL the copy is re-validated"
+        assert worker_a.validations == validations + 1 and worker_a.loads == loads + 2
+        worker_a.get("C1")
+        assert worker_a.validations == validations + 1, "A re-validated copy is trusted for another TTL"
+
+        worker_a.append("C1", assistant("answer from worker A"))
+        clock.now = 200
+        assert worker_b.get("C1") == worker_a.get("C1")
+        assert worker_a.get("C1")[-2:] == [user("follow-up served by worker B"), assistant("answer from worker A")]
+        loads = worker_a.loads
+        clock.now = 300
+        worker_a.get("C1")
+        assert worker_a.loads == loads, "An unchanged history is re-validated, not re-read"
+
+        memory_only = ChatHistoryStore(backend=None, max_customers=1)
+        memory_only.append("C1", user("hi"))
+        memory_only.append("C2", user("hi"))
+        assert memory_only.get("C1") == [] and memory_only.get("C2") == []
+
+    print("✅ Memory tier works")
+
+def main():
+    """Run all chat history tests"""
+    print("🚀 Starting Chat History Tests")
+    print("=" * 60)
+    test_history_survives_restart_and_is_trimmed()
+    test_memory_tier_is_bounded_and_refreshed()
+    print("\n🎉 All chat history tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Chat history test failed: {e}")
+        sys.exit(1)
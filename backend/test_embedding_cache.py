@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test Script for the on-disk EmbeddingCache
+Checks content addressing, hit/miss counters and LRU eviction (no API keys needed).
+"""
+
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.embedding_service.embedding_cache import EmbeddingCache
+
+def test_keys_are_content_addressed():
+    """Model, task type and text all take part in the key"""
+    print("\n🔍 Testing cache keys...")
+
+    key = EmbeddingCache.make_key("models/embedding-001", "RETRIEVAL_QUERY", "premium at 35")
+    assert key == EmbeddingCache.make_key("models/embedding-001", "RETRIEVAL_QUERY", "premium at 35")
+    assert key != EmbeddingCache.make_key("models/embedding-001", "RETRIEVAL_DOCUMENT", "premium at 35")
+    assert key != EmbeddingCache.make_key("models/text-embedding-004", "RETRIEVAL_QUERY", "premium at 35")
+
+    print("✅ Keys are content addressed")
+
+def test_round_trip_and_counters():
+    """Stored vectors survive reopening and lookups are counted"""
+    print("\n🔍 Testing cache round trip...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "cache.sqlite3")
+        vector = np.arange(8, dtype=np.float32)
+
+        cache = EmbeddingCache(path=path, max_entries=10)
+        assert cache.get("k1") is None
+        cache.put("k1", vector)
+        cache.close()
+
+        reopened = EmbeddingCache(path=path, max_entries=10)
+        assert np.array_equal(reopened.get("k1"), vector)
+        assert reopened.get_many(["k1", "k2"]).keys() == {"k1"}
+        stats = reopened.stats()
+        assert stats["hits"] == 2 and stats["misses"] == 1 and stats["entries"] == 1
+        reopened.close()
+
+    print("✅ Round trip and counters work")
+
+def test_lru_eviction():
+    """Least recently used entries are evicted first"""
+    print("\n🔍 Testing LRU eviction...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = EmbeddingCache(path=os.path.join(tmp_dir, "cache.sqlite3"), max_entries=10)
+        for i in range(10):
+            cache.put(f"k{i}", np.full(4, i, dtype=np.float32))
+        cache.get("k0")  # Touch the oldest entry so it survives eviction
+        cache.put("k10", np.zeros(4, dtype=np.float32))
+
+        assert cache.stats()["entries"] == 9
+        assert cache.get("k0") is not None
+        assert cache.get("k1") is None
+        assert cache.get("k10") is not None
+        cache.close()
+
+    print("✅ LRU eviction works")
+
+def main():
+    """Run all embedding cache tests"""
+    print("🚀 Starting EmbeddingCache Tests")
+    print("=" * 60)
+    test_keys_are_content_addressed()
+    test_round_trip_and_counters()
+    test_lru_eviction()
+    print("\n🎉 All EmbeddingCache tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ EmbeddingCache test failed: {e}")
+        sys.exit(1)
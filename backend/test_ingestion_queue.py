@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test Script for the interaction ingestion queue
+Uses a throwaway FAISS index and a local stand-in embedder (no API keys or database needed).
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.ingestion_queue import InteractionIngestionQueue
+from src.vector_database.vector_db_client import VectorDBClient, EMBEDDING_DIM
+
+class CountingEmbedder:
+    """Deterministic embeddings; records the size of every batch request"""
+
+    def __init__(self, fail_times=0, worker_gate=None):
+        self.batch_sizes = []
+        self.fail_times = fail_times
+        self.worker_gate = worker_gate  # Event the background worker waits on before embedding
+
+    def get_embeddings(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        if self.worker_gate is not None and threading.current_thread().name == "interaction-ingest":
+            self.worker_gate.wait()
+        if self.fail_times:
+            self.fail_times -= 1
+            return None
+        self.batch_sizes.append(len(texts))
+        return [np.random.default_rng(len(text)).random(EMBEDDING_DIM, dtype=np.float32) for text in texts]
+
+def test_turns_are_written_once_in_batches():
+    """Queued turns reach FAISS and the database writer once each, batched"""
+    print("\n🔍 Testing batched ingestion...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with VectorDBClient(index_file=os.path.join(tmp_dir, "test_index.idx"), flush_interval=3600) as client:
+            embedder = CountingEmbedder()
+            stored_batches = []
+            ingest = InteractionIngestionQueue(vector_db=client, embedding_generator=embedder,
+                                               store_batch=stored_batches.append, batch_size=4, flush_interval=0.2)
+
+            turn_ids = [ingest.submit("CUST1", f"question {i}", additional_metadata={"api_endpoint": "chat"}) for i in range(10)]
+            ingest.flush()
+
+            assert len(set(turn_ids)) == 10, "Turn IDs must be unique even within one second"
+            assert sum(embedder.batch_sizes) == 10
+            assert max(embedder.batch_sizes) <= 4 and len(embedder.batch_sizes) >= 3
+            assert [turn["conversation_turn_id"] for batch in stored_batches for turn in batch] == turn_ids
+            assert all(turn["faiss_stored"] for batch in stored_batches for turn in batch)
+
+            metadata = client.get_metadata(turn_ids[3])
+            assert metadata["customer_id"] == "CUST1" and metadata["text"] == "question 3"
+            assert metadata["api_endpoint"] == "chat"
+            listed = client.list_by_filter({"customer_id": "CUST1", "source": "interaction"})
+            assert len(listed) == 10
+            ingest.close()
+
+    print("✅ Batched ingestion works")
+
+def test_retries_and_drain_on_close():
+    """Failed stages are retried and close() writes everything still queued"""
+    print("\n🔍 Testing retries and drain...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with VectorDBClient(index_file=os.path.join(tmp_dir, "test_index.idx"), flush_interval=3600) as client:
+            embedder = CountingEmbedder(fail_times=1)
+            attempts = []
+
+            def flaky_store(batch):
+                attempts.append(len(batch))
+                if len(attempts) == 1:
+                    raise RuntimeError("connection reset")
+
+            ingest = InteractionIngestionQueue(vector_db=client, embedding_generator=embedder, store_batch=flaky_store,
+                                               batch_size=100, flush_interval=0.05, max_retries=2)
+
+            turn_ids = [ingest.submit("CUST2", f"turn {i}") for i in range(5)]
+            ingest.close()
+
+            assert all(turn_id in client for turn_id in turn_ids)
+            assert len(attempts) >= 2, "PostgreSQL stage should have been retried"
+            assert ingest.stats["written"] == 5 and ingest.stats["failed"] == 0
+
+            # Turns submitted after close are written by the caller
+            late_id = ingest.submit("CUST2", "late turn")
+            assert late_id in client
+
+    print("✅ Retries and drain work")
+
+def test_backpressure_writes_inline():
+    """A full queue makes the caller write its own turn instead of dropping it"""
+    print("\n🔍 Testing backpressure...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with VectorDBClient(index_file=os.path.join(tmp_dir, "test_index.idx"), flush_interval=3600) as client:
+            release = threading.Event()
+            embedder = CountingEmbedder(worker_gate=release)
+            ingest = InteractionIngestionQueue(vector_db=client, embedding_generator=embedder, store_batch=None,
+                                               max_size=1, batch_size=1, flush_interval=0, enqueue_timeout=0.05)
+
+            first = ingest.submit("CUST3", "one")    # Picked up by the worker, which blocks
+            time.sleep(0.1)
+            second = ingest.submit("CUST3", "two")   # Fills the queue
+            third = ingest.submit("CUST3", "three")  # Queue full: written inline
+            assert third in client and ingest.stats["written_inline"] == 1
+
+            release.set()
+            ingest.close()
+            assert first in client and second in client
+
+    print("✅ Backpressure works")
+
+def main():
+    """Run all ingestion queue tests"""
+    print("🚀 Starting Ingestion Queue Tests")
+    print("=" * 60)
+    test_turns_are_written_once_in_batches()
+    test_retries_and_drain_on_close()
+    test_backpressure_writes_inline()
+    print("\n🎉 All ingestion queue tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Ingestion queue test failed: {e}")
+        sys.exit(1)
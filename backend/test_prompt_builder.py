@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test Script for the token-budgeted RAG prompt builder
+Pure text assembly (no API keys needed); token counts use tiktoken when installed.
+"""
+
+import sys
+import os
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.personalization_engine.prompt_builder import PromptBuilder, count_tokens, truncate_to_tokens
+
+SYSTEM_PROMPT = "You are an AI assistant for SBI Life Insurance. Respond helpfully."
+USER_MESSAGE = "User query: What is the premium?\nuser_language: en"
+
+def words(count, word="premium"):
+    return " ".join([word] * count)
+
+def test_everything_fits_within_a_large_budget():
+    """Nothing is dropped when the budget is large enough, and context is ordered by relevance"""
+    print("\n🔍 Testing an unconstrained prompt...")
+
+    builder = PromptBuilder(max_tokens=10000, history_max_tokens=2000, context_max_tokens=5000, query_max_tokens=500)
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+    context = [("Context from PDF 'b.pdf':\nless relevant", 0.9), ("Context from PDF 'a.pdf':\nmost relevant", 0.1)]
+    messages, breakdown = builder.build(SYSTEM_PROMPT, history, context, USER_MESSAGE)
+
+    assert messages[0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert messages[1:3] == history
+    assert messages[3]["content"].index("a.pdf") < messages[3]["content"].index("b.pdf")
+    assert messages[-1] == {"role": "user", "content": USER_MESSAGE}
+    assert breakdown["history_messages"] == "2/2" and breakdown["context_chunks"] == "2/2"
+    assert breakdown["total"] == breakdown["system"] + breakdown["history"] + breakdown["context"] + breakdown["query"]
+
+    _, empty = builder.build(SYSTEM_PROMPT, [], [], USER_MESSAGE)
+    assert empty["context_chunks"] == "0/0"
+
+    print("✅ Unconstrained prompt works")
+
+def test_budget_drops_oldest_turns_and_least_relevant_context():
+    """Over budget, the oldest turns go first, then the least relevant chunks, with one chunk truncated"""
+    print("\n🔍 Testing budget enforcement...")
+
+    builder = PromptBuilder(max_tokens=1000, history_max_tokens=300, context_max_tokens=2000,
+                            query_max_tokens=100, min_chunk_tokens=50)
+    history = [{"role": "user" if index % 2 == 0 else "assistant", "content": words(100, f"turn{index}")} for index in range(6)]
+    context = [(words(300, f"chunk{rank}"), distance) for rank, distance in enumerate([0.5, 0.2, 0.9])]
+    messages, breakdown = builder.build(SYSTEM_PROMPT, history, context, USER_MESSAGE)
+
+    kept_history = messages[1:-2]
+    assert kept_history and kept_history == history[-len(kept_history):], "Newest turns are kept"
+    assert len(kept_history) < len(history)
+    assert breakdown["history"] <= 300
+
+    context_message = messages[-2]["content"]
+    assert "chunk1" in context_message and "chunk2" not in context_message, "Least relevant chunk is dropped"
+    assert breakdown["truncated_chunks"] == 1 and context_message.endswith("...")
+    assert breakdown["total"] <= 1000, breakdown
+
+    print("✅ Budget enforcement works")
+
+def test_query_and_text_truncation():
+    """Long queries are capped and truncation respects the token limit"""
+    print("\n🔍 Testing truncation...")
+
+    builder = PromptBuilder(query_max_tokens=20)
+    long_query = words(200, "insurance")
+    assert count_tokens(builder.fit_query(long_query)) <= 20
+    assert builder.fit_query("short question") == "short question"
+    assert count_tokens(truncate_to_tokens(long_query, 37)) <= 37
+    assert count_tokens("") == 0
+
+    print("✅ Truncation works")
+
+def main():
+    """Run all prompt builder tests"""
+    print("🚀 Starting Prompt Builder Tests")
+    print("=" * 60)
+    test_everything_fits_within_a_large_budget()
+    test_budget_drops_oldest_turns_and_least_relevant_context()
+    test_query_and_text_truncation()
+    print("\n🎉 All prompt builder tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Prompt builder test failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test Script for the semantic RAG response cache
+Uses hand-made embeddings and a fake clock (no API keys needed).
+"""
+
+import sys
+import os
+import numpy as np
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.personalization_engine.response_cache import SemanticResponseCache, context_fingerprint
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+MATCHES = [
+    {"id": "pdf_swadhan.pdf_chunk_0", "metadata": {"source": "pdf", "filename": "swadhan.pdf", "text": "Smart Swadhan Supreme..."}},
+    {"id": "CUST1_1700000000_ab12cd34", "metadata": {"source": "interaction", "customer_id": "CUST1", "text": "premium at 35?"}},
+]
+SOURCES = [(match["id"], match["metadata"]) for match in MATCHES]
+RESPONSE = {"response": "The premium starts at ...", "sentiment": "Neutral", "source": "RAG+OpenAI"}
+
+def near(vector, noise):
+    rng = np.random.default_rng(0)
+    return np.asarray(vector) + noise * rng.standard_normal(len(vector))
+
+def test_similar_queries_hit_within_threshold():
+    """A near-identical query with the same language and context reuses the answer"""
+    print("\n🔍 Testing similarity lookups...")
+
+    cache = SemanticResponseCache(threshold=0.95, ttl=60, max_entries=10, clock=FakeClock())
+    query = np.random.default_rng(1).random(768)
+    fingerprint = context_fingerprint(MATCHES)
+    assert fingerprint == context_fingerprint(list(reversed(MATCHES))), "Match order must not matter"
+
+    cache.store(query, "en", fingerprint, RESPONSE, SOURCES, query_text="premium for Smart Swadhan Supreme at 35")
+    hit = cache.lookup(near(query, 0.01), "en", fingerprint)
+    assert hit["response"] == RESPONSE["response"] and hit["cached"] and hit["cache_similarity"] >= 0.95
+    hit["response"] = "changed by caller"
+    assert cache.lookup(query, "en", fingerprint)["response"] == RESPONSE["response"], "Hits are copies"
+
+    assert cache.lookup(query, "hi", fingerprint) is None, "Different language"
+    changed = [dict(MATCHES[0], metadata=dict(MATCHES[0]["metadata"], text="new brochure text"))]
+    assert cache.lookup(query, "en", context_fingerprint(changed)) is None, "Different context"
+    assert cache.lookup(np.random.default_rng(2).random(768) - 0.5, "en", fingerprint) is None, "Different question"
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 3
+    assert stats["top_entries"][0]["hits"] == 2
+
+    print("✅ Similarity lookups work")
+
+def test_ttl_eviction_and_invalidation():
+    """Entries expire, are evicted LRU-first, and are dropped when their documents change"""
+    print("\n🔍 Testing expiry and invalidation...")
+
+    clock = FakeClock()
+    cache = SemanticResponseCache(threshold=0.9, ttl=60, max_entries=2, clock=clock)
+    vectors = np.eye(4)
+    for index in range(2):
+        cache.store(vectors[index], "en", "fp", RESPONSE, SOURCES)
+
+    clock.now = 61
+    assert cache.lookup(vectors[0], "en", "fp") is None
+    assert cache.stats()["entries"] == 0, "Expired entries are removed on lookup"
+
+    for index in range(3):
+        cache.store(vectors[index], "en", "fp", RESPONSE, SOURCES if index else SOURCES[:1])
+    assert cache.stats()["entries"] == 2 and cache.lookup(vectors[0], "en", "fp") is None
+
+    assert cache.invalidate(lambda vector_id, metadata: metadata.get("customer_id") == "CUST1") == 2
+    cache.store(vectors[3], "en", "fp", RESPONSE, SOURCES[:1])
+    assert cache.invalidate(lambda vector_id, metadata: metadata.get("filename") == "other.pdf") == 0
+    assert cache.invalidate(lambda vector_id, metadata: metadata.get("filename") == "swadhan.pdf") == 1
+    assert cache.stats()["entries"] == 0
+
+    print("✅ Expiry and invalidation work")
+
+def main():
+    """Run all response cache tests"""
+    print("🚀 Starting Response Cache Tests")
+    print("=" * 60)
+    test_similar_queries_hit_within_threshold()
+    test_ttl_eviction_and_invalidation()
+    print("\n🎉 All response cache tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Response cache test failed: {e}")
+        sys.exit(1)
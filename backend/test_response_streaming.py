@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test Script for the SSE response streaming helpers
+Feeds canned LLM output in random chunks (no API keys needed).
+"""
+
+import sys
+import os
+import json
+import random
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.response_streaming import MarkdownStreamCleaner, ParagraphStreamer, sse_event, strip_markdown
+
+SAMPLE_ANSWER = (
+    "\n\nHello **Rohan**, here are your options:\n\n"
+    "* **SBI Life Smart Swadhan** with `return of premium` and _flexible_ terms.\n"
+    "* Premiums from policy_term 10 onwards\n"
+    "- Tax benefits\n\n"
+    "Sentiment: the word at the start of a line that is not the last\n"
+    "Shall we continue?\n\n"
+    "Sentiment: Positive\n"
+)
+
+def stream_in_chunks(cleaner, text, rng):
+    """Feeds text in random 1-6 character chunks; returns every piece of output"""
+    pieces, position = [], 0
+    while position < len(text):
+        size = rng.randint(1, 6)
+        pieces.append(cleaner.feed(text[position:position + size]))
+        position += size
+    pieces.append(cleaner.finish())
+    return pieces
+
+def test_streamed_text_matches_full_cleanup():
+    """Streaming output equals the markdown-stripped answer without its sentiment trailer"""
+    print("\n🔍 Testing incremental markdown cleanup...")
+
+    lines = SAMPLE_ANSWER.strip().split("\n")
+    expected = strip_markdown("\n".join(lines[:-1]).strip())
+    assert "**" not in expected and "`" not in expected and "- SBI Life Smart Swadhan" in expected
+
+    rng = random.Random(7)
+    for _ in range(200):
+        cleaner = MarkdownStreamCleaner()
+        streamed = "".join(stream_in_chunks(cleaner, SAMPLE_ANSWER, rng))
+        assert streamed == expected, f"{streamed!r} != {expected!r}"
+        assert cleaner.raw_text == SAMPLE_ANSWER
+
+    print("✅ Incremental cleanup matches full cleanup")
+
+def test_text_is_released_before_the_end():
+    """Words are forwarded as soon as their markers are balanced, not at end of line"""
+    print("\n🔍 Testing early release...")
+
+    cleaner = MarkdownStreamCleaner()
+    assert cleaner.feed("Your **cover") == "Your"            # Unclosed bold is held back
+    assert cleaner.feed(" amount** is ") == " cover amount is"
+    assert cleaner.feed("ten lakh") == " ten"                # "lakh" may still be growing
+    assert cleaner.feed(".\nSentiment: Neu") == " lakh."
+    assert cleaner.feed("tral") == ""                        # Possible trailer is never shown
+    assert cleaner.finish() == ""
+
+    print("✅ Early release works")
+
+def test_paragraph_streamer_and_sse_format():
+    """Paragraphs are formatted as they complete; events are valid SSE frames"""
+    print("\n🔍 Testing paragraph streaming and SSE frames...")
+
+    streamer = ParagraphStreamer(str.upper)
+    assert streamer.feed("first para") == []
+    assert streamer.feed("graph\n\nsecond") == ["FIRST PARAGRAPH"]
+    assert streamer.feed("\n\n\n\n") == ["SECOND"]
+    assert streamer.finish() == []
+
+    frame = sse_event("token", {"text": "line one\nline two"})
+    assert frame.startswith("event: token\ndata: ") and frame.endswith("\n\n")
+    assert json.loads(frame.split("data: ", 1)[1]) == {"text": "line one\nline two"}
+
+    print("✅ Paragraph streaming and SSE frames work")
+
+def main():
+    """Run all response streaming tests"""
+    print("🚀 Starting Response Streaming Tests")
+    print("=" * 60)
+    test_streamed_text_matches_full_cleanup()
+    test_text_is_released_before_the_end()
+    test_paragraph_streamer_and_sse_format()
+    print("\n🎉 All response streaming tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Response streaming test failed: {e}")
+        sys.exit(1)
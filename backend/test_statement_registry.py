@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test Script for the PostgreSQL statement registry
+Uses an in-memory stand-in for an asyncpg connection (no database needed).
+"""
+
+import sys
+import os
+import asyncio
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.statement_registry import StatementRegistry
+
+SCHEMA = {
+    "customers": ["id", "customer_id", "first_name", "last_name", "updated_at"],
+    "customer_preferences": ["id", "customer_id", "preference_type", "preference_value", "confidence_score"],
+}
+
+class SchemaConnection:
+    """Answers the information_schema query and counts how often it is asked"""
+
+    def __init__(self):
+        self.schema_reads = 0
+
+    async def fetch(self, query, *args):
+        assert "information_schema.columns" in query
+        self.schema_reads += 1
+        return [{"table_name": table, "column_name": column} for table, columns in SCHEMA.items() for column in columns]
+
+def test_sql_is_generated_once_per_shape():
+    """Same shape, same SQL text (so asyncpg reuses its prepared statement); the schema is read once"""
+    print("\n🔍 Testing statement generation...")
+
+    async def scenario():
+        connection = SchemaConnection()
+        registry = StatementRegistry()
+
+        insert = await registry.insert_sql(connection, "customers", ["customer_id", "first_name"])
+        assert insert == 'INSERT INTO "customers" ("customer_id", "first_name") VALUES ($1, $2) RETURNING *'
+        assert await registry.insert_sql(connection, "customers", ["customer_id", "first_name"]) is insert
+
+        update = await registry.update_sql(connection, "customers", ["first_name", "last_name"], "customer_id = $1", 1)
+        assert update == ('UPDATE "customers" SET "first_name" = $2, "last_name" = $3, "updated_at" = CURRENT_TIMESTAMP '
+                          'WHERE customer_id = $1 RETURNING *')
+        preferences = await registry.update_sql(connection, "customer_preferences", ["confidence_score"],
+                                                "customer_id = $1 AND preference_type = $2", 2)
+        assert '"confidence_score" = $3' in preferences and "updated_at" not in preferences
+
+        assert connection.schema_reads == 1
+        assert registry.stats()["statements"] == 3
+
+    asyncio.run(scenario())
+    print("✅ Statement generation works")
+
+def test_unknown_identifiers_are_rejected():
+    """Table and column names that are not in the schema never reach the SQL"""
+    print("\n🔍 Testing identifier checks...")
+
+    async def scenario():
+        now = [0.0]
+        connection = SchemaConnection()
+        registry = StatementRegistry(max_statements=2, clock=lambda: now[0])
+
+        for table, columns in [("customers; DROP TABLE customers", ["customer_id"]),
+                               ("customers", ["customer_id) VALUES ('x'); --"]),
+                               ("customers", ["password"])]:
+            try:
+                await registry.insert_sql(connection, table, columns)
+                assert False, f"{table!r} / {columns!r} should be rejected"
+            except ValueError:
+                pass
+        assert connection.schema_reads == 1, "Unknown tables re-read the schema at most once a minute"
+
+        now[0] = 61
+        try:
+            await registry.insert_sql(connection, "new_table", ["id"])
+        except ValueError:
+            pass
+        assert connection.schema_reads == 2
+
+        for table in ("customers", "customer_preferences", "customers"):
+            await registry.insert_sql(connection, table, ["customer_id"])
+        assert registry.stats()["statements"] == 2, "Registry size is bounded"
+
+    asyncio.run(scenario())
+    print("✅ Identifier checks work")
+
+def main():
+    """Run all statement registry tests"""
+    print("🚀 Starting Statement Registry Tests")
+    print("=" * 60)
+    test_sql_is_generated_once_per_shape()
+    test_unknown_identifiers_are_rejected()
+    print("\n🎉 All statement registry tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Statement registry test failed: {e}")
+        sys.exit(1)
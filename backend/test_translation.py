@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test Script for the cached, chunked translation layer in LanguageService
+Uses a local stand-in translator and a throwaway cache file (no network needed).
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.language_service import LanguageService
+from src.utils.translation_cache import TranslationCache
+
+class UpperCaseTranslator:
+    """Translates by upper-casing; records every request and how many instances exist"""
+    instances = 0
+    requests = []
+    lock = threading.Lock()
+
+    def __init__(self, source, target, delay=0.0):
+        self.source, self.target, self.delay = source, target, delay
+        with UpperCaseTranslator.lock:
+            UpperCaseTranslator.instances += 1
+
+    def translate(self, text):
+        with UpperCaseTranslator.lock:
+            UpperCaseTranslator.requests.append(text)
+        time.sleep(self.delay)
+        return text.upper()
+
+def reset_translator():
+    UpperCaseTranslator.instances = 0
+    UpperCaseTranslator.requests = []
+
+def test_cache_and_translator_reuse():
+    """Repeated texts are served from memory, then from disk across service instances"""
+    print("\n🔍 Testing translation caching...")
+
+    reset_translator()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, "translations.sqlite3")
+        service = LanguageService(cache=TranslationCache(path=cache_path), translator_factory=UpperCaseTranslator)
+
+        assert service.translate_from_english("term plan", "hi") == "TERM PLAN"
+        assert service.translate_from_english("term plan", "hi") == "TERM PLAN"
+        assert service.translate_from_english("ulip", "hi") == "ULIP"
+        assert service.translate_to_english("term plan", "en") == "term plan"  # No-op for English
+        assert UpperCaseTranslator.requests == ["term plan", "ulip"]
+        assert UpperCaseTranslator.instances == 1, "One translator per thread and language pair"
+        assert service.translation_stats()["memory"]["hits"] == 1
+
+        restarted = LanguageService(cache=TranslationCache(path=cache_path), translator_factory=UpperCaseTranslator)
+        assert restarted.translate_from_english("term plan", "hi") == "TERM PLAN"
+        assert len(UpperCaseTranslator.requests) == 2
+        assert restarted.translation_stats()["disk"]["hits"] == 1
+
+    print("✅ Translation caching works")
+
+def test_long_text_is_chunked_with_layout_intact():
+    """Long answers are translated in parallel chunks and keep bullets, indentation and blank lines"""
+    print("\n🔍 Testing chunked translation...")
+
+    reset_translator()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        service = LanguageService(cache=TranslationCache(path=os.path.join(tmp_dir, "t.sqlite3")),
+                                  translator_factory=UpperCaseTranslator, chunk_chars=40, max_concurrency=4)
+        answer = (
+            "PRODUCT OVERVIEW:\nA savings plan with a return of premium.\n\n"
+            "KEY BENEFITS:\n  • Life cover for the full term\n  • Premiums returned at maturity\n\n"
+            "1. Apply online\n2. Complete KYC"
+        )
+        translated = service.translate_from_english(answer, "ta")
+
+        expected_lines = []
+        for line in answer.split("\n"):
+            for prefix in ("  • ", "1. ", "2. "):
+                if line.startswith(prefix):
+                    expected_lines.append(prefix + line[len(prefix):].upper())
+                    break
+            else:
+                expected_lines.append(line.upper())
+        assert translated == "\n".join(expected_lines)
+        assert len(UpperCaseTranslator.requests) > 1, "Text longer than chunk_chars should be split"
+        assert all(len(request) <= 40 or "\n" not in request for request in UpperCaseTranslator.requests)
+        assert not any(request.startswith(("  ", "•", "1.")) for request in UpperCaseTranslator.requests)
+
+    print("✅ Chunked translation works")
+
+def test_concurrent_requests_share_one_call():
+    """Simultaneous translations of the same text make a single translator call"""
+    print("\n🔍 Testing in-flight request collapsing...")
+
+    reset_translator()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        service = LanguageService(cache=TranslationCache(path=os.path.join(tmp_dir, "t.sqlite3")),
+                                  translator_factory=lambda source, target: UpperCaseTranslator(source, target, delay=0.2))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.translate_to_english("namaste", "hi")))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["NAMASTE"] * 8
+        assert UpperCaseTranslator.requests == ["namaste"]
+
+    print("✅ In-flight request collapsing works")
+
+def main():
+    """Run all translation tests"""
+    print("🚀 Starting Translation Tests")
+    print("=" * 60)
+    test_cache_and_translator_reuse()
+    test_long_text_is_chunked_with_layout_intact()
+    test_concurrent_requests_share_one_call()
+    print("\n🎉 All translation tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ Translation test failed: {e}")
+        sys.exit(1)
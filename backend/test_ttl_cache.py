@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test Script for the in-memory TTL cache used in front of Exa web search
+Uses a fake clock, so no waiting and no API keys are needed.
+"""
+
+import sys
+import os
+import threading
+import time
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.ttl_cache import TTLCache, normalize_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_normalized_keys_and_ttl():
+    """Equivalent queries share an entry; entries expire after ttl + stale_ttl"""
+    print("\n🔍 Testing query normalisation and expiry...")
+
+    assert normalize_query("  What is  Smart Swadhan?? ") == normalize_query("what is smart swadhan")
+    assert normalize_query("Ｓｍａｒｔ Swadhan") == "smart swadhan"
+
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, max_entries=10, name="test", clock=clock)
+    loads = []
+    loader = lambda: loads.append(1) or f"result {len(loads)}"
+
+    assert cache.get_or_load(normalize_query("Term plan?"), loader) == "result 1"
+    assert cache.get_or_load(normalize_query("term PLAN"), loader) == "result 1"
+    clock.now = 61
+    assert cache.get_or_load(normalize_query("term plan"), loader) == "result 2"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["hit_rate"] == round(1 / 3, 4)
+
+    print("✅ Normalisation and expiry work")
+
+def test_stale_while_revalidate():
+    """A stale entry is served at once while a single background refresh replaces it"""
+    print("\n🔍 Testing stale-while-revalidate...")
+
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, max_entries=10, stale_ttl=100, name="test", clock=clock)
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)  # Slow refresh
+        return f"v{len(calls)}"
+
+    assert cache.get_or_load("q", loader) == "v1"
+    clock.now = 20
+    assert cache.get_or_load("q", loader) == "v1"   # Stale, refresh started
+    assert cache.get_or_load("q", loader) == "v1"   # Still stale, no second refresh
+    release.set()
+
+    deadline = time.time() + 5
+    while cache.stats()["refreshes"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(calls) == 2
+    assert cache.get_or_load("q", loader) == "v2"
+    assert cache.stats()["stale_hits"] == 2
+
+    print("✅ Stale-while-revalidate works")
+
+def test_lru_eviction_and_failed_loads():
+    """The least recently used entry is evicted first; failed loads are not cached"""
+    print("\n🔍 Testing LRU eviction and failures...")
+
+    cache = TTLCache(ttl=60, max_entries=2, name="test", clock=FakeClock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get_or_load("a", lambda: None)     # Touch "a"
+    cache.put("c", 3)                        # Evicts "b"
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+    assert cache.get_or_load("b", lambda: "reloaded") == "reloaded"
+
+    def failing_loader():
+        raise RuntimeError("exa down")
+    try:
+        cache.get_or_load("d", failing_loader)
+        assert False, "Loader error should propagate"
+    except RuntimeError:
+        pass
+    assert cache.get_or_load("d", lambda: "ok") == "ok"
+
+    clock = FakeClock()
+    read_through = TTLCache(ttl=60, max_entries=2, name="test", clock=clock)
+    assert read_through.get("profile") is None
+    read_through.put("profile", {"rows": []})
+    assert read_through.get("profile") == {"rows": []}
+    read_through.invalidate("profile")
+    assert read_through.get("profile") is None
+    read_through.put("profile", {"rows": []})
+    clock.now = 61
+    assert read_through.get("profile") is None, "get() only returns fresh entries"
+
+    print("✅ LRU eviction and failed loads work")
+
+def main():
+    """Run all TTL cache tests"""
+    print("🚀 Starting TTL Cache Tests")
+    print("=" * 60)
+    test_normalized_keys_and_ttl()
+    test_stale_while_revalidate()
+    test_lru_eviction_and_failed_loads()
+    print("\n🎉 All TTL cache tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ TTL cache test failed: {e}")
+        sys.exit(1)
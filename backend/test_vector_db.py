@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Test Script for the FAISS VectorDBClient
+Exercises persistence and search against a throwaway index file (no API keys needed).
+"""
+
+import sys
+import os
+import tempfile
+import pickle
+import numpy as np
+
+# Add the backend directory to Python path so `src.` imports resolve
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import faiss
+from src.vector_database import index_factory, vector_db_client
+from src.vector_database.vector_db_client import VectorDBClient, EMBEDDING_DIM, get_vector_db_client
+from src.vector_database.sharded_vector_db_client import ShardedVectorDBClient
+
+def _random_vectors(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((count, EMBEDDING_DIM), dtype=np.float32)
+
+def test_write_behind_flush():
+    """Upserts stay in memory until flush() writes them to disk"""
+    print("\n🔍 Testing write-behind persistence...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        client = VectorDBClient(index_file=index_file, write_behind=True,
+                                flush_interval=3600, flush_max_pending=1000)
+
+        vectors = _random_vectors(3)
+        for i, vector in enumerate(vectors):
+            assert client.upsert_embedding(f"vec_{i}", vector.tolist(), {"text": f"chunk {i}"})
+
+        assert not os.path.exists(index_file), "Index should not be written before flush"
+        assert client.flush()
+        assert os.path.exists(index_file)
+
+        reloaded = VectorDBClient(index_file=index_file)
+        assert reloaded.index.ntotal == 3
+        assert reloaded.get_metadata("vec_1")["text"] == "chunk 1"
+        client.close()
+        reloaded.close()
+
+    print("✅ Write-behind flush works")
+
+def test_flush_on_pending_threshold():
+    """Reaching flush_max_pending persists without an explicit flush"""
+    print("\n🔍 Testing pending-size flush threshold...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        with VectorDBClient(index_file=index_file, flush_interval=3600, flush_max_pending=2) as client:
+            vectors = _random_vectors(2, seed=1)
+            client.upsert_embedding("a", vectors[0].tolist(), {})
+            assert not os.path.exists(index_file)
+            client.upsert_embedding("b", vectors[1].tolist(), {})
+            assert os.path.exists(index_file), "Threshold should trigger a flush"
+
+    print("✅ Threshold flush works")
+
+def test_bulk_upsert_and_query():
+    """A block upsert adds every new row once and replaces existing IDs in place"""
+    print("\n🔍 Testing bulk upsert and query...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        with VectorDBClient(index_file=index_file, flush_interval=3600) as client:
+            vectors = _random_vectors(5, seed=2)
+            ids = [f"chunk_{i}" for i in range(5)]
+            metadatas = [{"text": f"text {i}"} for i in range(5)]
+
+            assert client.upsert_embeddings(ids, vectors, metadatas) == 5
+            assert client.upsert_embeddings(ids[:2], vectors[3:5], [{"text": "new 0"}, {"text": "new 1"}]) == 2
+            assert client.index.ntotal == 5
+            # A repeated ID is written once, with its last row
+            assert client.upsert_embeddings(["chunk_0", "chunk_0"], vectors[3:5], [{"text": "old"}, {"text": "new 0"}]) == 1
+            assert client.index.ntotal == 5
+            assert client.get_metadata("chunk_0")["text"] == "new 0"
+
+            results = client.query_similar_embeddings(vectors[3].tolist(), top_k=1)
+            assert results["matches"][0]["id"] == "chunk_3"
+
+    print("✅ Bulk upsert works")
+
+def test_shared_client_hot_reload():
+    """The registry shares one client per file and picks up writes from other processes"""
+    print("\n🔍 Testing shared client and hot reload...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        shared = get_vector_db_client(index_file)
+        assert get_vector_db_client(index_file) is shared
+
+        # A second client on the same file stands in for another worker process
+        with VectorDBClient(index_file=index_file, write_behind=False) as other_process:
+            other_process.upsert_embedding("remote_vec", _random_vectors(1, seed=3)[0].tolist(), {"text": "remote"})
+
+        assert shared.reload_if_changed(force=True)
+        assert shared.generation == 1
+        assert "remote_vec" in shared
+        assert not shared.reload_if_changed(force=True)
+        shared.close()
+
+    print("✅ Shared client reloads changed index")
+
+def test_clients_share_the_store():
+    """Clients on the same files (stand-ins for worker processes) never block, collide or drop each other's writes"""
+    print("\n🔍 Testing writers in several processes...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        vectors = _random_vectors(7, seed=11)
+        first = VectorDBClient(index_file=index_file, flush_interval=3600)
+        second = VectorDBClient(index_file=index_file, flush_interval=3600)
+
+        # Writes are committed per call, so the other client's write does not wait on a lock
+        assert first.upsert_embeddings(["a0", "a1", "a2"], vectors[:3], [{"customer_id": "A"}] * 3) == 3
+        assert second.upsert_embeddings(["b0", "b1", "b2"], vectors[3:6], [{"customer_id": "B"}] * 3) == 3
+        assert first.upsert_embedding("a3", vectors[6].tolist(), {"customer_id": "A"})
+        assert len(np.unique(first.metadata.live_int_ids())) == 7
+
+        # A save includes rows the saving client has not seen yet
+        assert second.flush()
+        assert faiss.read_index(index_file).ntotal == 7
+        assert second.query_similar_embeddings(vectors[6].tolist(), top_k=1)["matches"][0]["id"] == "a3"
+
+        # Vectors deleted by another client are no longer returned
+        assert first.delete(["b0"]) == 1
+        assert second.query_similar_embeddings(vectors[3].tolist(), top_k=1)["matches"][0]["id"] != "b0"
+        first.close()
+        second.close()
+
+        with VectorDBClient(index_file=index_file) as reopened:
+            assert reopened.metadata.count() == 6
+            assert reopened.query_similar_embeddings(vectors[0].tolist(), top_k=1)["matches"][0]["id"] == "a0"
+
+    print("✅ Writers share the store")
+
+def test_ivf_trains_after_enough_vectors():
+    """An IVF spec searches exactly until it can be trained, then is rebuilt in the background"""
+    print("\n🔍 Testing automatic IVF training...")
+
+    original_minimum = index_factory.FAISS_ANN_MIN_TRAIN_VECTORS
+    index_factory.FAISS_ANN_MIN_TRAIN_VECTORS = 500
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_file = os.path.join(tmp_dir, "test_index.idx")
+            with VectorDBClient(index_file=index_file, flush_interval=3600, index_spec="IVF{nlist},Flat") as client:
+                assert client.active_spec == index_factory.FLAT_SPEC
+
+                vectors = _random_vectors(800, seed=4)
+                client.upsert_embeddings([f"v{i}" for i in range(800)], vectors, [{} for _ in range(800)])
+                client._rebuild_thread.join()
+
+                assert client.active_spec.startswith("IVF")
+                assert client.index.ntotal == 800
+                assert client.last_recall["recall_at_10"] > 0.5
+                assert client.query_similar_embeddings(vectors[10].tolist(), top_k=1)["matches"][0]["id"] == "v10"
+
+            reloaded = VectorDBClient(index_file=index_file, index_spec="IVF{nlist},Flat")
+            assert reloaded.active_spec.startswith("IVF")
+            assert reloaded.evaluate_recall()["vectors"] == 800
+            reloaded.close()
+    finally:
+        index_factory.FAISS_ANN_MIN_TRAIN_VECTORS = original_minimum
+
+    print("✅ IVF index trained and reloaded")
+
+def test_filtered_search():
+    """Filters restrict search to matching vectors, both exactly and through an IDSelector"""
+    print("\n🔍 Testing metadata-filtered search...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        with VectorDBClient(index_file=index_file, flush_interval=3600, index_spec="HNSW32") as client:
+            vectors = _random_vectors(30, seed=7)
+            metadatas = ([{"source": "pdf", "filename": "brochure.pdf", "chunk_index": i} for i in range(10)]
+                         + [{"source": "brochure_v1.pdf", "chunk": i} for i in range(10)]  # Startup loader's older format
+                         + [{"customer_id": "CUST001" if i % 2 else "CUST002", "language": "hi"} for i in range(10)])
+            client.upsert_embeddings([f"v{i}" for i in range(30)], vectors, metadatas)
+
+            for exact_limit in (4096, 0):  # Exact scan of the sidecar, then IDSelector pre-filtering
+                vector_db_client.FAISS_EXACT_FILTER_MAX_IDS = exact_limit
+                pdf_matches = client.query_similar_embeddings(vectors[25].tolist(), top_k=5, filter={"source": "pdf"})["matches"]
+                assert len(pdf_matches) == 5 and all(int(m["id"][1:]) < 20 for m in pdf_matches)
+
+                own = client.query_similar_embeddings(vectors[25].tolist(), top_k=10, filter={"customer_id": "CUST001"})["matches"]
+                assert [m["id"] for m in own][0] == "v25"
+                assert len(own) == 5 and all(m["metadata"]["customer_id"] == "CUST001" for m in own)
+
+                legacy = client.query_similar_embeddings(vectors[12].tolist(), top_k=3, filter={"document": ["brochure_v1.pdf"]})["matches"]
+                assert legacy[0]["id"] == "v12"
+            vector_db_client.FAISS_EXACT_FILTER_MAX_IDS = 4096
+
+            assert client.query_similar_embeddings(vectors[0].tolist(), filter={"customer_id": "nobody"})["matches"] == []
+            history = client.list_by_filter({"customer_id": "CUST002", "source": "interaction"}, limit=2)
+            assert [entry["id"] for entry in history] == ["v28", "v26"]
+
+    print("✅ Filtered search works")
+
+def test_query_batch():
+    """One batched search returns the same matches as per-query searches"""
+    print("\n🔍 Testing batched multi-query search...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        with VectorDBClient(index_file=index_file, flush_interval=3600) as client:
+            vectors = _random_vectors(50, seed=8)
+            metadatas = [{"customer_id": f"CUST{i % 3}"} for i in range(50)]
+            client.upsert_embeddings([f"v{i}" for i in range(50)], vectors, metadatas)
+            client.delete(["v3"])
+
+            results = client.query_batch(vectors[:10], top_k=4)
+            assert len(results) == 10
+            for i, result in enumerate(results):
+                single = client.query_similar_embeddings(vectors[i].tolist(), top_k=4)
+                assert [m["id"] for m in result["matches"]] == [m["id"] for m in single["matches"]]
+            assert "v3" not in [m["id"] for m in results[3]["matches"]]
+
+            per_query = client.query_batch(vectors[:3], top_k=2, filters=[{"customer_id": "CUST1"}, None, {"customer_id": "CUST1"}])
+            assert all(m["metadata"]["customer_id"] == "CUST1" for m in per_query[0]["matches"] + per_query[2]["matches"])
+            assert per_query[1]["matches"][0]["id"] == "v1"
+
+    print("✅ Batched search works")
+
+def test_sharded_client():
+    """Documents and per-customer shards are searched in parallel with merged top-k"""
+    print("\n🔍 Testing sharded vector store...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        vectors = _random_vectors(40, seed=9)
+        ids = [f"v{i}" for i in range(40)]
+        metadatas = ([{"source": "pdf", "filename": "brochure.pdf"} for _ in range(10)]
+                     + [{"customer_id": f"CUST{i % 6}", "timestamp": f"2024-01-01 00:00:{i:02d}"} for i in range(30)])
+
+        with VectorDBClient(index_file=os.path.join(tmp_dir, "single.idx"), flush_interval=3600) as single, \
+             ShardedVectorDBClient(index_file=index_file, num_shards=3, flush_interval=3600) as sharded:
+            assert single.upsert_embeddings(ids, vectors, metadatas) == 40
+            assert sharded.upsert_embeddings(ids, vectors, metadatas) == 40
+            assert sharded.documents.metadata.count() == 10
+            assert sum(shard.metadata.count() for shard in sharded.interaction_shards) == 30
+
+            expected = single.query_batch(vectors[:8], top_k=5)
+            merged = sharded.query_batch(vectors[:8], top_k=5)
+            assert [[m["id"] for m in r["matches"]] for r in merged] == [[m["id"] for m in r["matches"]] for r in expected]
+
+            own = sharded.query_similar_embeddings(vectors[13].tolist(), top_k=10, filter={"customer_id": "CUST3"})["matches"]
+            assert own[0]["id"] == "v13" and all(m["metadata"]["customer_id"] == "CUST3" for m in own)
+            assert [e["id"] for e in sharded.list_by_filter({"customer_id": "CUST3"}, limit=2)] == ["v37", "v31"]
+            assert sharded.count_by_filter({"customer_id": "CUST3"}) == 5
+
+            # Re-assigning a turn to another customer moves it between shards
+            sharded.upsert_embedding("v13", vectors[13].tolist(), {"customer_id": "CUST4"})
+            assert sum("v13" in shard for shard in sharded.shards) == 1
+            assert sharded.get_metadata("v13")["customer_id"] == "CUST4"
+
+            # Writes only reach the shards that hold or receive the IDs
+            writes = []
+            for shard in sharded.shards:
+                def counted_write(shard=shard, write=shard._write):
+                    writes.append(shard)
+                    return write()
+                shard._write = counted_write
+            sharded.upsert_embedding("v20", vectors[20].tolist(), metadatas[20])
+            assert writes == [sharded.shard_for(metadatas[20])]
+            writes.clear()
+            moved_metadata = {"customer_id": "CUST4", "timestamp": "2024-01-02 00:00:00"}
+            assert sharded.upsert_embeddings(["v1", "v20"], vectors[[1, 20]], [moved_metadata, metadatas[20]]) == 2
+            assert {id(shard) for shard in writes} == {id(sharded.shard_for(moved_metadata)), id(sharded.shard_for(metadatas[20])), id(sharded.documents)}
+            assert sum("v1" in shard for shard in sharded.shards) == 1
+            assert sharded.delete_by_filter({"customer_id": "CUST4"}) == 7
+
+            # A failed shard is reported as a failed call; copies elsewhere are not deleted
+            failing = sharded.shard_for({"customer_id": "CUST0"})
+            failing.upsert_embeddings = lambda *args: 0
+            other_customer = next(f"CUST{i}" for i in range(1, 6) if sharded.shard_for_customer(f"CUST{i}") is not failing)
+            assert sharded.upsert_embeddings(
+                ["v2", "v0"], vectors[[2, 0]], [{"customer_id": other_customer}, {"customer_id": "CUST0"}]
+            ) == 0
+            assert "v2" in sharded.documents, "The moved ID's old copy is kept when the call fails"
+
+        assert os.path.exists(os.path.join(tmp_dir, "test_index.interactions-2-of-3.idx"))
+
+    print("✅ Sharded store works")
+
+def test_delete_and_compaction():
+    """Deleted vectors disappear from results and compaction drops their stored rows"""
+    print("\n🔍 Testing delete, delete_by_filter and compaction...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        with VectorDBClient(index_file=index_file, flush_interval=3600, index_spec="HNSW32") as client:
+            vectors = _random_vectors(20, seed=6)
+            metadatas = [{"customer_id": "CUST001" if i < 5 else "CUST002"} for i in range(20)]
+            client.upsert_embeddings([f"v{i}" for i in range(20)], vectors, metadatas)
+
+            assert client.delete(["v10", "missing"]) == 1
+            assert client.delete_by_filter({"customer_id": "CUST001"}) == 5
+            matches = client.query_similar_embeddings(vectors[10].tolist(), top_k=20)["matches"]
+            assert len(matches) == 14
+            assert all(match["metadata"]["customer_id"] == "CUST002" for match in matches)
+
+            # HNSW keeps tombstones until the background compaction triggered by the deletes
+            if client._rebuild_thread is not None:
+                client._rebuild_thread.join()
+            assert client.compact()
+            assert client.index.ntotal == 14
+            assert client.raw_vectors.count == 14
+
+        reloaded = VectorDBClient(index_file=index_file, index_spec="HNSW32")
+        assert "v10" not in reloaded
+        assert reloaded.query_similar_embeddings(vectors[11].tolist(), top_k=1)["matches"][0]["id"] == "v11"
+        reloaded.close()
+
+    print("✅ Delete and compaction work")
+
+def test_failed_load_keeps_stored_vectors():
+    """An index that cannot be loaded is never reset on disk; it is rebuilt from the sidecar on request"""
+    print("\n🔍 Testing failed index loads...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        vectors = _random_vectors(6, seed=10)
+        with VectorDBClient(index_file=index_file, flush_interval=3600) as client:
+            client.upsert_embeddings([f"v{i}" for i in range(6)], vectors, [{} for _ in range(6)])
+
+        shared = VectorDBClient(index_file=index_file, flush_interval=3600)
+        with open(index_file, 'wb') as f:
+            f.write(b"not a faiss index")
+
+        # A failed reload keeps serving the in-memory index
+        assert not shared.reload_if_changed(force=True)
+        assert shared.query_similar_embeddings(vectors[2].tolist(), top_k=1)["matches"][0]["id"] == "v2"
+
+        # A failed first load leaves the stored metadata and vectors alone and refuses to save
+        broken = VectorDBClient(index_file=index_file, flush_interval=3600)
+        assert broken.index.ntotal == 0
+        assert broken.metadata.count() == 6 and broken.raw_vectors.count == 6
+        assert not broken.save_index()
+        assert broken.rebuild_index()
+        assert broken.query_similar_embeddings(vectors[4].tolist(), top_k=1)["matches"][0]["id"] == "v4"
+        broken.close()
+        shared.close()
+
+        with VectorDBClient(index_file=index_file) as reopened:
+            assert reopened.index.ntotal == 6
+
+    print("✅ Failed loads keep the stored index")
+
+def test_legacy_positional_index_migration():
+    """Indexes saved with positional IDs, pickled metadata and no raw vector sidecar are migrated on load"""
+    print("\n🔍 Testing positional index migration...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "test_index.idx")
+        vectors = _random_vectors(2, seed=5)
+        legacy_index = faiss.IndexFlatL2(EMBEDDING_DIM)
+        legacy_index.add(vectors)
+        faiss.write_index(legacy_index, index_file)
+        with open(index_file + ".meta", 'wb') as f:
+            pickle.dump({'index_to_id': ["a", "b"], 'id_to_metadata': {"a": {}, "b": {"text": "b"}}}, f)
+
+        with VectorDBClient(index_file=index_file, index_spec="HNSW32") as migrated:
+            assert migrated.metadata.lookup(["a", "b"]) == {"a": 0, "b": 1}
+            assert migrated.raw_vectors.count == 2
+            migrated._rebuild_thread.join()
+            assert isinstance(faiss.downcast_index(migrated.index.index), faiss.IndexHNSWFlat)
+            assert migrated.query_similar_embeddings(vectors[1].tolist(), top_k=1)["matches"][0]["id"] == "b"
+
+        # Later loads read the SQLite metadata store, not the pickle left behind as a backup
+        os.remove(index_file + ".meta")
+        with VectorDBClient(index_file=index_file, index_spec="HNSW32") as reopened:
+            assert reopened.get_metadata("b") == {"text": "b"}
+            assert reopened.active_spec == "HNSW32"
+
+    print("✅ Positional index migration works")
+
+def main():
+    """Run all vector database tests"""
+    print("🚀 Starting VectorDBClient Tests")
+    print("=" * 60)
+    test_write_behind_flush()
+    test_flush_on_pending_threshold()
+    test_bulk_upsert_and_query()
+    test_shared_client_hot_reload()
+    test_clients_share_the_store()
+    test_ivf_trains_after_enough_vectors()
+    test_filtered_search()
+    test_query_batch()
+    test_sharded_client()
+    test_delete_and_compaction()
+    test_failed_load_keeps_stored_vectors()
+    test_legacy_positional_index_migration()
+    print("\n🎉 All VectorDBClient tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except AssertionError as e:
+        print(f"\n❌ VectorDBClient test failed: {e}")
+        sys.exit(1)